@@ -0,0 +1,225 @@
+import os
+import time
+import asyncio
+import itertools
+import asyncpg
+from typing import Optional, Dict, Any, List
+from config.database import db_manager, STORAGE_BACKEND, DATABASE_SSLMODE, REPLICA_RETRY_SECONDS
+from config.database_common import format_prediction, as_date
+from utils.identity_cache import MISSING
+
+# asyncpg version of the DatabaseManager methods the async endpoints use.
+# it has its own connection pools (primary + one per read replica) instead of
+# a new connection per call, and asyncpg prepares every statement once per
+# connection and reuses it (statement_cache_size). the identity cache and the
+# read-your-writes bookkeeping are shared with db_manager, so both layers see
+# the same usernames and the same recent writes.
+#
+# behind pgbouncer in transaction mode set DATABASE_STATEMENT_CACHE_SIZE=0.
+
+DATABASE_POOL_MIN = int(os.getenv('DATABASE_POOL_MIN', '1'))
+DATABASE_POOL_MAX = int(os.getenv('DATABASE_POOL_MAX', '10'))
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv('DATABASE_STATEMENT_CACHE_SIZE', '100'))
+
+class AsyncDatabaseManager:
+    def __init__(self, sync_manager=db_manager):
+        self.connection_string = sync_manager.connection_string
+        self.replica_urls = sync_manager.replica_urls
+        self.identity = sync_manager.identity
+        self.sync_manager = sync_manager  # note_write / wrote_recently
+        self.pool = None
+        self.replica_pools = [None] * len(self.replica_urls)
+        self.replica_down_until = [0.0] * len(self.replica_urls)
+        self.next_replica = itertools.count()
+        self.lock = asyncio.Lock()
+
+    async def _create_pool(self, dsn: str):
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=DATABASE_POOL_MIN,
+            max_size=DATABASE_POOL_MAX,
+            ssl=DATABASE_SSLMODE,
+            statement_cache_size=DATABASE_STATEMENT_CACHE_SIZE
+        )
+
+    async def get_pool(self):
+        if self.pool is None:
+            async with self.lock:
+                if self.pool is None:
+                    self.pool = await self._create_pool(self.connection_string)
+        return self.pool
+
+    async def get_read_pool(self, user_firebase_uid: str = None):
+        #(pool, replica index) round robin over the replicas,
+        #(primary pool, None) when there's none up or the user just wrote
+        if not self.replica_urls or self.sync_manager.wrote_recently(user_firebase_uid):
+            return await self.get_pool(), None
+
+        first = next(self.next_replica)
+        for offset in range(len(self.replica_urls)):
+            replica = (first + offset) % len(self.replica_urls)
+            if self.replica_down_until[replica] > time.monotonic():
+                continue
+            try:
+                if self.replica_pools[replica] is None:
+                    self.replica_pools[replica] = await self._create_pool(self.replica_urls[replica])
+                return self.replica_pools[replica], replica
+            except Exception as e:
+                self._replica_failed(replica, e)
+
+        return await self.get_pool(), None
+
+    def _replica_failed(self, replica: int, error: Exception):
+        #skip it for REPLICA_RETRY_SECONDS, and start over with a new pool after that
+        print(f"Replica {replica} unavailable, skipping it for {REPLICA_RETRY_SECONDS}s: {error}")
+        self.replica_down_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+        pool, self.replica_pools[replica] = self.replica_pools[replica], None
+        if pool is not None:
+            pool.terminate()
+
+    async def read(self, method: str, query: str, *args, user_firebase_uid: str = None):
+        #pool.<method>(query, *args) on a replica. if the replica fails it's marked down
+        #and the query runs once more on the primary, errors from there are the caller's
+        pool, replica = await self.get_read_pool(user_firebase_uid)
+        try:
+            return await getattr(pool, method)(query, *args)
+        except Exception as e:
+            if replica is None:
+                raise
+            self._replica_failed(replica, e)
+        primary = await self.get_pool()
+        return await getattr(primary, method)(query, *args)
+
+    async def close(self):
+        for pool in [self.pool] + self.replica_pools:
+            if pool is not None:
+                await pool.close()
+        self.pool = None
+        self.replica_pools = [None] * len(self.replica_urls)
+
+    async def get_user_id(self, firebase_uid: str) -> Optional[int]:
+        cached = self.identity.user_ids.get(firebase_uid)
+        if cached is not MISSING:
+            return cached
+        pool = await self.get_pool()
+        user_id = await pool.fetchval("SELECT id FROM users WHERE firebase_uid = $1", firebase_uid)
+        self.identity.user_ids.set(firebase_uid, user_id)
+        return user_id
+
+    async def createorget_user(self, firebase_uid: str, email: str, username: str = None) -> int:
+        user_id = await self.get_user_id(firebase_uid)
+        if user_id is not None:
+            return user_id
+        pool = await self.get_pool()
+        # ON CONFLICT covers another request creating the same user in between
+        user_id = await pool.fetchval("""
+            INSERT INTO users (firebase_uid, email, username) VALUES ($1, $2, $3)
+            ON CONFLICT (firebase_uid) DO UPDATE SET firebase_uid = EXCLUDED.firebase_uid
+            RETURNING id
+        """, firebase_uid, email, username)
+        self.identity.user_ids.set(firebase_uid, user_id)
+        if username:
+            self.identity.username_saved(username, email)
+        return user_id
+
+    async def check_username_exists(self, username: str) -> bool:
+        cached = self.identity.usernames_taken.get(username)
+        if cached is not MISSING:
+            return cached is not None
+        try:
+            email = await self.read('fetchval', "SELECT email FROM users WHERE username = $1", username)
+        except Exception as e:
+            print(f"Error checking username: {e}")
+            return False
+        self.identity.usernames_taken.set(username, True if email else None)
+        self.identity.emails.set(username, email)
+        return email is not None
+
+    async def get_email_for_username(self, username: str) -> Optional[str]:
+        cached = self.identity.emails.get(username)
+        if cached is not MISSING:
+            return cached
+        email = await self.read('fetchval', "SELECT email FROM users WHERE username = $1", username)
+        self.identity.emails.set(username, email)
+        self.identity.usernames_taken.set(username, True if email else None)
+        return email
+
+    async def save_prediction(self, user_firebase_uid: str, prediction_data: Dict[str, Any]) -> bool:
+        try:
+            user_id = await self.createorget_user(
+                user_firebase_uid,
+                prediction_data.get('email', 'unknown@email.com')
+            )
+            pred = prediction_data.get('prediction', {})
+            trading_info = prediction_data.get('trading_info', {})
+
+            pool = await self.get_pool()
+            await pool.execute("""
+                INSERT INTO predictions (
+                    user_id, stock_symbol, predicted_price, current_price,
+                    price_change, price_change_percent, days_ahead, confidence,
+                    volatility, trend, sentiment, model_used, prediction_date, target_date
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
+            """,
+                user_id,
+                pred.get('stock'),
+                pred.get('predicted_price'),
+                pred.get('current_price'),
+                pred.get('price_change'),
+                pred.get('price_change_percent'),
+                prediction_data.get('days_ahead', 1),
+                pred.get('confidence'),
+                pred.get('volatility'),
+                pred.get('trend'),
+                pred.get('sentiment'),
+                prediction_data.get('model_info', {}).get('method_used', 'Unknown'),
+                as_date(trading_info.get('target_date', 'today')),
+                as_date(trading_info.get('target_date'))
+            )
+            self.sync_manager.note_write(user_firebase_uid)
+            print(f"Saved prediction for {pred.get('stock')}")
+            return True
+
+        except Exception as e:
+            print(f"Error saving prediction: {e}")
+            return False
+
+    async def get_user_predictions(self, user_firebase_uid: str, limit: int = 50) -> List[Dict[str, Any]]:
+        try:
+            user_id = await self.get_user_id(user_firebase_uid)
+            if user_id is None:
+                return []
+            rows = await self.read('fetch', """
+                SELECT p.*
+                FROM predictions p
+                WHERE p.user_id = $1
+                ORDER BY p.created_at DESC
+                LIMIT $2
+            """, user_id, limit, user_firebase_uid=user_firebase_uid)
+            return [format_prediction(row) for row in rows]
+
+        except Exception as e:
+            print(f"Error fetching predictions: {e}")
+            return []
+
+    async def ping(self):
+        pool = await self.get_pool()
+        return await pool.fetchval("SELECT 1")
+
+class ThreadedDatabaseManager:
+    #the same awaitable methods over a synchronous manager, for STORAGE_BACKEND=sqlite:
+    #a local query is far cheaper than a pool would be, it only has to stay off the event loop
+    def __init__(self, sync_manager=db_manager):
+        self.sync_manager = sync_manager
+
+    def __getattr__(self, name):
+        method = getattr(self.sync_manager, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+    async def close(self):
+        pass
+
+async_db_manager = AsyncDatabaseManager() if STORAGE_BACKEND == 'postgres' else ThreadedDatabaseManager()
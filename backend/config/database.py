@@ -1,25 +1,169 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 import os
+import re
+import time
+import itertools
+from contextvars import ContextVar
+from datetime import date, datetime
 from typing import Optional, Dict, Any, List
+from utils.identity_cache import IdentityCache, LRUCache, MISSING
+from config.database_common import (PREDICTIONS_RETENTION_MONTHS, month_start, add_months,
+                                    format_prediction, as_date)
+
+# monthly partitions of predictions
+PREDICTIONS_PARTITIONS_AHEAD = int(os.getenv('PREDICTIONS_PARTITIONS_AHEAD', '3'))
+
+def partition_name(start: date) -> str:
+    return f"predictions_y{start.year}m{start.month:02d}"
+
+def partition_bounds(bound: str):
+    #(lower, upper) dates out of pg_get_expr's "FOR VALUES FROM ('2025-01-01 00:00:00') TO (...)", None for MINVALUE/MAXVALUE
+    values = re.findall(r"\(([^)]*)\)", bound or "")
+    dates = []
+    for value in values[:2]:
+        found = re.search(r"(\d{4}-\d{2}-\d{2})", value)
+        dates.append(datetime.strptime(found.group(1), "%Y-%m-%d").date() if found else None)
+    return tuple(dates) if len(dates) == 2 else (None, None)
+
+# read replicas: read-only methods go to DATABASE_REPLICA_URLS (comma separated)
+# round robin, a replica that fails to connect is skipped for REPLICA_RETRY_SECONDS,
+# and if none is reachable reads fall back to the primary (in config/async_database.py
+# a query that fails on a replica also marks it down and runs on the primary). writes always go to
+# the primary. replicas lag a little, so with READ_YOUR_WRITES_SECONDS > 0 a
+# user's reads stay on the primary for that long after their own write.
+# the next request may land on another worker, so the write time travels with the
+# client: main.py sends it back as the X-Wrote-At header and a cookie after a write,
+# and puts whatever the request brings into request_writes for wrote_recently.
+# it's wall clock time, so the workers' clocks should roughly agree.
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '0'))
+WRITE_MARKER_HEADER = 'X-Wrote-At'
+WRITE_MARKER_COOKIE = 'wrote_at'
+
+# {'client': write time the request came with, 'wrote': time of a write during it}
+request_writes = ContextVar('request_writes', default=None)
+
+def client_write_time(value: Optional[str]) -> float:
+    #the X-Wrote-At / cookie value, 0 when missing, junk or from the future
+    try:
+        written_at = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return written_at if written_at <= time.time() + 1 else 0.0
+
+# 'postgres' (default) or 'sqlite' for single-node installs, see config/sqlite_database.py
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'postgres').lower()
+
+# 'require' in production, 'disable' for a local postgres without ssl
+DATABASE_SSLMODE = os.getenv('DATABASE_SSLMODE', 'require')
 
 class DatabaseManager:
+    IntegrityError = psycopg2.IntegrityError
+
     def __init__(self):
         self.connection_string = os.getenv('DATABASE_URL')
         if not self.connection_string:
             raise ValueError("DATABASE_URL environment variable not set!")
+        self.identity = IdentityCache()
+
+        self.replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+        self.replica_down_until = [0.0] * len(self.replica_urls)
+        self.next_replica = itertools.count()
+        self.recent_writes = LRUCache()  # firebase_uid -> monotonic time of their last write
+        self.held_locks = {}  # name -> connection holding that advisory lock
+
+    def _connect(self, connection_string: str):
+        return psycopg2.connect(
+            connection_string,
+            cursor_factory=RealDictCursor,
+            sslmode=DATABASE_SSLMODE
+        )
 
     def get_connection(self):
         try:
-            db_conn = psycopg2.connect(
-                self.connection_string,
-                cursor_factory=RealDictCursor,
-                sslmode='require'
-            )
+            db_conn = self._connect(self.connection_string)
             return db_conn
         except Exception as e:
             print(f"Database connection error: {e}")
             raise
+
+    def get_read_connection(self, user_firebase_uid: str = None):
+        #a replica connection for read-only queries, the primary if there's no usable replica
+        if not self.replica_urls or self.wrote_recently(user_firebase_uid):
+            return self.get_connection()
+
+        first = next(self.next_replica)
+        for offset in range(len(self.replica_urls)):
+            replica = (first + offset) % len(self.replica_urls)
+            if self.replica_down_until[replica] > time.monotonic():
+                continue
+            try:
+                return self._connect(self.replica_urls[replica])
+            except Exception as e:
+                print(f"Replica {replica} unavailable, skipping it for {REPLICA_RETRY_SECONDS}s: {e}")
+                self.replica_down_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+        print("No replica available, reading from primary")
+        return self.get_connection()
+
+    def hold_lock(self, name: str) -> bool:
+        #True while this process holds the session advisory lock `name`, for work only one
+        #process of the deployment should do. it lives on a connection kept open for it, so
+        #it goes when the process (or that connection) does and another one can take over.
+        #needs a direct connection or session pooling, not pgbouncer transaction mode
+        db_conn = self.held_locks.get(name)
+        if db_conn is not None:
+            try:
+                with db_conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                return True
+            except Exception as e:
+                print(f"Lost lock {name}: {e}")
+                del self.held_locks[name]
+                db_conn.close()
+
+        db_conn = self._connect(self.connection_string)
+        db_conn.autocommit = True
+        with db_conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s)) AS locked", (name,))
+            locked = cursor.fetchone()['locked']
+        if not locked:
+            db_conn.close()
+            return False
+        self.held_locks[name] = db_conn
+        return True
+
+    def note_write(self, user_firebase_uid: str):
+        if READ_YOUR_WRITES_SECONDS > 0 and user_firebase_uid:
+            self.recent_writes.set(user_firebase_uid, time.monotonic())
+            marker = request_writes.get()
+            if marker is not None:
+                marker['wrote'] = time.time()
+
+    def wrote_recently(self, user_firebase_uid: str) -> bool:
+        #the request's own write marker first, then this process's memory of the user's writes
+        if READ_YOUR_WRITES_SECONDS <= 0 or not user_firebase_uid:
+            return False
+        marker = request_writes.get()
+        if marker is not None and time.time() - max(marker.get('client', 0), marker.get('wrote', 0)) < READ_YOUR_WRITES_SECONDS:
+            return True
+        written_at = self.recent_writes.get(user_firebase_uid)
+        return written_at is not MISSING and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS
+
+    def ping(self):
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def replica_status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [{"replica": i, "healthy": down_until <= now} for i, down_until in enumerate(self.replica_down_until)]
     
     def add_username_column(self):
         db_conn = self.get_connection()
@@ -71,37 +215,60 @@ class DatabaseManager:
                 );
             """)
             
-            # list of predictions for history pg
+            # list of predictions for history pg, partitioned by month (see below)
+            self._create_predictions_table(cursor)
+            self._create_prediction_partitions(cursor)
+            
+            # what's left of predictions older than the retention window, per user/symbol/month
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS predictions (
+                CREATE TABLE IF NOT EXISTS prediction_rollups (
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    month DATE NOT NULL,
+                    predictions INTEGER NOT NULL,
+                    confidence_sum BIGINT NOT NULL,
+                    bullish_calls INTEGER NOT NULL,
+                    bearish_calls INTEGER NOT NULL,
+                    first_prediction_at TIMESTAMP,
+                    last_prediction_at TIMESTAMP,
+                    PRIMARY KEY (user_id, stock_symbol, month)
+                );
+            """)
+            
+            # symbols each user watches
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS watchlist (
                     id SERIAL PRIMARY KEY,
                     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
                     stock_symbol VARCHAR(10) NOT NULL,
-                    predicted_price DECIMAL(10,2) NOT NULL,
-                    current_price DECIMAL(10,2) NOT NULL,
-                    price_change DECIMAL(10,2) NOT NULL,
-                    price_change_percent DECIMAL(5,2) NOT NULL,
-                    days_ahead INTEGER NOT NULL,
-                    confidence INTEGER NOT NULL,
-                    volatility VARCHAR(20),
-                    trend VARCHAR(20),
-                    sentiment VARCHAR(20),
-                    model_used VARCHAR(50),
-                    prediction_date DATE NOT NULL,
-                    target_date DATE,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-
-                    actual_price DECIMAL(10,2) NULL,
-                    accuracy_checked BOOLEAN DEFAULT FALSE,
-                    accuracy_percentage DECIMAL(5,2) NULL
+                    UNIQUE (user_id, stock_symbol)
+                );
+            """)
+            
+            # one-shot price alerts, active until they fire or get deleted
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    direction VARCHAR(5) NOT NULL CHECK (direction IN ('above', 'below')),
+                    threshold DECIMAL(12,4) NOT NULL,
+                    active BOOLEAN DEFAULT TRUE,
+                    triggered_price DECIMAL(12,4) NULL,
+                    triggered_at TIMESTAMP NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
             """)
             
             #indexing for db
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_predictions_user_id ON predictions(user_id);
+                CREATE INDEX IF NOT EXISTS idx_alerts_user_id ON alerts(user_id);
+                CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts(stock_symbol) WHERE active;
+                CREATE INDEX IF NOT EXISTS idx_watchlist_stock_symbol ON watchlist(stock_symbol);
+                CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at DESC);
                 CREATE INDEX IF NOT EXISTS idx_predictions_stock_symbol ON predictions(stock_symbol);
-                CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions(created_at);
+                CREATE INDEX IF NOT EXISTS idx_predictions_created_brin ON predictions USING BRIN (created_at);
                 CREATE INDEX IF NOT EXISTS idx_users_firebase_uid ON users(firebase_uid);
             """)
 
@@ -116,8 +283,158 @@ class DatabaseManager:
             cursor.close()
             db_conn.close()
         
+    # predictions is range-partitioned on created_at, one partition per month
+    # (predictions_y2025m01, ...). inserts and the history read only touch recent
+    # partitions, old months are folded into prediction_rollups and dropped whole
+    # instead of being deleted row by row, so vacuum never has to chew through them.
+    # created_at is append-only, so a BRIN index on it is tiny and enough.
+
+    def _predictions_kind(self, cursor) -> Optional[str]:
+        #'p' partitioned, 'r' plain table (pre-partitioning installs), None if missing
+        cursor.execute("""
+            SELECT c.relkind FROM pg_class c
+            WHERE c.relname = 'predictions' AND pg_table_is_visible(c.oid)
+        """)
+        row = cursor.fetchone()
+        return row['relkind'] if row else None
+
+    def _create_predictions_table(self, cursor):
+        kind = self._predictions_kind(cursor)
+        if kind == 'p':
+            return
+        if kind == 'r':
+            # keep the old table, it becomes the partition for everything up to this month
+            cursor.execute("ALTER TABLE predictions RENAME TO predictions_legacy")
+            # the partition key has to be part of the primary key, re-added below
+            cursor.execute("ALTER TABLE predictions_legacy DROP CONSTRAINT predictions_pkey")
+            for index in ('idx_predictions_user_id', 'idx_predictions_user_created',
+                          'idx_predictions_stock_symbol', 'idx_predictions_created_at'):
+                cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+                    sql.Identifier(index), sql.Identifier(index.replace('predictions', 'predictions_legacy'))))
+
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS predictions_id_seq")
+        cursor.execute("""
+            CREATE TABLE predictions (
+                id INTEGER NOT NULL DEFAULT nextval('predictions_id_seq'),
+                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                stock_symbol VARCHAR(10) NOT NULL,
+                predicted_price DECIMAL(10,2) NOT NULL,
+                current_price DECIMAL(10,2) NOT NULL,
+                price_change DECIMAL(10,2) NOT NULL,
+                price_change_percent DECIMAL(5,2) NOT NULL,
+                days_ahead INTEGER NOT NULL,
+                confidence INTEGER NOT NULL,
+                volatility VARCHAR(20),
+                trend VARCHAR(20),
+                sentiment VARCHAR(20),
+                model_used VARCHAR(50),
+                prediction_date DATE NOT NULL,
+                target_date DATE,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+                actual_price DECIMAL(10,2) NULL,
+                accuracy_checked BOOLEAN DEFAULT FALSE,
+                accuracy_percentage DECIMAL(5,2) NULL,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+        """)
+        cursor.execute("ALTER SEQUENCE predictions_id_seq OWNED BY predictions.id")
+
+        if kind == 'r':
+            bound = add_months(month_start(date.today()), 1).isoformat()
+            cursor.execute("UPDATE predictions_legacy SET created_at = prediction_date WHERE created_at IS NULL")
+            cursor.execute("ALTER TABLE predictions_legacy ALTER COLUMN created_at SET NOT NULL")
+            cursor.execute("ALTER TABLE predictions_legacy ADD CONSTRAINT predictions_legacy_pkey PRIMARY KEY (id, created_at)")
+            # lets ATTACH skip scanning the whole table to check the range
+            cursor.execute("ALTER TABLE predictions_legacy ADD CONSTRAINT predictions_legacy_range CHECK (created_at < %s)",
+                           (bound,))
+            cursor.execute("ALTER TABLE predictions ATTACH PARTITION predictions_legacy FOR VALUES FROM (MINVALUE) TO (%s)",
+                           (bound,))
+            print("Converted predictions to a partitioned table, old rows kept in predictions_legacy")
+
+    def _create_prediction_partitions(self, cursor, months_ahead: int = PREDICTIONS_PARTITIONS_AHEAD):
+        #this month's partition and the next few, skipping ranges a partition already covers
+        cursor.execute("""
+            SELECT pg_get_expr(c.relpartbound, c.oid) AS bound
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'predictions'::regclass
+        """)
+        existing = [partition_bounds(row['bound']) for row in cursor.fetchall()]
+
+        first = month_start(date.today())
+        for offset in range(months_ahead + 1):
+            start, end = add_months(first, offset), add_months(first, offset + 1)
+            # None is MINVALUE/MAXVALUE. predictions_legacy reaches into the month it was converted in
+            if any((lower or date.min) < end and (upper or date.max) > start for lower, upper in existing):
+                continue
+            cursor.execute(sql.SQL("""
+                CREATE TABLE {} PARTITION OF predictions
+                FOR VALUES FROM (%s) TO (%s)
+            """).format(sql.Identifier(partition_name(start))), (start.isoformat(), end.isoformat()))
+
+    def maintain_predictions(self, retention_months: int = PREDICTIONS_RETENTION_MONTHS) -> Dict[str, Any]:
+        #daily job: make sure future partitions exist, roll up and drop expired ones
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            self._create_prediction_partitions(cursor)
+            db_conn.commit()
+
+            cutoff = add_months(month_start(date.today()), -retention_months)
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'predictions'::regclass
+            """)
+            expired = [row['relname'] for row in cursor.fetchall()
+                       if (partition_bounds(row['bound'])[1] or date.max) <= cutoff]
+
+            rolled_up = 0
+            for partition in sorted(expired):
+                # one transaction per partition: summary rows in, partition gone
+                cursor.execute(sql.SQL("""
+                    INSERT INTO prediction_rollups (
+                        user_id, stock_symbol, month, predictions, confidence_sum,
+                        bullish_calls, bearish_calls, first_prediction_at, last_prediction_at
+                    )
+                    SELECT user_id, stock_symbol, date_trunc('month', created_at)::date,
+                           count(*), sum(confidence),
+                           count(*) FILTER (WHERE trend = 'Uptrend'),
+                           count(*) FILTER (WHERE trend = 'Downtrend'),
+                           min(created_at), max(created_at)
+                    FROM {}
+                    WHERE user_id IS NOT NULL
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (user_id, stock_symbol, month) DO UPDATE SET
+                        predictions = prediction_rollups.predictions + EXCLUDED.predictions,
+                        confidence_sum = prediction_rollups.confidence_sum + EXCLUDED.confidence_sum,
+                        bullish_calls = prediction_rollups.bullish_calls + EXCLUDED.bullish_calls,
+                        bearish_calls = prediction_rollups.bearish_calls + EXCLUDED.bearish_calls,
+                        first_prediction_at = LEAST(prediction_rollups.first_prediction_at, EXCLUDED.first_prediction_at),
+                        last_prediction_at = GREATEST(prediction_rollups.last_prediction_at, EXCLUDED.last_prediction_at)
+                """).format(sql.Identifier(partition)))
+                rolled_up += cursor.rowcount
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(partition)))
+                db_conn.commit()
+                print(f"Rolled up and dropped {partition}")
+
+            return {"dropped_partitions": sorted(expired), "rollup_rows": rolled_up}
+            
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error maintaining predictions partitions: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
     def createorget_user(self, firebase_uid: str, email: str, username: str = None) -> int:
     #get user id of existing user or make new
+        cached = self.identity.user_ids.get(firebase_uid)
+        if cached is not MISSING and cached is not None:
+            return cached
+
         db_conn = self.get_connection()
         cursor = db_conn.cursor()
 
@@ -130,6 +447,7 @@ class DatabaseManager:
             user = cursor.fetchone()
             
             if user:
+                self.identity.user_ids.set(firebase_uid, user['id'])
                 return user['id']
             
             # creaying new user
@@ -149,6 +467,9 @@ class DatabaseManager:
                 )
             user_id = cursor.fetchone()['id']
             db_conn.commit()
+            self.identity.user_ids.set(firebase_uid, user_id)
+            if username:
+                self.identity.username_saved(username, email)
             print(f"Created new user: {email} with username: {username}")
             return user_id
             
@@ -160,17 +481,46 @@ class DatabaseManager:
             cursor.close()
             db_conn.close()
 
+    def get_user_id(self, firebase_uid: str) -> Optional[int]:
+        #id of an existing user, None if there isn't one (never creates)
+        cached = self.identity.user_ids.get(firebase_uid)
+        if cached is not MISSING:
+            return cached
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute(
+                "SELECT id FROM users WHERE firebase_uid = %s",
+                (firebase_uid,)
+            )
+            user = cursor.fetchone()
+            user_id = user['id'] if user else None
+            self.identity.user_ids.set(firebase_uid, user_id)
+            return user_id
+        finally:
+            cursor.close()
+            db_conn.close()
+
     def check_username_exists(self, username: str) -> bool:
     #check for existing username.
-        db_conn = self.get_connection()
+        cached = self.identity.usernames_taken.get(username)
+        if cached is not MISSING:
+            return cached is not None
+
+        db_conn = self.get_read_connection()
         cursor = db_conn.cursor()
     
         try:
             cursor.execute(
-                "SELECT id FROM users WHERE username = %s",
+                "SELECT email FROM users WHERE username = %s",
                 (username,)
             )
-            return cursor.fetchone() is not None
+            user = cursor.fetchone()
+            self.identity.usernames_taken.set(username, True if user else None)
+            self.identity.emails.set(username, user['email'] if user else None)
+            return user is not None
         except Exception as e:
             print(f"Error checking username: {e}")
             return False
@@ -178,6 +528,58 @@ class DatabaseManager:
             cursor.close()
             db_conn.close()
 
+    def get_email_for_username(self, username: str) -> Optional[str]:
+        #for logging in with a username
+        cached = self.identity.emails.get(username)
+        if cached is not MISSING:
+            return cached
+
+        db_conn = self.get_read_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute(
+                "SELECT email FROM users WHERE username = %s",
+                (username,)
+            )
+            user = cursor.fetchone()
+            email = user['email'] if user else None
+            self.identity.emails.set(username, email)
+            self.identity.usernames_taken.set(username, True if user else None)
+            return email
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def save_username(self, firebase_uid: str, username: str) -> bool:
+        #False if the user doesn't exist. raises psycopg2.IntegrityError if the name got taken meanwhile
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute("""
+                UPDATE users u
+                SET username = %s
+                FROM (SELECT id, username AS old_username FROM users WHERE firebase_uid = %s FOR UPDATE) old
+                WHERE u.id = old.id
+                RETURNING u.email, old.old_username
+            """, (username, firebase_uid))
+            user = cursor.fetchone()
+            db_conn.commit()
+            self.note_write(firebase_uid)
+            if user is None:
+                return False
+            self.identity.username_saved(username, user['email'], user['old_username'])
+            return True
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error saving username: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
     def save_prediction(self, user_firebase_uid: str, prediction_data: Dict[str, Any]) -> bool:
         #saving to db
         db_conn = self.get_connection()
@@ -216,6 +618,7 @@ class DatabaseManager:
             ))
             
             db_conn.commit()
+            self.note_write(user_firebase_uid)
             print(f"Saved prediction for {pred.get('stock')}")
             return True
             
@@ -229,51 +632,313 @@ class DatabaseManager:
     
     def get_user_predictions(self, user_firebase_uid: str, limit: int = 50) -> List[Dict[str, Any]]:
         #predictions for specific userid
-        db_conn = self.get_connection()
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        db_conn = self.get_read_connection(user_firebase_uid)
         cursor = db_conn.cursor()
         
         try:
             cursor.execute("""
-                SELECT p.*, u.email 
+                SELECT p.*
                 FROM predictions p
-                JOIN users u ON p.user_id = u.id
-                WHERE u.firebase_uid = %s
+                WHERE p.user_id = %s
                 ORDER BY p.created_at DESC
                 LIMIT %s
-            """, (user_firebase_uid, limit))
+            """, (user_id, limit))
             
             predictions = cursor.fetchall()
+            return [format_prediction(prediction) for prediction in predictions]
+            
+        except Exception as e:
+            print(f"Error fetching predictions: {e}")
+            return []
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def add_watchlist_symbol(self, user_firebase_uid: str, email: str, symbol: str) -> bool:
+        #True if it was added, False if it was already on the list
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            user_id = self.createorget_user(user_firebase_uid, email)
+            cursor.execute("""
+                INSERT INTO watchlist (user_id, stock_symbol)
+                VALUES (%s, %s)
+                ON CONFLICT (user_id, stock_symbol) DO NOTHING
+            """, (user_id, symbol))
+            added = cursor.rowcount == 1
+            db_conn.commit()
+            self.note_write(user_firebase_uid)
+            return added
             
-            formatted_predictions = []
-            for prediction in predictions:
-                formatted_predictions.append({
-                    'id': prediction['id'],
-                    'stock': prediction['stock_symbol'],
-                    'predicted_price': float(prediction['predicted_price']),
-                    'current_price': float(prediction['current_price']),
-                    'price_change': float(prediction['price_change']),
-                    'price_change_percent': float(prediction['price_change_percent']),
-                    'confidence': prediction['confidence'],
-                    'volatility': prediction['volatility'],
-                    'trend': prediction['trend'],
-                    'sentiment': prediction['sentiment'],
-                    'timestamp': prediction['created_at'].isoformat(),
-                    'days_ahead': prediction['days_ahead'],
-                    'model_used': prediction['model_used'],
-                    'target_date': prediction['target_date'].isoformat() if prediction['target_date'] else None
-                })
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error adding to watchlist: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def remove_watchlist_symbol(self, user_firebase_uid: str, symbol: str) -> bool:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return False
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute(
+                "DELETE FROM watchlist WHERE user_id = %s AND stock_symbol = %s",
+                (user_id, symbol)
+            )
+            removed = cursor.rowcount > 0
+            db_conn.commit()
+            self.note_write(user_firebase_uid)
+            return removed
             
-            return formatted_predictions
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error removing from watchlist: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def get_watchlist(self, user_firebase_uid: str) -> List[str]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        db_conn = self.get_read_connection(user_firebase_uid)
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT stock_symbol FROM watchlist WHERE user_id = %s ORDER BY created_at",
+                (user_id,)
+            )
+            return [row['stock_symbol'] for row in cursor.fetchall()]
             
         except Exception as e:
-            print(f"Error fetching predictions: {e}")
+            print(f"Error fetching watchlist: {e}")
+            return []
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def get_watched_symbols(self) -> List[str]:
+        #union of every user's watchlist, each symbol once
+        db_conn = self.get_read_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute("SELECT DISTINCT stock_symbol FROM watchlist ORDER BY stock_symbol")
+            return [row['stock_symbol'] for row in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Error fetching watched symbols: {e}")
+            return []
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def get_latest_predictions(self, user_firebase_uid: str, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        #the user's most recent saved prediction for each of the symbols, one query
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return {}
+
+        db_conn = self.get_read_connection(user_firebase_uid)
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute("""
+                SELECT DISTINCT ON (stock_symbol)
+                    stock_symbol, predicted_price, current_price, confidence,
+                    trend, sentiment, days_ahead, model_used, created_at
+                FROM predictions
+                WHERE user_id = %s AND stock_symbol = ANY(%s)
+                ORDER BY stock_symbol, created_at DESC
+            """, (user_id, list(symbols)))
+            
+            return {
+                row['stock_symbol']: {
+                    'predicted_price': float(row['predicted_price']),
+                    'current_price': float(row['current_price']),
+                    'confidence': row['confidence'],
+                    'trend': row['trend'],
+                    'sentiment': row['sentiment'],
+                    'days_ahead': row['days_ahead'],
+                    'model_used': row['model_used'],
+                    'timestamp': row['created_at'].isoformat()
+                }
+                for row in cursor.fetchall()
+            }
+            
+        except Exception as e:
+            print(f"Error fetching latest predictions: {e}")
+            return {}
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def create_alert(self, user_firebase_uid: str, email: str, symbol: str, direction: str, threshold: float) -> int:
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            user_id = self.createorget_user(user_firebase_uid, email)
+            cursor.execute("""
+                INSERT INTO alerts (user_id, stock_symbol, direction, threshold)
+                VALUES (%s, %s, %s, %s) RETURNING id
+            """, (user_id, symbol, direction, threshold))
+            alert_id = cursor.fetchone()['id']
+            db_conn.commit()
+            self.note_write(user_firebase_uid)
+            return alert_id
+            
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error creating alert: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def delete_alert(self, user_firebase_uid: str, alert_id: int) -> bool:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return False
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute(
+                "DELETE FROM alerts WHERE user_id = %s AND id = %s",
+                (user_id, alert_id)
+            )
+            deleted = cursor.rowcount > 0
+            db_conn.commit()
+            self.note_write(user_firebase_uid)
+            return deleted
+            
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error deleting alert: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def get_user_alerts(self, user_firebase_uid: str) -> List[Dict[str, Any]]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        db_conn = self.get_read_connection(user_firebase_uid)
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute(
+                "SELECT * FROM alerts WHERE user_id = %s ORDER BY created_at DESC",
+                (user_id,)
+            )
+            
+            return [{
+                'id': alert['id'],
+                'stock': alert['stock_symbol'],
+                'direction': alert['direction'],
+                'threshold': float(alert['threshold']),
+                'active': alert['active'],
+                'triggered_price': float(alert['triggered_price']) if alert['triggered_price'] is not None else None,
+                'triggered_at': alert['triggered_at'].isoformat() if alert['triggered_at'] else None,
+                'created_at': alert['created_at'].isoformat()
+            } for alert in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Error fetching alerts: {e}")
             return []
         finally:
             cursor.close()
             db_conn.close()
+
+    def get_active_alerts(self) -> List[tuple]:
+        #(id, firebase_uid, symbol, direction, threshold) for every active alert, for the alert engine.
+        #from the primary: a lagging replica would bring back alerts that were just deleted or fired.
+        #raises, an empty list would clear the engine
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
         
-db_manager = DatabaseManager()
+        try:
+            cursor.execute("""
+                SELECT a.id, u.firebase_uid, a.stock_symbol, a.direction, a.threshold
+                FROM alerts a
+                JOIN users u ON a.user_id = u.id
+                WHERE a.active
+            """)
+            return [(row['id'], row['firebase_uid'], row['stock_symbol'], row['direction'], row['threshold'])
+                    for row in cursor.fetchall()]
+            
+        except Exception as e:
+            print(f"Error loading active alerts: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
+
+    def mark_alerts_triggered(self, triggered: List[tuple]) -> List[int]:
+        #[(alert_id, price)], one statement for the whole batch. returns the ids that were still
+        #active: one that already fired (or was deleted) keeps its first trigger and isn't reported again
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
         
+        try:
+            flipped = execute_values(cursor, """
+                UPDATE alerts a
+                SET active = FALSE, triggered_price = t.price, triggered_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS t(id, price)
+                WHERE a.id = t.id AND a.active
+                RETURNING a.id
+            """, triggered, fetch=True)
+            db_conn.commit()
+            return [row['id'] for row in flipped]
+            
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error marking alerts triggered: {e}")
+            raise
+        finally:
+            cursor.close()
+            db_conn.close()
 
+    def get_recent_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        db_conn = self.get_read_connection()
+        cursor = db_conn.cursor()
+        
+        try:
+            cursor.execute("""
+                SELECT id, firebase_uid, username, email, created_at 
+                FROM users 
+                ORDER BY created_at DESC 
+                LIMIT %s
+            """, (limit,))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            db_conn.close()
 
+def create_db_manager():
+    if STORAGE_BACKEND == 'sqlite':
+        from config.sqlite_database import SQLiteDatabaseManager
+        return SQLiteDatabaseManager()
+    if STORAGE_BACKEND != 'postgres':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return DatabaseManager()
 
+db_manager = create_db_manager()
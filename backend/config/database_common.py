@@ -0,0 +1,44 @@
+import os
+from datetime import date
+from typing import Optional, Dict, Any
+
+# what the postgres, asyncpg and sqlite managers share. nothing here connects to
+# anything or builds a manager, so config/sqlite_database.py can import it without
+# config/database.py (which creates db_manager on import) being loaded first.
+
+# predictions older than this are rolled up and dropped (postgres partitions, sqlite rows)
+PREDICTIONS_RETENTION_MONTHS = int(os.getenv('PREDICTIONS_RETENTION_MONTHS', '24'))
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def format_prediction(prediction) -> Dict[str, Any]:
+    #a predictions row (RealDictRow or asyncpg Record) as the API returns it
+    return {
+        'id': prediction['id'],
+        'stock': prediction['stock_symbol'],
+        'predicted_price': float(prediction['predicted_price']),
+        'current_price': float(prediction['current_price']),
+        'price_change': float(prediction['price_change']),
+        'price_change_percent': float(prediction['price_change_percent']),
+        'confidence': prediction['confidence'],
+        'volatility': prediction['volatility'],
+        'trend': prediction['trend'],
+        'sentiment': prediction['sentiment'],
+        'timestamp': prediction['created_at'].isoformat(),
+        'days_ahead': prediction['days_ahead'],
+        'model_used': prediction['model_used'],
+        'target_date': prediction['target_date'].isoformat() if prediction['target_date'] else None
+    }
+
+def as_date(value) -> Optional[date]:
+    #save_prediction gets 'today' or YYYY-MM-DD strings; postgres parses those itself, asyncpg and sqlite want dates
+    if value is None or isinstance(value, date):
+        return value
+    if value == 'today':
+        return date.today()
+    return date.fromisoformat(str(value)[:10])
@@ -0,0 +1,610 @@
+import os
+import fcntl
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Optional, Dict, Any, List
+from config.database_common import (PREDICTIONS_RETENTION_MONTHS, add_months, month_start,
+                                    format_prediction, as_date)
+from utils.identity_cache import IdentityCache, MISSING
+
+# embedded storage for single-node installs (STORAGE_BACKEND=sqlite): same
+# schema and same methods as DatabaseManager, in a local file instead of a
+# remote postgres. the file is in WAL mode, so readers never wait for the
+# writer, and every thread keeps its own connection open (opening one per
+# call would cost more than the queries themselves).
+#
+# what postgres does differently is handled here:
+#   SERIAL                  -> INTEGER PRIMARY KEY (the rowid)
+#   RETURNING id            -> cursor.lastrowid
+#   information_schema      -> PRAGMA table_info
+#   ON CONFLICT DO NOTHING  -> INSERT OR IGNORE
+#   DISTINCT ON             -> ROW_NUMBER() window
+#   partitions + BRIN       -> one table with a created_at index, expired rows
+#                              rolled up and deleted by maintain_predictions
+# there are no replicas, every read goes to the same file.
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'predictify.db')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# NORMAL is safe in WAL mode (no corruption), a power cut can lose the last commits
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# dates and timestamps go in as ISO text and come back as date/datetime, like psycopg2
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+
+# CURRENT_TIMESTAMP in sqlite only has whole seconds, history is ordered by this
+NOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+
+class SQLiteDatabaseManager:
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self.identity = IdentityCache()
+        self.local = threading.local()
+        self.held_locks = {}  # name -> open lock file
+
+    def get_connection(self):
+        #this thread's connection, opened on first use
+        db_conn = getattr(self.local, 'connection', None)
+        if db_conn is None:
+            db_conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                      timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            db_conn.row_factory = sqlite3.Row
+            db_conn.execute("PRAGMA journal_mode = WAL")
+            db_conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+            db_conn.execute("PRAGMA foreign_keys = ON")
+            self.local.connection = db_conn
+        return db_conn
+
+    def ping(self):
+        self.get_connection().execute("SELECT 1").fetchone()
+
+    def replica_status(self) -> List[Dict[str, Any]]:
+        return []
+
+    def hold_lock(self, name: str) -> bool:
+        #True while this process holds the lock `name`: an flock on a file next to the
+        #database, every process sharing it is on this box
+        if name in self.held_locks:
+            return True
+        lock_file = open(f"{self.path}.{name}.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self.held_locks[name] = lock_file
+        return True
+
+    def add_username_column(self):
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute("PRAGMA table_info(users)")
+            if not any(column['name'] == 'username' for column in cursor.fetchall()):
+                # sqlite can't ADD COLUMN ... UNIQUE, the unique index does the same job
+                cursor.execute("ALTER TABLE users ADD COLUMN username VARCHAR(50)")
+                cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+                print("Username column added successfully")
+            else:
+                print("Username column already exists")
+            db_conn.commit()
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error adding username column: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def create_tables(self):
+        db_conn = self.get_connection()
+
+        try:
+            db_conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    firebase_uid VARCHAR(255) UNIQUE NOT NULL,
+                    username VARCHAR(50) UNIQUE,
+                    email VARCHAR(255) NOT NULL,
+                    created_at TIMESTAMP DEFAULT {NOW},
+                    updated_at TIMESTAMP DEFAULT {NOW}
+                );
+
+                CREATE TABLE IF NOT EXISTS predictions (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    predicted_price DECIMAL(10,2) NOT NULL,
+                    current_price DECIMAL(10,2) NOT NULL,
+                    price_change DECIMAL(10,2) NOT NULL,
+                    price_change_percent DECIMAL(5,2) NOT NULL,
+                    days_ahead INTEGER NOT NULL,
+                    confidence INTEGER NOT NULL,
+                    volatility VARCHAR(20),
+                    trend VARCHAR(20),
+                    sentiment VARCHAR(20),
+                    model_used VARCHAR(50),
+                    prediction_date DATE NOT NULL,
+                    target_date DATE,
+                    created_at TIMESTAMP NOT NULL DEFAULT {NOW},
+
+                    actual_price DECIMAL(10,2) NULL,
+                    accuracy_checked BOOLEAN DEFAULT FALSE,
+                    accuracy_percentage DECIMAL(5,2) NULL
+                );
+
+                CREATE TABLE IF NOT EXISTS prediction_rollups (
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    month DATE NOT NULL,
+                    predictions INTEGER NOT NULL,
+                    confidence_sum BIGINT NOT NULL,
+                    bullish_calls INTEGER NOT NULL,
+                    bearish_calls INTEGER NOT NULL,
+                    first_prediction_at TIMESTAMP,
+                    last_prediction_at TIMESTAMP,
+                    PRIMARY KEY (user_id, stock_symbol, month)
+                );
+
+                CREATE TABLE IF NOT EXISTS watchlist (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    created_at TIMESTAMP DEFAULT {NOW},
+                    UNIQUE (user_id, stock_symbol)
+                );
+
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                    stock_symbol VARCHAR(10) NOT NULL,
+                    direction VARCHAR(5) NOT NULL CHECK (direction IN ('above', 'below')),
+                    threshold DECIMAL(12,4) NOT NULL,
+                    active BOOLEAN DEFAULT TRUE,
+                    triggered_price DECIMAL(12,4) NULL,
+                    triggered_at TIMESTAMP NULL,
+                    created_at TIMESTAMP DEFAULT {NOW}
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_alerts_user_id ON alerts(user_id);
+                CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts(stock_symbol) WHERE active;
+                CREATE INDEX IF NOT EXISTS idx_watchlist_stock_symbol ON watchlist(stock_symbol);
+                CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_predictions_stock_symbol ON predictions(stock_symbol);
+                CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions(created_at);
+            """)
+            print(f"Database tables created successfully ({self.path})")
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error creating tables: {e}")
+            raise
+
+    def maintain_predictions(self, retention_months: int = PREDICTIONS_RETENTION_MONTHS) -> Dict[str, Any]:
+        #no partitions to drop here: expired rows are rolled up and deleted in one transaction
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+        cutoff = add_months(month_start(date.today()), -retention_months)
+
+        try:
+            # the WHERE is needed for sqlite to parse ON CONFLICT after a SELECT
+            cursor.execute("""
+                INSERT INTO prediction_rollups (
+                    user_id, stock_symbol, month, predictions, confidence_sum,
+                    bullish_calls, bearish_calls, first_prediction_at, last_prediction_at
+                )
+                SELECT user_id, stock_symbol, strftime('%Y-%m-01', created_at),
+                       count(*), sum(confidence),
+                       sum(trend = 'Uptrend'), sum(trend = 'Downtrend'),
+                       min(created_at), max(created_at)
+                FROM predictions
+                WHERE user_id IS NOT NULL AND created_at < ?
+                GROUP BY 1, 2, 3
+                ON CONFLICT (user_id, stock_symbol, month) DO UPDATE SET
+                    predictions = predictions + excluded.predictions,
+                    confidence_sum = confidence_sum + excluded.confidence_sum,
+                    bullish_calls = bullish_calls + excluded.bullish_calls,
+                    bearish_calls = bearish_calls + excluded.bearish_calls,
+                    first_prediction_at = min(first_prediction_at, excluded.first_prediction_at),
+                    last_prediction_at = max(last_prediction_at, excluded.last_prediction_at)
+            """, (cutoff,))
+            rolled_up = cursor.rowcount
+            cursor.execute("DELETE FROM predictions WHERE created_at < ?", (cutoff,))
+            expired = cursor.rowcount
+            db_conn.commit()
+            if expired:
+                print(f"Rolled up and deleted {expired} predictions before {cutoff}")
+            return {"dropped_partitions": [], "expired_predictions": expired, "rollup_rows": rolled_up}
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error maintaining predictions: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def get_user_id(self, firebase_uid: str) -> Optional[int]:
+        #id of an existing user, None if there isn't one (never creates)
+        cached = self.identity.user_ids.get(firebase_uid)
+        if cached is not MISSING:
+            return cached
+
+        user = self.get_connection().execute(
+            "SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,)
+        ).fetchone()
+        user_id = user['id'] if user else None
+        self.identity.user_ids.set(firebase_uid, user_id)
+        return user_id
+
+    def createorget_user(self, firebase_uid: str, email: str, username: str = None) -> int:
+        cached = self.identity.user_ids.get(firebase_uid)
+        if cached is not MISSING and cached is not None:
+            return cached
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute(
+                "INSERT OR IGNORE INTO users (firebase_uid, email, username) VALUES (?, ?, ?)",
+                (firebase_uid, email, username)
+            )
+            created = cursor.rowcount == 1
+            cursor.execute("SELECT id FROM users WHERE firebase_uid = ?", (firebase_uid,))
+            user_id = cursor.fetchone()['id']
+            db_conn.commit()
+            self.identity.user_ids.set(firebase_uid, user_id)
+            if created:
+                if username:
+                    self.identity.username_saved(username, email)
+                print(f"Created new user: {email} with username: {username}")
+            return user_id
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error managing user: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def check_username_exists(self, username: str) -> bool:
+        cached = self.identity.usernames_taken.get(username)
+        if cached is not MISSING:
+            return cached is not None
+        try:
+            email = self.get_email_for_username(username)
+        except Exception as e:
+            print(f"Error checking username: {e}")
+            return False
+        return email is not None
+
+    def get_email_for_username(self, username: str) -> Optional[str]:
+        cached = self.identity.emails.get(username)
+        if cached is not MISSING:
+            return cached
+
+        user = self.get_connection().execute(
+            "SELECT email FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        email = user['email'] if user else None
+        self.identity.emails.set(username, email)
+        self.identity.usernames_taken.set(username, True if user else None)
+        return email
+
+    def save_username(self, firebase_uid: str, username: str) -> bool:
+        #False if the user doesn't exist. raises sqlite3.IntegrityError if the name is taken
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            # take the write lock before reading the old username, nothing can change it until commit
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT email, username FROM users WHERE firebase_uid = ?", (firebase_uid,))
+            user = cursor.fetchone()
+            if user is None:
+                db_conn.rollback()
+                return False
+            cursor.execute(
+                f"UPDATE users SET username = ?, updated_at = {NOW} WHERE firebase_uid = ?",
+                (username, firebase_uid)
+            )
+            db_conn.commit()
+            self.identity.username_saved(username, user['email'], user['username'])
+            return True
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error saving username: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def save_prediction(self, user_firebase_uid: str, prediction_data: Dict[str, Any]) -> bool:
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            user_id = self.createorget_user(
+                user_firebase_uid,
+                prediction_data.get('email', 'unknown@email.com')
+            )
+            pred = prediction_data.get('prediction', {})
+            trading_info = prediction_data.get('trading_info', {})
+
+            cursor.execute("""
+                INSERT INTO predictions (
+                    user_id, stock_symbol, predicted_price, current_price,
+                    price_change, price_change_percent, days_ahead, confidence,
+                    volatility, trend, sentiment, model_used, prediction_date, target_date
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                user_id,
+                pred.get('stock'),
+                pred.get('predicted_price'),
+                pred.get('current_price'),
+                pred.get('price_change'),
+                pred.get('price_change_percent'),
+                prediction_data.get('days_ahead', 1),
+                pred.get('confidence'),
+                pred.get('volatility'),
+                pred.get('trend'),
+                pred.get('sentiment'),
+                prediction_data.get('model_info', {}).get('method_used', 'Unknown'),
+                as_date(trading_info.get('target_date', 'today')),
+                as_date(trading_info.get('target_date'))
+            ))
+            db_conn.commit()
+            print(f"Saved prediction for {pred.get('stock')}")
+            return True
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error saving prediction: {e}")
+            return False
+        finally:
+            cursor.close()
+
+    def get_user_predictions(self, user_firebase_uid: str, limit: int = 50) -> List[Dict[str, Any]]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        try:
+            predictions = self.get_connection().execute("""
+                SELECT * FROM predictions
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (user_id, limit)).fetchall()
+            return [format_prediction(prediction) for prediction in predictions]
+
+        except Exception as e:
+            print(f"Error fetching predictions: {e}")
+            return []
+
+    def add_watchlist_symbol(self, user_firebase_uid: str, email: str, symbol: str) -> bool:
+        #True if it was added, False if it was already on the list
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            user_id = self.createorget_user(user_firebase_uid, email)
+            cursor.execute(
+                "INSERT OR IGNORE INTO watchlist (user_id, stock_symbol) VALUES (?, ?)",
+                (user_id, symbol)
+            )
+            added = cursor.rowcount == 1
+            db_conn.commit()
+            return added
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error adding to watchlist: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def remove_watchlist_symbol(self, user_firebase_uid: str, symbol: str) -> bool:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return False
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute(
+                "DELETE FROM watchlist WHERE user_id = ? AND stock_symbol = ?",
+                (user_id, symbol)
+            )
+            removed = cursor.rowcount > 0
+            db_conn.commit()
+            return removed
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error removing from watchlist: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def get_watchlist(self, user_firebase_uid: str) -> List[str]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        try:
+            rows = self.get_connection().execute(
+                "SELECT stock_symbol FROM watchlist WHERE user_id = ? ORDER BY created_at, id",
+                (user_id,)
+            ).fetchall()
+            return [row['stock_symbol'] for row in rows]
+
+        except Exception as e:
+            print(f"Error fetching watchlist: {e}")
+            return []
+
+    def get_watched_symbols(self) -> List[str]:
+        try:
+            rows = self.get_connection().execute(
+                "SELECT DISTINCT stock_symbol FROM watchlist ORDER BY stock_symbol"
+            ).fetchall()
+            return [row['stock_symbol'] for row in rows]
+
+        except Exception as e:
+            print(f"Error fetching watched symbols: {e}")
+            return []
+
+    def get_latest_predictions(self, user_firebase_uid: str, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None or not symbols:
+            return {}
+
+        try:
+            placeholders = ", ".join("?" * len(symbols))
+            rows = self.get_connection().execute(f"""
+                SELECT * FROM (
+                    SELECT stock_symbol, predicted_price, current_price, confidence,
+                           trend, sentiment, days_ahead, model_used, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY stock_symbol ORDER BY created_at DESC, id DESC) AS newest
+                    FROM predictions
+                    WHERE user_id = ? AND stock_symbol IN ({placeholders})
+                ) WHERE newest = 1
+            """, (user_id, *symbols)).fetchall()
+
+            return {
+                row['stock_symbol']: {
+                    'predicted_price': float(row['predicted_price']),
+                    'current_price': float(row['current_price']),
+                    'confidence': row['confidence'],
+                    'trend': row['trend'],
+                    'sentiment': row['sentiment'],
+                    'days_ahead': row['days_ahead'],
+                    'model_used': row['model_used'],
+                    'timestamp': row['created_at'].isoformat()
+                }
+                for row in rows
+            }
+
+        except Exception as e:
+            print(f"Error fetching latest predictions: {e}")
+            return {}
+
+    def create_alert(self, user_firebase_uid: str, email: str, symbol: str, direction: str, threshold: float) -> int:
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            user_id = self.createorget_user(user_firebase_uid, email)
+            cursor.execute(
+                "INSERT INTO alerts (user_id, stock_symbol, direction, threshold) VALUES (?, ?, ?, ?)",
+                (user_id, symbol, direction, threshold)
+            )
+            alert_id = cursor.lastrowid
+            db_conn.commit()
+            return alert_id
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error creating alert: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def delete_alert(self, user_firebase_uid: str, alert_id: int) -> bool:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return False
+
+        db_conn = self.get_connection()
+        cursor = db_conn.cursor()
+
+        try:
+            cursor.execute("DELETE FROM alerts WHERE user_id = ? AND id = ?", (user_id, alert_id))
+            deleted = cursor.rowcount > 0
+            db_conn.commit()
+            return deleted
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error deleting alert: {e}")
+            raise
+        finally:
+            cursor.close()
+
+    def get_user_alerts(self, user_firebase_uid: str) -> List[Dict[str, Any]]:
+        user_id = self.get_user_id(user_firebase_uid)
+        if user_id is None:
+            return []
+
+        try:
+            alerts = self.get_connection().execute(
+                "SELECT * FROM alerts WHERE user_id = ? ORDER BY created_at DESC, id DESC",
+                (user_id,)
+            ).fetchall()
+
+            return [{
+                'id': alert['id'],
+                'stock': alert['stock_symbol'],
+                'direction': alert['direction'],
+                'threshold': float(alert['threshold']),
+                'active': alert['active'],
+                'triggered_price': float(alert['triggered_price']) if alert['triggered_price'] is not None else None,
+                'triggered_at': alert['triggered_at'].isoformat() if alert['triggered_at'] else None,
+                'created_at': alert['created_at'].isoformat()
+            } for alert in alerts]
+
+        except Exception as e:
+            print(f"Error fetching alerts: {e}")
+            return []
+
+    def get_active_alerts(self) -> List[tuple]:
+        try:
+            rows = self.get_connection().execute("""
+                SELECT a.id, u.firebase_uid, a.stock_symbol, a.direction, a.threshold
+                FROM alerts a
+                JOIN users u ON a.user_id = u.id
+                WHERE a.active
+            """).fetchall()
+            return [tuple(row) for row in rows]
+
+        except Exception as e:
+            print(f"Error loading active alerts: {e}")
+            raise
+
+    def mark_alerts_triggered(self, triggered: List[tuple]) -> List[int]:
+        #[(alert_id, price)], one transaction for the whole batch. returns the ids that were still active
+        db_conn = self.get_connection()
+
+        try:
+            flipped = []
+            for alert_id, price in triggered:
+                cursor = db_conn.execute(
+                    f"UPDATE alerts SET active = FALSE, triggered_price = ?, triggered_at = {NOW} WHERE id = ? AND active",
+                    (price, alert_id)
+                )
+                if cursor.rowcount:
+                    flipped.append(alert_id)
+            db_conn.commit()
+            return flipped
+
+        except Exception as e:
+            db_conn.rollback()
+            print(f"Error marking alerts triggered: {e}")
+            raise
+
+    def get_recent_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self.get_connection().execute("""
+            SELECT id, firebase_uid, username, email, created_at
+            FROM users
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import requests
+from loadtest.traffic import add_traffic_arguments, run_traffic
+
+# one command for a whole load test on this box, from backend/:
+#   python -m loadtest.run --app-workers 2 --concurrency 32 --duration 120
+# starts the Yahoo stub, starts the app under uvicorn against it with a fresh
+# SQLite file (or --database-url, a local Postgres), waits for it to come up,
+# runs the traffic mix, prints the report and what reached "Yahoo", stops both.
+# app settings to compare go in with --env, e.g. --env MODEL_POOL_WORKERS=4
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+def app_environment(args, data_dir: str) -> dict:
+    env = {
+        **os.environ,
+        'YAHOO_QUERY_BASE': f"http://127.0.0.1:{args.stub_port}",
+        'TICKER_METADATA_PATH': os.path.join(data_dir, 'ticker_metadata.json'),
+        'PYTHONUNBUFFERED': '1'
+    }
+    if args.database_url:
+        env.update(STORAGE_BACKEND='postgres', DATABASE_URL=args.database_url, DATABASE_SSLMODE='disable')
+    else:
+        env.update(STORAGE_BACKEND='sqlite', SQLITE_PATH=os.path.join(data_dir, 'loadtest.db'))
+    if args.app_workers > 1:
+        # workers share cached prices, like a multi-worker deployment should
+        env['PRICE_STORE_DIR'] = os.path.join(data_dir, 'prices')
+    for setting in args.env:
+        key, value = setting.split('=', 1)
+        env[key] = value
+    return env
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the app against the local Yahoo stub")
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--app-workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--latency-ms", default="80", help="stub latency per Yahoo call")
+    parser.add_argument("--jitter-ms", default="40")
+    parser.add_argument("--error-rate", default="0", help="fraction of stub 500s")
+    parser.add_argument("--throttle-rate", default="0", help="fraction of stub 429s")
+    parser.add_argument("--database-url", help="local Postgres instead of a throwaway SQLite file")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="app setting, repeatable")
+    parser.add_argument("--keep", action="store_true", help="keep the data dir (db, app log)")
+    add_traffic_arguments(parser)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='predictify-loadtest-')
+    app_log = open(os.path.join(data_dir, 'app.log'), 'w')
+    stub = subprocess.Popen(
+        [sys.executable, '-m', 'loadtest.stub_yahoo', '--port', str(args.stub_port),
+         '--latency-ms', args.latency_ms, '--jitter-ms', args.jitter_ms,
+         '--error-rate', args.error_rate, '--throttle-rate', args.throttle_rate],
+        cwd=BACKEND_DIR
+    )
+    app = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(args.app_port),
+         '--workers', str(args.app_workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=app_environment(args, data_dir), stdout=app_log, stderr=subprocess.STDOUT
+    )
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    try:
+        if not wait_until_up(f"http://127.0.0.1:{args.stub_port}/_stub/stats", stub, 30):
+            sys.exit("Yahoo stub didn't start")
+        if not wait_until_up(app_url + "/", app, 180):
+            sys.exit(f"app didn't start, see {app_log.name}")
+        run_traffic(app_url, args)
+        upstream = requests.get(f"http://127.0.0.1:{args.stub_port}/_stub/stats", timeout=5).json()
+        upstream.pop('/_stub/stats', None)
+        print("upstream calls: " + ", ".join(f"{name} {count}" for name, count in sorted(upstream.items())))
+    finally:
+        # the app first, it may still be talking to the stub
+        for process in (app, stub):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        app_log.close()
+        if args.keep:
+            print(f"data and app log kept in {data_dir}")
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import requests
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+# stand-in for the Yahoo endpoints the app uses, for load tests: nothing leaves
+# the box and nobody gets rate limited. start the app with
+# YAHOO_QUERY_BASE=http://127.0.0.1:PORT and every Yahoo request lands here
+# (see RedirectedSession in services/upstream.py).
+#   /v8/finance/chart/SYM         yf.download, Ticker.history
+#   /v10/finance/quoteSummary/SYM Ticker.info (with /v7/finance/quote)
+#   /xhr/ncp                      Ticker.news
+#   /v1/finance/trending/US       explore
+#   / and /v1/test/getcrumb       yfinance's cookie + crumb dance
+# responses come from recorded payloads in --payloads (python -m loadtest.stub_yahoo
+# --record AAPL MSFT ... saves real ones); a symbol without a recording gets a
+# deterministic synthetic one in the same shape. every response is delayed by
+# --latency-ms +- --jitter-ms, and --error-rate / --throttle-rate of them are
+# 500s / 429s, like the real thing on a bad day.
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+YAHOO_RECORD_BASE = 'https://query2.finance.yahoo.com'
+
+# most searched US tickers first, also the default trending list
+SYMBOLS = [
+    'AAPL', 'NVDA', 'TSLA', 'MSFT', 'AMZN', 'META', 'GOOGL', 'AMD', 'PLTR', 'NFLX',
+    'SPY', 'QQQ', 'INTC', 'BA', 'DIS', 'JPM', 'COIN', 'SOFI', 'F', 'BAC',
+    'UBER', 'PYPL', 'SHOP', 'NKE', 'KO', 'WMT', 'COST', 'XOM', 'CVX', 'PFE',
+    'T', 'V', 'MA', 'CRM', 'ORCL', 'ADBE', 'AVGO', 'MU', 'SMCI', 'ARM',
+    'RIVN', 'LCID', 'NIO', 'GME', 'AMC', 'HOOD', 'SNAP', 'RBLX', 'ABNB', 'MRNA'
+]
+
+SECTORS = ['Technology', 'Communication Services', 'Consumer Cyclical', 'Financial Services',
+           'Healthcare', 'Energy', 'Industrials', 'Consumer Defensive']
+
+HEADLINES = [
+    "{name} beats quarterly estimates as revenue climbs",
+    "{name} shares slide after cautious guidance",
+    "Analysts raise {name} price target on strong demand",
+    "{name} faces regulatory scrutiny over new product",
+    "What to watch as {name} heads into earnings",
+    "{name} announces buyback, shares edge higher"
+]
+
+def _rng(symbol: str, salt: int = 0):
+    return random.Random(sum(ord(c) * 31 ** i for i, c in enumerate(symbol)) + salt)
+
+def synthetic_chart(symbol: str, years: int = 5) -> dict:
+    #a v8 chart payload of daily bars up to today, same symbol same prices
+    rng = np.random.default_rng(_rng(symbol).randrange(2 ** 32))
+    today = datetime.now(timezone.utc).date()
+    days = [today - timedelta(days=i) for i in range(years * 366)][::-1]
+    # daily bars are stamped at the 9:30 ET open, today's once it has opened
+    timestamps = [int(datetime(d.year, d.month, d.day, 13, 30, tzinfo=timezone.utc).timestamp())
+                  for d in days if d.weekday() < 5]
+    timestamps = [ts for ts in timestamps if ts <= time.time()]
+    n = len(timestamps)
+    closes = rng.uniform(20, 400) * np.cumprod(1 + rng.normal(0.0004, 0.02, n))
+    opens = closes * (1 + rng.normal(0, 0.005, n))
+    highs = np.maximum(opens, closes) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    lows = np.minimum(opens, closes) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volumes = rng.integers(1_000_000, 80_000_000, n)
+    quote = {
+        'open': np.round(opens, 4).tolist(), 'high': np.round(highs, 4).tolist(),
+        'low': np.round(lows, 4).tolist(), 'close': np.round(closes, 4).tolist(),
+        'volume': volumes.tolist()
+    }
+    return {'chart': {'result': [{
+        'meta': {
+            'currency': 'USD', 'symbol': symbol, 'exchangeName': 'NMS', 'fullExchangeName': 'NasdaqGS',
+            'instrumentType': 'EQUITY', 'firstTradeDate': timestamps[0], 'regularMarketTime': timestamps[-1],
+            'gmtoffset': -14400, 'timezone': 'EDT', 'exchangeTimezoneName': 'America/New_York',
+            'regularMarketPrice': quote['close'][-1], 'chartPreviousClose': quote['close'][0],
+            'priceHint': 2, 'dataGranularity': '1d', 'range': '',
+            'validRanges': ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max']
+        },
+        'timestamp': timestamps,
+        'indicators': {'quote': [quote], 'adjclose': [{'adjclose': quote['close']}]}
+    }], 'error': None}}
+
+def synthetic_profile(symbol: str) -> dict:
+    rng = _rng(symbol, 1)
+    return {
+        'shortName': f"{symbol} Inc.", 'longName': f"{symbol} Incorporated",
+        'sector': rng.choice(SECTORS), 'industry': 'Software - Infrastructure',
+        'exchange': 'NMS', 'fullExchangeName': 'NasdaqGS', 'quoteType': 'EQUITY'
+    }
+
+def synthetic_news(symbol: str) -> list:
+    rng = _rng(symbol, int(time.time() // 3600))  # new headlines every hour
+    name = synthetic_profile(symbol)['shortName']
+    return [{'id': f"{symbol}-{i}", 'content': {'title': rng.choice(HEADLINES).format(name=name),
+                                                'pubDate': datetime.now(timezone.utc).isoformat()}}
+            for i in range(8)]
+
+RANGE_DAYS = {'1d': 1, '2d': 2, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731,
+              '5y': 1827, '10y': 3653}
+
+def slice_chart(chart: dict, params) -> dict:
+    #the part of a full chart the request asked for (range= or period1/period2)
+    result = chart['chart']['result'][0]
+    timestamps = result['timestamp']
+    now = int(time.time())
+    if 'period1' in params:
+        start, end = int(params['period1']), int(params.get('period2', now))
+    else:
+        span = params.get('range', '1mo')
+        if span == 'ytd':
+            start = int(datetime(datetime.now().year, 1, 1, tzinfo=timezone.utc).timestamp())
+        elif span == 'max':
+            start = 0
+        elif span in ('1d', '2d', '5d'):
+            start = timestamps[-RANGE_DAYS[span]] if len(timestamps) >= RANGE_DAYS[span] else 0
+        else:
+            start = now - RANGE_DAYS.get(span, 31) * 86400
+        end = now
+    keep = [i for i, ts in enumerate(timestamps) if start <= ts < end + 86400]
+    first, last = (keep[0], keep[-1] + 1) if keep else (0, 0)
+    quote = result['indicators']['quote'][0]
+    indicators = {'quote': [{key: values[first:last] for key, values in quote.items()}]}
+    if result['indicators'].get('adjclose'):
+        indicators['adjclose'] = [{'adjclose': result['indicators']['adjclose'][0]['adjclose'][first:last]}]
+    meta = {**result['meta'], 'dataGranularity': params.get('interval', '1d'), 'range': params.get('range', '')}
+    return {'chart': {'result': [{'meta': meta, 'timestamp': timestamps[first:last], 'indicators': indicators}],
+                      'error': None}}
+
+ENDPOINTS = ('chart', 'quoteSummary', 'quote', 'ncp', 'trending', 'getcrumb', 'timeseries')
+
+def endpoint_name(path: str) -> str:
+    for name in ENDPOINTS:
+        if f"/{name}" in path:
+            return 'news' if name == 'ncp' else name
+    return 'cookie' if path == '/' else path
+
+class Payloads:
+    #recorded payloads from disk, synthetic ones for everything else. cached in memory
+    def __init__(self, directory: str = PAYLOAD_DIR):
+        self.directory = directory
+        self.cache = {}
+
+    def _recorded(self, name: str):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _get(self, name: str, synthesize):
+        if name not in self.cache:
+            recorded = self._recorded(name)
+            self.cache[name] = recorded if recorded is not None else synthesize()
+        return self.cache[name]
+
+    def chart(self, symbol: str) -> dict:
+        return self._get(f"chart_{symbol}.json", lambda: synthetic_chart(symbol))
+
+    def profile(self, symbol: str) -> dict:
+        return self._get(f"profile_{symbol}.json", lambda: synthetic_profile(symbol))
+
+    def news(self, symbol: str) -> list:
+        return self._get(f"news_{symbol}.json", lambda: synthetic_news(symbol))
+
+    def trending(self) -> list:
+        return self._get("trending.json", lambda: SYMBOLS[:30])
+
+def create_app(payloads: Payloads, latency_ms: float = 80, jitter_ms: float = 40,
+               error_rate: float = 0.0, throttle_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    counts = Counter()
+
+    @app.middleware("http")
+    async def upstream_conditions(request: Request, call_next):
+        endpoint = endpoint_name(request.url.path)
+        counts[endpoint] += 1
+        # yfinance redoes its cookie handshake on most calls with a plain requests
+        # session, that part is answered straight away
+        if endpoint in ('cookie', 'getcrumb') or request.url.path.startswith('/_stub'):
+            return await call_next(request)
+        await asyncio.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+        roll = random.random()
+        if roll < throttle_rate:
+            counts['429'] += 1
+            return PlainTextResponse("Too Many Requests", status_code=429, headers={"Retry-After": "1"})
+        if roll < throttle_rate + error_rate:
+            counts['500'] += 1
+            return PlainTextResponse("Will be right back", status_code=500)
+        return await call_next(request)
+
+    @app.get("/")
+    def cookie():
+        response = PlainTextResponse("ok")
+        response.set_cookie("A3", "loadtest")
+        return response
+
+    @app.get("/v1/test/getcrumb")
+    def crumb():
+        return PlainTextResponse("loadtestcrumb")
+
+    @app.get("/v8/finance/chart/{symbol}")
+    def chart(symbol: str, request: Request):
+        return slice_chart(payloads.chart(symbol.upper()), request.query_params)
+
+    @app.get("/v10/finance/quoteSummary/{symbol}")
+    def quote_summary(symbol: str):
+        profile = payloads.profile(symbol.upper())
+        close = payloads.chart(symbol.upper())['chart']['result'][0]['indicators']['quote'][0]['close'][-1]
+        return {'quoteSummary': {'result': [{
+            'assetProfile': {'sector': profile.get('sector'), 'industry': profile.get('industry')},
+            'quoteType': {'symbol': symbol.upper(), 'shortName': profile.get('shortName'),
+                          'longName': profile.get('longName'), 'exchange': profile.get('exchange'),
+                          'quoteType': profile.get('quoteType', 'EQUITY')},
+            'summaryDetail': {'previousClose': close, 'currency': 'USD'},
+            'financialData': {'currentPrice': close},
+            'defaultKeyStatistics': {}
+        }], 'error': None}}
+
+    @app.get("/v7/finance/quote")
+    def quote(symbols: str = ''):
+        result = []
+        for symbol in filter(None, symbols.upper().split(',')):
+            profile = payloads.profile(symbol)
+            close = payloads.chart(symbol)['chart']['result'][0]['indicators']['quote'][0]['close'][-1]
+            result.append({'symbol': symbol, 'regularMarketPrice': close, **profile})
+        return {'quoteResponse': {'result': result, 'error': None}}
+
+    @app.post("/xhr/ncp")
+    async def news(request: Request):
+        body = await request.json()
+        symbols = body.get('serviceConfig', {}).get('s') or ['']
+        count = body.get('serviceConfig', {}).get('snippetCount', 10)
+        return {'data': {'tickerStream': {'stream': payloads.news(symbols[0].upper())[:count]}}}
+
+    @app.get("/ws/fundamentals-timeseries/v1/finance/timeseries/{symbol}")
+    def timeseries(symbol: str):
+        # no fundamentals, an empty answer keeps yfinance from retrying with other cookies
+        return {'timeseries': {'result': [], 'error': None}}
+
+    @app.get("/v1/finance/trending/{region}")
+    def trending(region: str, count: int = 30):
+        return {'finance': {'result': [{'count': count, 'quotes': [{'symbol': s} for s in payloads.trending()[:count]]}],
+                            'error': None}}
+
+    @app.get("/_stub/stats")
+    def stats():
+        return dict(counts)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    def not_found(path: str):
+        return JSONResponse({'error': {'code': 'Not Found', 'description': path}}, status_code=404)
+
+    return app
+
+def record(symbols: list, directory: str = PAYLOAD_DIR):
+    #save real payloads for the stub to replay: 5y daily chart, profile, news, trending
+    import yfinance as yf
+    os.makedirs(directory, exist_ok=True)
+
+    def save(name, payload):
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+
+    session = requests.Session()
+    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    trending = session.get(f"{YAHOO_RECORD_BASE}/v1/finance/trending/US", timeout=10).json()
+    save("trending.json", [quote['symbol'] for quote in trending['finance']['result'][0]['quotes']])
+    for symbol in symbols:
+        response = session.get(f"{YAHOO_RECORD_BASE}/v8/finance/chart/{symbol}",
+                               params={'range': '5y', 'interval': '1d'}, timeout=10)
+        response.raise_for_status()
+        save(f"chart_{symbol}.json", response.json())
+        ticker = yf.Ticker(symbol)
+        info = ticker.info
+        save(f"profile_{symbol}.json", {
+            'shortName': info.get('shortName'), 'longName': info.get('longName'),
+            'sector': info.get('sector'), 'industry': info.get('industry'),
+            'exchange': info.get('exchange'), 'fullExchangeName': info.get('fullExchangeName'),
+            'quoteType': info.get('quoteType')
+        })
+        save(f"news_{symbol}.json", ticker.news)
+        print(f"recorded {symbol}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Yahoo endpoints the app uses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429s")
+    parser.add_argument("--payloads", default=PAYLOAD_DIR)
+    parser.add_argument("--record", nargs="*", metavar="SYMBOL",
+                        help="record real payloads for these symbols (default: the 10 most popular) and exit")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        record([s.upper() for s in args.record] or SYMBOLS[:10], args.payloads)
+    else:
+        app = create_app(Payloads(args.payloads), args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate)
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
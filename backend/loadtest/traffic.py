@@ -0,0 +1,171 @@
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import requests
+from loadtest.stub_yahoo import SYMBOLS
+
+# scripted traffic against a running app, and the per-endpoint report.
+# every request picks an endpoint by the mix and a symbol by popularity: Zipf
+# over SYMBOLS (most searched first), so AAPL and NVDA get most of the traffic
+# and the tail is cold, like the real thing. signed-in users have their
+# predictions saved, /history reads them back.
+#
+# closed loop by default (each of --concurrency clients sends its next request
+# when the last one is answered). with --rate requests go out on a fixed
+# schedule instead, and latency is measured from when a request was due, so a
+# stalled server can't hide its queue by slowing the clients down.
+
+MIX = {'predict': 6, 'explore': 1, 'history': 3}
+DAYS_AHEAD = [1, 1, 1, 3, 5, 7, 14, 30]
+TIERS = ['standard'] * 7 + ['fast'] * 2 + ['thorough']
+PERCENTILES = (50, 95, 99)
+
+def parse_mix(text: str) -> dict:
+    #"predict=6,explore=1,history=3" -> weights
+    mix = {}
+    for part in filter(None, text.split(',')):
+        endpoint, weight = part.split('=')
+        if endpoint not in MIX:
+            raise ValueError(f"unknown endpoint {endpoint}, expected one of {', '.join(MIX)}")
+        mix[endpoint] = float(weight)
+    return mix
+
+def zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+class Traffic:
+    def __init__(self, base_url: str, mix: dict = MIX, zipf: float = 1.1, users: int = 200,
+                 signed_in: float = 0.5, seed: int = 0):
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = list(mix)
+        self.endpoint_weights = np.array([mix[e] for e in self.endpoints]) / sum(mix.values())
+        self.symbol_weights = zipf_weights(len(SYMBOLS), zipf)
+        self.users = [f"loadtest-user-{i}" for i in range(users)]
+        self.signed_in = signed_in
+        self.seed = seed
+
+    def next_request(self, rng: np.random.Generator):
+        #(endpoint, path, params, headers)
+        endpoint = self.endpoints[rng.choice(len(self.endpoints), p=self.endpoint_weights)]
+        user = self.users[rng.integers(len(self.users))]
+        if endpoint == 'predict':
+            params = {
+                'stock': SYMBOLS[rng.choice(len(SYMBOLS), p=self.symbol_weights)],
+                'days_ahead': int(rng.choice(DAYS_AHEAD)),
+                'tier': TIERS[rng.integers(len(TIERS))]
+            }
+            headers = {'X-User-UID': user, 'X-User-Email': f"{user}@loadtest.local"} \
+                if rng.random() < self.signed_in else {}
+            return endpoint, '/predict', params, headers
+        if endpoint == 'explore':
+            return endpoint, '/explore-stocks', {}, {}
+        return endpoint, '/history', {'limit': 50}, {'X-User-UID': user}
+
+    def _send(self, session: requests.Session, rng, due: float, timeout: float):
+        endpoint, path, params, headers = self.next_request(rng)
+        try:
+            response = session.get(self.base_url + path, params=params, headers=headers, timeout=timeout)
+            status = response.status_code
+            # this app reports most failures as 200 {"error": ...}
+            ok = status == 200 and 'error' not in response.json()
+        except Exception:
+            status, ok = 0, False
+        return endpoint, due, time.perf_counter() - due, status, ok
+
+    def run(self, concurrency: int = 16, duration: float = 60, rate: float = None,
+            warmup: float = 0, timeout: float = 60) -> list:
+        #[(endpoint, sent_at, latency, status, ok)] for the requests sent after warmup
+        began = time.perf_counter()
+        stop_at = began + warmup + duration
+        samples = []
+        lock = threading.Lock()
+        schedule = iter(range(10 ** 12))
+
+        def client(index: int):
+            rng = np.random.default_rng([self.seed, index])
+            session = requests.Session()
+            while True:
+                if rate:
+                    with lock:
+                        due = began + next(schedule) / rate
+                    if due >= stop_at:
+                        return
+                    time.sleep(max(0.0, due - time.perf_counter()))
+                else:
+                    due = time.perf_counter()
+                    if due >= stop_at:
+                        return
+                sample = self._send(session, rng, due, timeout)
+                if due - began >= warmup:
+                    with lock:
+                        samples.append(sample)
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+def summarize(samples: list, duration: float) -> dict:
+    #endpoint -> counts, throughput and latency percentiles (ms), plus 'all'
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample[0], []).append(sample)
+    by_endpoint['all'] = samples
+
+    report = {}
+    for endpoint, rows in by_endpoint.items():
+        if not rows:
+            continue
+        latencies = np.array([row[2] for row in rows]) * 1000
+        report[endpoint] = {
+            'requests': len(rows),
+            'ok': sum(row[4] for row in rows),
+            'errors': sum(not row[4] and row[3] != 503 for row in rows),
+            'shed_503': sum(row[3] == 503 for row in rows),
+            'rps': round(len(rows) / duration, 2),
+            **{f"p{p}_ms": round(float(np.percentile(latencies, p)), 1) for p in PERCENTILES},
+            'max_ms': round(float(latencies.max()), 1)
+        }
+    return report
+
+def print_report(report: dict):
+    columns = ['requests', 'ok', 'errors', 'shed_503', 'rps'] + [f"p{p}_ms" for p in PERCENTILES] + ['max_ms']
+    print(f"{'endpoint':<10}" + ''.join(f"{c:>10}" for c in columns))
+    for endpoint, row in report.items():
+        print(f"{endpoint:<10}" + ''.join(f"{row[c]:>10}" for c in columns))
+
+def add_traffic_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending at once")
+    parser.add_argument("--duration", type=float, default=60, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds sent before measuring")
+    parser.add_argument("--rate", type=float, default=None, help="requests/s on a fixed schedule (open loop)")
+    parser.add_argument("--mix", type=parse_mix, default=MIX, help="e.g. predict=6,explore=1,history=3")
+    parser.add_argument("--zipf", type=float, default=1.1, help="symbol popularity skew")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--signed-in", type=float, default=0.5, help="fraction of predictions that are saved")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report here")
+
+def run_traffic(base_url: str, args) -> dict:
+    traffic = Traffic(base_url, args.mix, args.zipf, args.users, args.signed_in, args.seed)
+    print(f"{args.warmup:.0f}s warm-up + {args.duration:.0f}s against {base_url}, "
+          + (f"{args.rate} req/s" if args.rate else f"{args.concurrency} clients"))
+    samples = traffic.run(args.concurrency, args.duration, args.rate, args.warmup)
+    report = summarize(samples, args.duration)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send the scripted traffic mix to a running app and report latencies")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    add_traffic_arguments(parser)
+    args = parser.parse_args()
+    run_traffic(args.url, args)
@@ -1,26 +1,31 @@
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from typing import List, Optional
 from models.response_models import Prediction
-from services.prediction_service import predict as get_prediction
-from services.stock_service import get_historical_data
-from config.database import db_manager
+from services.prediction_service import predict as get_prediction, predict_events
+from services.stock_service import (get_historical_window, history_etag, history_rows,
+                                    history_columns, price_change_from_closes)
+from utils.serialization import RESPONSE_FORMATS, encoded_response, negotiate_encoding, sse_event
+from config.database import (db_manager, STORAGE_BACKEND, READ_YOUR_WRITES_SECONDS, WRITE_MARKER_HEADER,
+                             WRITE_MARKER_COOKIE, request_writes, client_write_time)
+from config.async_database import async_db_manager
 import yfinance as yf
-import requests
 from datetime import datetime
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from email.utils import formatdate
+from services.upstream import yahoo, UpstreamUnavailable, YAHOO_QUERY_BASE
+from services.quote_stream import quote_hub, parse_symbols, QUOTE_MAX_SYMBOLS, QUOTE_HEARTBEAT_SECONDS
+from services.watchlist_service import (watchlist_snapshot, run_watchlist_refresher,
+                                        WATCHLIST_REFRESH_SECONDS, WATCHLIST_MAX_SYMBOLS)
+from services.alert_service import alert_engine, AlertNotifier, DIRECTIONS, recently_fired
+from services.compare_service import compare_stocks, COMPARE_MAX_SYMBOLS
+from services.model_pool import model_pool
+from services.admission import admission
+from services.ticker_metadata import ticker_metadata, TICKER_METADATA_SEED
+import asyncio
+import math
+import os
 
 # in-memory history store removed. (py list)
 
@@ -31,7 +36,75 @@ async def lifespan(app: FastAPI):
         print("Database initialized successfully")
     except Exception as e:
         print(f"Database initialization failed: {e}")
+
+    # alert rules are loaded by the watchlist refresher, in the one process that evaluates them
+    alert_notifier.start()
+
+    try:
+        tickers = await asyncio.to_thread(ticker_metadata.load)
+        if TICKER_METADATA_SEED:
+            await asyncio.to_thread(ticker_metadata.seed, TICKER_METADATA_SEED)
+        print(f"Loaded metadata for {len(ticker_metadata.entries)} tickers ({tickers} from disk)")
+    except Exception as e:
+        print(f"Ticker metadata loading failed: {e}")
+
+    try:
+        # model workers import statsmodels/sklearn and fit once before the first request
+        await asyncio.to_thread(model_pool.start)
+    except Exception as e:
+        print(f"Model pool warm-up failed: {e}")
+
+    background = [asyncio.create_task(run_predictions_maintenance())]
+    if WATCHLIST_REFRESH_SECONDS > 0:
+        background.append(asyncio.create_task(run_watchlist_refresher()))
     yield
+    for task in background:
+        task.cancel()
+    alert_notifier.stop()
+    model_pool.shutdown()
+    await async_db_manager.close()
+
+async def run_predictions_maintenance():
+    #future partitions + retention rollup for predictions, once at startup then daily
+    while True:
+        try:
+            result = await asyncio.to_thread(db_manager.maintain_predictions)
+            print(f"Predictions maintenance: {result}")
+        except Exception as e:
+            print(f"Predictions maintenance failed: {e}")
+        await asyncio.sleep(PREDICTIONS_MAINTENANCE_SECONDS)
+
+PREDICTIONS_MAINTENANCE_SECONDS = int(os.getenv('PREDICTIONS_MAINTENANCE_SECONDS', '86400'))
+
+# fired alerts get marked in the db and kept for GET /alerts
+alert_notifier = AlertNotifier(alert_engine, db_manager.mark_alerts_triggered)
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"], 
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[WRITE_MARKER_HEADER],
+)
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    #the user's last write time comes and goes with the client, so a read right after
+    #a write stays on the primary whichever worker gets it (see config/database.py)
+    if READ_YOUR_WRITES_SECONDS <= 0:
+        return await call_next(request)
+    marker = {'client': client_write_time(request.headers.get(WRITE_MARKER_HEADER) or request.cookies.get(WRITE_MARKER_COOKIE))}
+    request_writes.set(marker)
+    response = await call_next(request)
+    if 'wrote' in marker:
+        written_at = f"{marker['wrote']:.3f}"
+        response.headers[WRITE_MARKER_HEADER] = written_at
+        response.set_cookie(WRITE_MARKER_COOKIE, written_at, max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+                            httponly=True, samesite='lax')
+    return response
 
 @app.get("/setup-db")
 def setup_database():
@@ -63,19 +136,13 @@ def save_username(
         if db_manager.check_username_exists(username):
             return {"error": "Username already taken"}
         
-        db_conn = db_manager.get_connection()
-        cursor = db_conn.cursor()
-        
-        cursor.execute(
-            "UPDATE users SET username = %s WHERE firebase_uid = %s",
-            (username, user_firebase_uid)
-        )
-        db_conn.commit()
-        cursor.close()
-        db_conn.close()
+        db_manager.save_username(user_firebase_uid, username)
         
         return {"message": "Username saved successfully"}
         
+    except db_manager.IntegrityError:
+        # someone took it between the check and the update
+        return {"error": "Username already taken"}
     except Exception as e:
         return {"error": f"Failed to save username: {str(e)}"}
     
@@ -99,19 +166,10 @@ def resolve_login(request: dict):
             return {"email": login_input, "type": "email"}
         
         # else its a user so link email
-        db_conn = db_manager.get_connection()
-        cursor = db_conn.cursor()
-        
-        cursor.execute(
-            "SELECT email FROM users WHERE username = %s",
-            (login_input,)
-        )
-        user = cursor.fetchone()
-        cursor.close()
-        db_conn.close()
-        
-        if user:
-            return {"email": user['email'], "type": "username"}
+        email = db_manager.get_email_for_username(login_input)
+        
+        if email:
+            return {"email": email, "type": "username"}
         else:
             return {"error": "Username not found"}
             
@@ -133,42 +191,108 @@ def head_root():
 def predict(
     stock: str = "AAPL", 
     days_ahead: int = 1,
+    tier: str = "standard",  # fast | standard | thorough, see MODEL_TIERS
+    deadline_ms: Optional[int] = None,
+    format: str = "full",  # compact = parallel arrays, fast encoder, compressed
     user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
-    user_email: Optional[str] = Header(None, alias="X-User-Email")
+    user_email: Optional[str] = Header(None, alias="X-User-Email"),
+    header_deadline_ms: Optional[int] = Header(None, alias="X-Deadline-Ms"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
 ):
+    if format not in RESPONSE_FORMATS:
+        return {"error": f"Format must be one of: {', '.join(RESPONSE_FORMATS)}"}
+    ticket = admission.admit(tier)
+    if ticket.rejected:
+        return overloaded_response(ticket)
     try:
-        result = get_prediction(stock, days_ahead)
+        compact = format == "compact"
+        # query param wins over the header (even ?deadline_ms=0), server default if neither is given
+        budget_ms = deadline_ms if deadline_ms is not None else header_deadline_ms
+        result = get_prediction(stock, days_ahead, tier, budget_ms, compact, shed=ticket.degraded)
         
         if user_firebase_uid and "prediction" in result:
-            try:
-                prediction_data = {
-                    **result,
-                    'days_ahead': days_ahead,
-                    'email': user_email or 'unknown@email.com'
-                }
-                db_manager.save_prediction(user_firebase_uid, prediction_data)
-            except Exception as e:
-                print(f"Warning: Could not save to database: {e}")
+            save_user_prediction(user_firebase_uid, user_email, result, days_ahead)
         
+        if compact:
+            return encoded_response(result, accept_encoding)
         return result
         
     except Exception as e:
         print(f"Prediction error: {e}")
         return {"error": f"Prediction failed: {str(e)}"}
+    finally:
+        ticket.release()
+
+def overloaded_response(ticket):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Server is overloaded, try again shortly", "retry_after": ticket.retry_after},
+        headers={"Retry-After": str(ticket.retry_after)}
+    )
     
+# same prediction as /predict, sent as Server-Sent Events while it comes together:
+# estimate (cached or trend fallback), model, sentiment, then prediction with the
+# full /predict response. an error event ends the stream early.
+@app.get("/predict/stream")
+def predict_stream(
+    stock: str = "AAPL", 
+    days_ahead: int = 1,
+    tier: str = "standard",
+    deadline_ms: Optional[int] = None,
+    format: str = "full",
+    user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+    user_email: Optional[str] = Header(None, alias="X-User-Email"),
+    header_deadline_ms: Optional[int] = Header(None, alias="X-Deadline-Ms")
+):
+    if format not in RESPONSE_FORMATS:
+        return {"error": f"Format must be one of: {', '.join(RESPONSE_FORMATS)}"}
+    ticket = admission.admit(tier)
+    if ticket.rejected:
+        return overloaded_response(ticket)
+    budget_ms = deadline_ms if deadline_ms is not None else header_deadline_ms
+
+    def events():
+        # sync generator, starlette steps through it on the threadpool
+        try:
+            for event, payload in predict_events(stock, days_ahead, tier, budget_ms,
+                                                 format == "compact", shed=ticket.degraded):
+                if event in ("prediction", "error"):
+                    ticket.release()  # the work is done, saving and sending don't count
+                if event == "prediction" and user_firebase_uid:
+                    save_user_prediction(user_firebase_uid, user_email, payload, days_ahead)
+                yield sse_event(event, payload)
+        finally:
+            ticket.release()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # keep proxies from holding events back
+    })
+
+def save_user_prediction(user_firebase_uid: str, user_email: Optional[str], result: dict, days_ahead: int):
+    try:
+        prediction_data = {
+            **result,
+            'days_ahead': days_ahead,
+            'email': user_email or 'unknown@email.com'
+        }
+        db_manager.save_prediction(user_firebase_uid, prediction_data)
+    except Exception as e:
+        print(f"Warning: Could not save to database: {e}")
+
 @app.head("/predict")
 def head_predict(stock: str = "AAPL"):
     return {}
 
 # history endpoint
 @app.get("/history")
-def get_history( user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+async def get_history( user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
     limit: int = 50):
     try:
         if not user_firebase_uid:
             return {"error": "User authentication required"}
         
-        predictions = db_manager.get_user_predictions(user_firebase_uid, limit)
+        predictions = await async_db_manager.get_user_predictions(user_firebase_uid, limit)
         return predictions
         
     except Exception as e:
@@ -179,28 +303,232 @@ def get_history( user_firebase_uid: Optional[str] = Header(None, alias="X-User-U
 def head_history():
     return {}
 
-#endpoint for js historical data
+#watchlist, quotes + latest predictions for all of a user's symbols in one go
+@app.get("/watchlist")
+def get_watchlist(
+    user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+    days_ahead: int = 1,
+    tier: str = "standard"
+):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        
+        symbols = db_manager.get_watchlist(user_firebase_uid)
+        return {
+            "symbols": symbols,
+            "stocks": watchlist_snapshot(user_firebase_uid, symbols, days_ahead, tier) if symbols else []
+        }
+        
+    except Exception as e:
+        print(f"Watchlist fetch error: {e}")
+        return {"error": f"Failed to fetch watchlist: {str(e)}"}
+
+@app.post("/watchlist")
+def add_to_watchlist(
+    request: dict,
+    user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+    user_email: Optional[str] = Header(None, alias="X-User-Email")
+):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        symbol = (request.get('symbol') or '').strip().upper()
+        if not symbol or len(symbol) > 10:
+            return {"error": "A valid symbol is required"}
+        if len(db_manager.get_watchlist(user_firebase_uid)) >= WATCHLIST_MAX_SYMBOLS:
+            return {"error": f"Watchlist is limited to {WATCHLIST_MAX_SYMBOLS} symbols"}
+        
+        added = db_manager.add_watchlist_symbol(user_firebase_uid, user_email or 'unknown@email.com', symbol)
+        return {"message": f"{symbol} added to watchlist" if added else f"{symbol} is already on the watchlist"}
+        
+    except Exception as e:
+        return {"error": f"Failed to update watchlist: {str(e)}"}
+
+@app.delete("/watchlist/{symbol}")
+def remove_from_watchlist(symbol: str, user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID")):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        if not db_manager.remove_watchlist_symbol(user_firebase_uid, symbol.upper()):
+            return {"error": f"{symbol.upper()} is not on the watchlist"}
+        return {"message": f"{symbol.upper()} removed from watchlist"}
+        
+    except Exception as e:
+        return {"error": f"Failed to update watchlist: {str(e)}"}
+
+#price alerts, checked on every background quote refresh
+@app.get("/alerts")
+def get_alerts(user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID")):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        alerts = db_manager.get_user_alerts(user_firebase_uid)
+        return {"alerts": alerts, "recently_fired": recently_fired(alerts)}
+        
+    except Exception as e:
+        print(f"Alerts fetch error: {e}")
+        return {"error": f"Failed to fetch alerts: {str(e)}"}
+
+@app.post("/alerts")
+def create_alert(
+    request: dict,
+    user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+    user_email: Optional[str] = Header(None, alias="X-User-Email")
+):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        symbol = (request.get('symbol') or '').strip().upper()
+        direction = request.get('direction')
+        threshold = request.get('threshold')
+        if not symbol or len(symbol) > 10:
+            return {"error": "A valid symbol is required"}
+        if direction not in DIRECTIONS:
+            return {"error": f"Direction must be one of: {', '.join(DIRECTIONS)}"}
+        if not isinstance(threshold, (int, float)) or threshold <= 0:
+            return {"error": "Threshold must be a positive price"}
+        
+        # the process evaluating alerts picks it up on its next refresh
+        alert_id = db_manager.create_alert(user_firebase_uid, user_email or 'unknown@email.com',
+                                           symbol, direction, threshold)
+        return {"message": "Alert created", "id": alert_id}
+        
+    except Exception as e:
+        return {"error": f"Failed to create alert: {str(e)}"}
+
+@app.delete("/alerts/{alert_id}")
+def delete_alert(alert_id: int, user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID")):
+    try:
+        if not user_firebase_uid:
+            return {"error": "User authentication required"}
+        if not db_manager.delete_alert(user_firebase_uid, alert_id):
+            return {"error": "Alert not found"}
+        alert_engine.remove(alert_id)
+        return {"message": "Alert deleted"}
+        
+    except Exception as e:
+        return {"error": f"Failed to delete alert: {str(e)}"}
+
+#side by side comparison, e.g. /compare?symbols=AAPL,MSFT,NVDA&period=6mo
+@app.get("/compare")
+def compare(
+    symbols: str,
+    period: str = "6mo",
+    days_ahead: int = 1,
+    tier: str = "standard",
+    user_firebase_uid: Optional[str] = Header(None, alias="X-User-UID"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
+    try:
+        compared = parse_symbols(symbols)
+        if len(compared) < 2:
+            return {"error": "At least two symbols are required"}
+        if len(compared) > COMPARE_MAX_SYMBOLS:
+            return {"error": f"At most {COMPARE_MAX_SYMBOLS} symbols can be compared"}
+        
+        result = compare_stocks(compared, period, days_ahead, tier, user_firebase_uid)
+        if "error" in result:
+            return result
+        return encoded_response(result, accept_encoding)
+        
+    except Exception as e:
+        print(f"Compare error: {e}")
+        return {"error": f"Comparison failed: {str(e)}"}
+
+#endpoint for js historical data, served from the local price cache
 @app.get("/historical/{symbol}")
-def historical_data(symbol: str, period: str = "1mo"):
-    return get_historical_data(symbol, period)
+def historical_data(
+    symbol: str,
+    period: str = "1mo",
+    start: Optional[str] = None,  # YYYY-MM-DD, overrides period
+    end: Optional[str] = None,
+    format: str = "full",
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
+    if format not in RESPONSE_FORMATS:
+        return {"error": f"Format must be one of: {', '.join(RESPONSE_FORMATS)}"}
+    window = get_historical_window(symbol, period, start, end)
+    if "error" in window:
+        return window
+
+    timestamps, closes = window["timestamps"], window["closes"]
+    # a gzip or brotli body is a different representation, it gets its own ETag
+    encoding = negotiate_encoding(accept_encoding) if format == "compact" else "identity"
+    headers = {
+        "ETag": history_etag(window["symbol"], timestamps, closes, format, encoding),
+        "Last-Modified": formatdate(int(timestamps[-1]), usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    # chart polling: nothing new since the client's copy, send no body
+    if if_none_match and headers["ETag"] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    build_chart = history_columns if format == "compact" else history_rows
+    payload = {
+        "symbol": window["symbol"],
+        "historical_data": build_chart(timestamps, closes),
+        "current_price_data": price_change_from_closes(closes)
+    }
+    if format == "compact":
+        return encoded_response(payload, accept_encoding, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+# live quotes over Server-Sent Events, e.g. /quotes/stream?symbols=AAPL,MSFT
+# one shared poller per symbol (see services/quote_stream.py), quote events only
+# when the price moves, comment heartbeats in between
+@app.get("/quotes/stream")
+async def quotes_stream(symbols: str):
+    watched = parse_symbols(symbols)
+    if not watched:
+        return {"error": "At least one symbol is required"}
+    if len(watched) > QUOTE_MAX_SYMBOLS:
+        return {"error": f"At most {QUOTE_MAX_SYMBOLS} symbols per stream"}
+
+    async def events():
+        subscriber = quote_hub.subscribe(watched)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), QUOTE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield sse_event("quote", {**message, "dropped": subscriber.dropped})
+        finally:
+            # client went away (the task gets cancelled), stop pollers nobody needs
+            quote_hub.unsubscribe(subscriber, watched)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 #db health check endpt
 @app.get("/health/database")
 def database_health():
     try:
-        db_conn = db_manager.get_connection()
-        cursor = db_conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.close()
-        db_conn.close()
-        return {"status": "healthy", "database": "connected"}
+        db_manager.ping()
+        return {"status": "healthy", "database": "connected", "backend": STORAGE_BACKEND,
+                "replicas": db_manager.replica_status(), "identity_cache": db_manager.identity.stats()}
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/health/models")
+def models_health():
+    return {**model_pool.status(), "admission": admission.status()}
+
+@app.get("/health/upstream")
+def upstream_health():
+    return {**yahoo.status(), "quote_streams": quote_hub.status(), "alerts": alert_engine.status(),
+            "ticker_metadata": ticker_metadata.status()}
+
 @app.get("/user/stats")
-def get_user_stats(user_firebase_uid: str = Header(..., alias="X-User-UID")):
+async def get_user_stats(user_firebase_uid: str = Header(..., alias="X-User-UID")):
     try:
-        predictions = db_manager.get_user_predictions(user_firebase_uid, 1000)  # Get all
+        predictions = await async_db_manager.get_user_predictions(user_firebase_uid, 1000)  # Get all
         
         if not predictions:
             return {
@@ -239,29 +567,17 @@ def get_user_stats(user_firebase_uid: str = Header(..., alias="X-User-UID")):
 
 #explore page related backend data
 
-session = requests.Session()
-session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-    'Accept': 'application/json',
-    'Referer': 'https://finance.yahoo.com/'
-})
-
-retry_strategy = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
+# last good explore payload, served while yahoo is unavailable
+last_explore_data = None
 
 @app.get("/explore-stocks")
 def explore_data():
+    global last_explore_data
     try:
-        trending_url = "https://query1.finance.yahoo.com/v1/finance/trending/US"
+        trending_url = f"{YAHOO_QUERY_BASE}/v1/finance/trending/US"
         
-        # only using session instead of requests.get works
-        response = session.get(trending_url, timeout=10)
+        # only using session instead of requests.get works (shared yahoo session, throttled)
+        response = yahoo.get(trending_url, timeout=10)
         
         print(f"Session request status: {response.status_code}")
         
@@ -277,12 +593,14 @@ def explore_data():
         
         all_stocks = []
         sectors_dict = {}
+        # names and sectors from the local store, only unknown tickers go upstream
+        metadata = ticker_metadata.get_many(stock_symbols)
 
         for s in stock_symbols:
             try:
                 ticker = yf.Ticker(s)
-                hist = ticker.history(period="2d")
-                info = ticker.info
+                hist = yahoo.call(ticker.history, period="2d")
+                info = metadata.get(s, {})
 
                 if len(hist) < 2:
                     continue
@@ -294,7 +612,7 @@ def explore_data():
 
                 stock_data = {
                     'symbol': s,
-                    'name': info.get('shortName', s)[:28],  
+                    'name': (info.get('name') or s)[:28],
                     'price': curr_price,
                     'change': price_change,
                     'changePercent': percent_change,
@@ -304,13 +622,15 @@ def explore_data():
                 all_stocks.append(stock_data)
 
                 #secotr grping
-                sector = info.get('sector', 'Other')
+                sector = info.get('sector') or 'Other'
                 print(f"{s}: sector = '{sector}'")
 
                 if sector not in sectors_dict:
                     sectors_dict[sector] = []
                 sectors_dict[sector].append(stock_data)
             
+            except UpstreamUnavailable:
+                raise
             except Exception as e: #for those stocks that cant load
                 print(f"Failed to get data for {s}: {e}")
                 continue    
@@ -337,14 +657,20 @@ def explore_data():
                     'top_stocks': top_performers[:4]
                 }
 
-        return {
+        last_explore_data = {
             'trending': all_stocks[:15],
             'gainers': gainers_list[:12],
             'losers': losers_list[:12],
             'popular': active_list[:12],
             'sectors': sectors_data
-        }   
+        }
+        return last_explore_data
         
+    except UpstreamUnavailable as e:
+        print(f"Explore data upstream unavailable: {e}")
+        if last_explore_data is not None:
+            return {**last_explore_data, 'stale': True}
+        return {"error": "Market data temporarily unavailable"}
     except Exception as e:
         print(f"Explore data error: {e}")
         return {"error": "Failed to fetch market data"}
@@ -353,19 +679,7 @@ def explore_data():
 def debug_users():
     """Debug endpoint to see users in database"""
     try:
-        db_conn = db_manager.get_connection()
-        cursor = db_conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, firebase_uid, username, email, created_at 
-            FROM users 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        """)
-        
-        users = cursor.fetchall()
-        cursor.close()
-        db_conn.close()
+        users = db_manager.get_recent_users(10)
         
         # Convert to list of dicts for JSON response
         users_list = []
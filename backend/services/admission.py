@@ -0,0 +1,100 @@
+import os
+import math
+import threading
+from services.model_pool import model_pool, MODEL_POOL_WORKERS
+
+# admission control for /predict and /predict/stream, so a traffic spike degrades
+# answers instead of queueing model work until every request times out.
+# two signals: how many admitted predictions are doing model work right now, and
+# how long fits have been waiting for a model worker lately.
+#   past the degrade thresholds  new predictions skip the models and use the
+#                                trend fallback (model_info.load_shed = true)
+#   past the reject thresholds   503 with Retry-After
+# the fast tier never fits a model, so it's never degraded, only counted towards
+# the hard limit. nothing else goes through here.
+
+ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', '1') == '1'
+ADMISSION_DEGRADE_IN_FLIGHT = int(os.getenv('ADMISSION_DEGRADE_IN_FLIGHT', str(max(1, MODEL_POOL_WORKERS) * 2)))
+ADMISSION_DEGRADE_WAIT_MS = float(os.getenv('ADMISSION_DEGRADE_WAIT_MS', '1500'))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '40'))  # every prediction, degraded or not
+ADMISSION_REJECT_WAIT_MS = float(os.getenv('ADMISSION_REJECT_WAIT_MS', '6000'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))  # seconds, at least
+
+FULL, DEGRADED, REJECTED = 'full', 'degraded', 'rejected'
+
+class Ticket:
+    #one admitted (or refused) prediction. release() once it's done, it's safe to call twice
+    def __init__(self, controller, decision: str, runs_model: bool = False, retry_after: int = 0):
+        self.controller = controller
+        self.decision = decision
+        self.runs_model = runs_model
+        self.retry_after = retry_after
+        self.released = decision == REJECTED
+
+    @property
+    def degraded(self) -> bool:
+        return self.decision == DEGRADED
+
+    @property
+    def rejected(self) -> bool:
+        return self.decision == REJECTED
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+    def __del__(self):
+        # a stream whose generator never got started (client gone before the
+        # first byte) never reaches its finally, don't leak its slot
+        self.release()
+
+class AdmissionController:
+    def __init__(self, pool=model_pool):
+        self.pool = pool
+        self.lock = threading.RLock()  # __del__ can release a ticket while admit() holds it
+        self.in_flight = 0        # every admitted prediction
+        self.model_in_flight = 0  # the ones running the tier's model
+        self.counts = {FULL: 0, DEGRADED: 0, REJECTED: 0}
+
+    def queue_wait_ms(self) -> float:
+        #recent wait for a model worker, only while something is actually waiting
+        status = self.pool.status()
+        return status["queue_wait_ms"] if status["queued"] > 0 else 0.0
+
+    def admit(self, tier: str) -> Ticket:
+        wait_ms = self.queue_wait_ms() if ADMISSION_CONTROL else 0.0
+        with self.lock:
+            if ADMISSION_CONTROL:
+                if self.in_flight >= ADMISSION_MAX_IN_FLIGHT or wait_ms >= ADMISSION_REJECT_WAIT_MS:
+                    self.counts[REJECTED] += 1
+                    return Ticket(self, REJECTED, retry_after=max(ADMISSION_RETRY_AFTER, math.ceil(wait_ms / 1000)))
+                overloaded = (self.model_in_flight >= ADMISSION_DEGRADE_IN_FLIGHT
+                              or wait_ms >= ADMISSION_DEGRADE_WAIT_MS)
+            else:
+                overloaded = False
+
+            decision = DEGRADED if overloaded and tier != 'fast' else FULL
+            runs_model = decision == FULL and tier != 'fast'
+            self.counts[decision] += 1
+            self.in_flight += 1
+            self.model_in_flight += runs_model
+        return Ticket(self, decision, runs_model)
+
+    def _release(self, ticket: Ticket):
+        with self.lock:
+            self.in_flight -= 1
+            self.model_in_flight -= ticket.runs_model
+
+    def status(self) -> dict:
+        return {
+            "enabled": ADMISSION_CONTROL,
+            "in_flight": self.in_flight,
+            "model_in_flight": self.model_in_flight,
+            "queue_wait_ms": self.queue_wait_ms(),
+            "admitted": self.counts[FULL],
+            "degraded": self.counts[DEGRADED],
+            "rejected": self.counts[REJECTED]
+        }
+
+admission = AdmissionController()
@@ -0,0 +1,338 @@
+import os
+import time
+import queue
+import random
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+# price alerts ("tell me when AAPL goes above 200 / below 150").
+# active rules live in memory, per symbol, as two lists sorted by threshold: one
+# for "above" rules and one for "below". a new price only has to look at the
+# rules between the previous price and this one, and those sit next to each
+# other in the sorted list, so finding them is two bisections and removing them
+# (alerts are one-shot) is one slice delete. cost per tick depends on how many
+# rules fire, not on how many exist.
+#
+# fired alerts go on a queue; the notifier thread marks them triggered in the
+# database in batches (only those still active there, so an alert is reported
+# once). GET /alerts reads what fired from the database.
+#
+# with several workers only one process evaluates alerts: whichever holds the
+# alert lock (db_manager.hold_lock, see watchlist_service.sync_alerts). the
+# others keep an empty engine. the owner reloads the active rules on every
+# refresh, so alerts created or deleted through any worker reach it.
+
+ALERT_QUEUE_SIZE = int(os.getenv('ALERT_QUEUE_SIZE', '100000'))
+ALERT_NOTIFY_BATCH = int(os.getenv('ALERT_NOTIFY_BATCH', '200'))
+ALERT_RECENT_PER_USER = int(os.getenv('ALERT_RECENT_PER_USER', '20'))
+SYNC_BULK_RULES = 1000  # more new rules than this in one sync get bulk loaded
+
+DIRECTIONS = ('above', 'below')
+
+class ThresholdIndex:
+    __slots__ = ('thresholds', 'ids')
+
+    def __init__(self, thresholds: list = None, ids: list = None):
+        self.thresholds = thresholds or []
+        self.ids = ids or []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def insert(self, threshold: float, alert_id: int):
+        position = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(position, threshold)
+        self.ids.insert(position, alert_id)
+
+    def remove(self, threshold: float, alert_id: int) -> bool:
+        position = bisect_left(self.thresholds, threshold)
+        while position < len(self.thresholds) and self.thresholds[position] == threshold:
+            if self.ids[position] == alert_id:
+                del self.thresholds[position], self.ids[position]
+                return True
+            position += 1
+        return False
+
+    def take(self, lo: int, hi: int) -> list:
+        #remove and return the ids in [lo, hi)
+        if hi <= lo:
+            return []
+        taken = self.ids[lo:hi]
+        del self.thresholds[lo:hi], self.ids[lo:hi]
+        return taken
+
+class SymbolAlerts:
+    __slots__ = ('above', 'below', 'last_price')
+
+    def __init__(self):
+        self.above = ThresholdIndex()
+        self.below = ThresholdIndex()
+        self.last_price = None
+
+    def __len__(self):
+        return len(self.above) + len(self.below)
+
+    def crossed(self, price: float) -> list:
+        #ids of the rules this price sets off, taken out of the index
+        last = self.last_price
+        self.last_price = price
+        # above fires once price >= threshold, below once price <= threshold.
+        # with no previous price every rule already satisfied fires.
+        if last is None:
+            fired = self.above.take(0, bisect_right(self.above.thresholds, price))
+            return fired + self.below.take(bisect_left(self.below.thresholds, price), len(self.below))
+        if price > last:
+            return self.above.take(bisect_right(self.above.thresholds, last),
+                                   bisect_right(self.above.thresholds, price))
+        if price < last:
+            return self.below.take(bisect_left(self.below.thresholds, price),
+                                   bisect_left(self.below.thresholds, last))
+        return []
+
+class AlertEngine:
+    def __init__(self, queue_size: int = ALERT_QUEUE_SIZE):
+        self.symbols = defaultdict(SymbolAlerts)
+        self.rules = {}  # id -> (id, user_firebase_uid, symbol, direction, threshold)
+        self.firing = set()  # fired, not marked in the database yet
+        self.fired = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.owner = False  # this process evaluates alerts for the deployment
+        self.lock = threading.Lock()
+
+    def load(self, rules: list):
+        #bulk load (id, user_firebase_uid, symbol, direction, threshold) rows, one sort per list
+        grouped = defaultdict(list)
+        with self.lock:
+            for rule in rules:
+                alert_id, user_firebase_uid, symbol, direction, threshold = rule
+                threshold = float(threshold)  # DECIMAL from postgres
+                self.rules[alert_id] = (alert_id, user_firebase_uid, symbol, direction, threshold)
+                grouped[(symbol, direction)].append((threshold, alert_id))
+
+            for (symbol, direction), entries in grouped.items():
+                index = getattr(self.symbols[symbol], direction)
+                entries.extend(zip(index.thresholds, index.ids))
+                entries.sort()
+                index.thresholds = [threshold for threshold, _ in entries]
+                index.ids = [alert_id for _, alert_id in entries]
+
+    def _satisfied(self, symbol: str, direction: str, threshold: float) -> bool:
+        #already on the other side of the threshold at the last price we know
+        alerts = self.symbols.get(symbol)
+        last = alerts.last_price if alerts is not None else None
+        return last is not None and (last >= threshold if direction == 'above' else last <= threshold)
+
+    def add(self, alert_id: int, user_firebase_uid: str, symbol: str, direction: str, threshold: float):
+        threshold = float(threshold)
+        rule = (alert_id, user_firebase_uid, symbol, direction, threshold)
+        with self.lock:
+            satisfied = self._satisfied(symbol, direction, threshold)
+            if satisfied:
+                # fire on the price we know
+                last = self.symbols[symbol].last_price
+                self.firing.add(alert_id)
+            else:
+                self.rules[alert_id] = rule
+                getattr(self.symbols[symbol], direction).insert(threshold, alert_id)
+        if satisfied:
+            self._fire(symbol, last, [rule])
+
+    def sync(self, rules: list) -> tuple:
+        #make the index match the active rules in the database: new ones are added,
+        #ones deleted (or fired) elsewhere removed. returns (added, removed)
+        active = {rule[0]: rule for rule in rules}
+        with self.lock:
+            removed = [alert_id for alert_id in self.rules if alert_id not in active]
+            # still active in the database only because the notifier hasn't marked them yet
+            added = [rule for alert_id, rule in active.items()
+                     if alert_id not in self.rules and alert_id not in self.firing]
+        for alert_id in removed:
+            self.remove(alert_id)
+        if len(added) > SYNC_BULK_RULES:
+            # one sort per list instead of an insert each (the first sync brings everything)
+            with self.lock:
+                ready = [rule for rule in added if not self._satisfied(rule[2], rule[3], float(rule[4]))]
+            self.load(ready)
+            added_ids = {rule[0] for rule in ready}
+            for rule in added:
+                if rule[0] not in added_ids:
+                    self.add(*rule)
+        else:
+            for rule in added:
+                self.add(*rule)
+        return len(added), len(removed)
+
+    def settled(self, alert_ids: list):
+        #the notifier is done with these (marked, or failed and left active for the next sync)
+        with self.lock:
+            self.firing.difference_update(alert_ids)
+
+    def remove(self, alert_id: int) -> bool:
+        with self.lock:
+            rule = self.rules.pop(alert_id, None)
+            if rule is None:
+                return False
+            _, _, symbol, direction, threshold = rule
+            return getattr(self.symbols[symbol], direction).remove(threshold, alert_id)
+
+    def on_price(self, symbol: str, price: float) -> int:
+        #feed one quote, returns how many alerts fired
+        alerts = self.symbols.get(symbol)
+        if alerts is None:
+            return 0
+        with self.lock:
+            ids = alerts.crossed(float(price))
+            rules = [self.rules.pop(alert_id) for alert_id in ids]
+            self.firing.update(ids)
+        self._fire(symbol, price, rules)
+        return len(rules)
+
+    def on_quotes(self, quotes: dict):
+        #symbol -> quote dict (stock_current_price shape)
+        for symbol, quote in quotes.items():
+            if quote is not None:
+                self.on_price(symbol, quote["current_price"])
+
+    def _fire(self, symbol: str, price: float, rules: list):
+        now = time.time()
+        for alert_id, user_firebase_uid, _, direction, threshold in rules:
+            try:
+                self.fired.put_nowait({
+                    "alert_id": alert_id,
+                    "user_firebase_uid": user_firebase_uid,
+                    "symbol": symbol,
+                    "direction": direction,
+                    "threshold": threshold,
+                    "price": float(price),
+                    "fired_at": now
+                })
+            except queue.Full:
+                # the rule is already out of the index, it stays active in the
+                # database and comes back on the next sync
+                self.dropped += 1
+                self.settled([alert_id])
+
+    def watched_symbols(self) -> list:
+        with self.lock:
+            return [symbol for symbol, alerts in self.symbols.items() if len(alerts)]
+
+    def status(self) -> dict:
+        return {
+            "owner": self.owner,
+            "rules": len(self.rules),
+            "symbols": len(self.watched_symbols()),
+            "queued": self.fired.qsize(),
+            "dropped": self.dropped
+        }
+
+class AlertNotifier(threading.Thread):
+    #drains the fired queue: marks alerts triggered in batches
+    def __init__(self, engine: AlertEngine, mark_triggered):
+        super().__init__(name='alert-notifier', daemon=True)
+        self.engine = engine
+        self.mark_triggered = mark_triggered  # [(alert_id, price)] -> ids that were still active
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                batch = [self.engine.fired.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < ALERT_NOTIFY_BATCH:
+                try:
+                    batch.append(self.engine.fired.get_nowait())
+                except queue.Empty:
+                    break
+            self.notify(batch)
+
+    def notify(self, batch: list) -> list:
+        #the alerts of the batch this call actually triggered
+        alert_ids = [alert["alert_id"] for alert in batch]
+        try:
+            flipped = set(self.mark_triggered([(alert["alert_id"], alert["price"]) for alert in batch]))
+        except Exception as e:
+            # still active in the database, they fire again after the next sync
+            print(f"Could not mark {len(batch)} alerts as triggered: {e}")
+            flipped = set()
+        finally:
+            self.engine.settled(alert_ids)
+
+        notified = []
+        for alert in batch:
+            if alert["alert_id"] not in flipped:
+                continue  # fired before, or deleted meanwhile
+            flipped.discard(alert["alert_id"])
+            notified.append(alert)
+            print(f"Alert {alert['alert_id']}: {alert['symbol']} {alert['direction']} "
+                  f"{alert['threshold']} at {alert['price']:.2f}")
+        return notified
+
+    def stop(self):
+        self.stopping.set()
+
+def recently_fired(alerts: list, limit: int = ALERT_RECENT_PER_USER) -> list:
+    #the user's triggered alerts (get_user_alerts rows), newest first
+    fired = [alert for alert in alerts if alert['triggered_at']]
+    fired.sort(key=lambda alert: alert['triggered_at'], reverse=True)
+    return [{
+        "alert_id": alert['id'],
+        "symbol": alert['stock'],
+        "direction": alert['direction'],
+        "threshold": alert['threshold'],
+        "price": alert['triggered_price'],
+        "fired_at": alert['triggered_at']
+    } for alert in fired[:limit]]
+
+alert_engine = AlertEngine()
+
+def benchmark(n_rules: int, n_symbols: int, ticks: int, seed: int = 0):
+    #synthetic rules around a random walk per symbol, evaluated tick by tick
+    rng = random.Random(seed)
+    symbols = [f"S{i:04d}" for i in range(n_symbols)]
+    prices = {symbol: rng.uniform(20, 500) for symbol in symbols}
+    rules = []
+    for alert_id in range(n_rules):
+        symbol = rng.choice(symbols)
+        direction = rng.choice(DIRECTIONS)
+        offset = rng.uniform(0.01, 0.3)
+        threshold = prices[symbol] * (1 + offset if direction == 'above' else 1 - offset)
+        rules.append((alert_id, f"user{alert_id % 100000}", symbol, direction, round(threshold, 2)))
+
+    engine = AlertEngine(queue_size=n_rules)
+    began = time.perf_counter()
+    engine.load(rules)
+    print(f"loaded {n_rules:,} rules over {n_symbols} symbols in {time.perf_counter() - began:.2f}s")
+    for symbol in symbols:
+        engine.on_price(symbol, prices[symbol])
+
+    fired = 0
+    latencies = []
+    for _ in range(ticks):
+        symbol = rng.choice(symbols)
+        prices[symbol] *= 1 + rng.gauss(0, 0.02)
+        began = time.perf_counter()
+        fired += engine.on_price(symbol, prices[symbol])
+        latencies.append(time.perf_counter() - began)
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e6
+    print(f"{ticks:,} ticks, {fired:,} alerts fired, {engine.status()['rules']:,} rules left")
+    print(f"per tick: p50 {pick(0.5):.1f}us  p99 {pick(0.99):.1f}us  max {latencies[-1] * 1e6:.1f}us")
+
+    # the naive way for comparison: every rule checked against every price, once
+    began = time.perf_counter()
+    for _, _, symbol, direction, threshold in rules:
+        _ = prices[symbol] >= threshold if direction == 'above' else prices[symbol] <= threshold
+    print(f"naive full scan: {(time.perf_counter() - began) * 1e3:.0f}ms per pass")
+
+if __name__ == "__main__":
+    # e.g. python -m services.alert_service --rules 1000000 --symbols 500
+    parser = argparse.ArgumentParser(description="Benchmark the alert evaluator on synthetic rules")
+    parser.add_argument("--rules", type=int, default=1000000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=100000)
+    args = parser.parse_args()
+    benchmark(args.rules, args.symbols, args.ticks)
@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from utils.price_series import PriceSeries
+from services.upstream import yahoo, yfinance_session, checked_download, download_failure
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from services.prediction_service import (simple_arima_prediction, random_forest_prediction,
+                                         fallback_prediction, build_rf_dataset, RF_FEATURE_WINDOW)
+
+# walk-forward backtester for the prediction models.
+# every cutoff only sees the bars up to and including the cutoff, same lookback
+# the live /predict uses (see determine_period), and is scored against the close
+# `days_ahead` trading days later.
+
+MODELS = {
+    'arima': simple_arima_prediction,
+    'random_forest': random_forest_prediction,
+    'fallback': fallback_prediction,
+}
+
+# trading days covered by the periods determine_period hands to yf.download
+PERIOD_TRADING_DAYS = {"1mo": 21, "3mo": 63, "6mo": 126, "1y": 252}
+
+RESULT_COLUMNS = ['symbol', 'model', 'days_ahead', 'cutoff_date', 'current_price',
+                  'predicted_price', 'actual_price', 'error_pct', 'abs_error_pct',
+                  'direction_correct', 'confidence', 'method', 'latency_ms']
+
+def lookback_for(days_ahead: int) -> int:
+    #mirror helpers.determine_period without pulling in the sentiment/yfinance helpers
+    if days_ahead <= 3:
+        return PERIOD_TRADING_DAYS["1mo"]
+    elif days_ahead <= 10:
+        return PERIOD_TRADING_DAYS["3mo"]
+    elif days_ahead <= 30:
+        return PERIOD_TRADING_DAYS["6mo"]
+    return PERIOD_TRADING_DAYS["1y"]
+
+def load_price_panel(symbols: list, years: int = 5) -> dict:
+    #one bulk download for every symbol, returns symbol -> (dates, closes)
+    data = yahoo.call(checked_download, symbols, period=f"{years}y", progress=False, threads=True,
+                      session=yfinance_session, validate=download_failure, budget=600)
+    if data.empty or "Close" not in data.columns:
+        return {}
+
+    closes = data["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+
+    panel = {}
+    for symbol in closes.columns:
+        series = closes[symbol].dropna()
+        if len(series) < 2:
+            print(f"Skipping {symbol}: no price history")
+            continue
+        dates = series.index.strftime("%Y-%m-%d").to_numpy()
+        panel[symbol] = (dates, np.ascontiguousarray(series.to_numpy(dtype=float)))
+    return panel
+
+def walk_forward_cutoffs(n_bars: int, days_ahead: int, step: int, min_history: int) -> np.ndarray:
+    #indices of the last bar visible at each cutoff. the target bar must exist.
+    first = max(min_history, lookback_for(days_ahead)) - 1
+    last = n_bars - 1 - days_ahead
+    if last < first:
+        return np.empty(0, dtype=np.int64)
+    return np.arange(first, last + 1, step)
+
+def _silence_worker():
+    #the models print a lot; nobody reads it in a sweep and it costs time
+    sys.stdout = open(os.devnull, 'w')
+
+def _run_chunk(symbol, dates, closes, days_ahead, cutoffs, models, rf_dataset):
+    rows = {col: [] for col in RESULT_COLUMNS}
+    lookback = lookback_for(days_ahead)
+
+    for cutoff in cutoffs:
+        start = max(0, cutoff + 1 - lookback)
+        series = PriceSeries(closes[start:cutoff + 1])  # a view, shared by every model at this cutoff
+        current_price = float(closes[cutoff])
+        actual_price = float(closes[cutoff + days_ahead])
+
+        for model_name in models:
+            kwargs = {}
+            if model_name == 'random_forest' and rf_dataset is not None:
+                # rows of the series-wide dataset this cutoff would have built itself:
+                # window inside the lookback and the target already known
+                X, y, row_idx = rf_dataset
+                mask = (row_idx - RF_FEATURE_WINDOW >= start) & (row_idx + days_ahead <= cutoff)
+                kwargs['dataset'] = (X[mask], y[mask])
+
+            began = time.perf_counter()
+            result = MODELS[model_name](series, days_ahead, current_price, **kwargs)
+            latency_ms = (time.perf_counter() - began) * 1000
+
+            predicted = float(result['predicted_price'])
+            error_pct = (predicted - actual_price) / actual_price * 100
+            rows['symbol'].append(symbol)
+            rows['model'].append(model_name)
+            rows['days_ahead'].append(days_ahead)
+            rows['cutoff_date'].append(dates[cutoff])
+            rows['current_price'].append(current_price)
+            rows['predicted_price'].append(predicted)
+            rows['actual_price'].append(actual_price)
+            rows['error_pct'].append(error_pct)
+            rows['abs_error_pct'].append(abs(error_pct))
+            rows['direction_correct'].append(
+                (predicted >= current_price) == (actual_price >= current_price))
+            rows['confidence'].append(float(result.get('confidence', 0)))
+            rows['method'].append(str(result.get('method', 'unknown')))
+            rows['latency_ms'].append(latency_ms)
+
+    return rows
+
+def run_backtest(panel: dict, horizons=(1, 7, 30), models=('arima', 'random_forest', 'fallback'),
+                 step: int = 5, min_history: int = 60, workers: int = None, chunk_size: int = 25):
+    #fan (symbol, horizon, cutoff chunk) tasks out over a process pool
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        raise ValueError(f"Unknown models: {unknown}")
+
+    workers = workers or os.cpu_count() or 1
+    results = {col: [] for col in RESULT_COLUMNS}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_silence_worker) as pool:
+        futures = []
+        for symbol, (dates, closes) in panel.items():
+            for days_ahead in horizons:
+                cutoffs = walk_forward_cutoffs(len(closes), days_ahead, step, min_history)
+                if len(cutoffs) == 0:
+                    continue
+                # features for the whole series once, each chunk just masks its rows
+                rf_dataset = build_rf_dataset(closes, days_ahead) if 'random_forest' in models else None
+                for i in range(0, len(cutoffs), chunk_size):
+                    futures.append(pool.submit(_run_chunk, symbol, dates, closes, days_ahead,
+                                               cutoffs[i:i + chunk_size], models, rf_dataset))
+
+        print(f"Backtest: {len(panel)} symbols, {len(futures)} tasks on {workers} workers")
+        for done, future in enumerate(as_completed(futures), 1):
+            chunk = future.result()
+            for col in RESULT_COLUMNS:
+                results[col].extend(chunk[col])
+            if done % 100 == 0:
+                print(f"  {done}/{len(futures)} tasks done")
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+def write_results(results: pd.DataFrame, path: str) -> str:
+    #parquet when pyarrow is around, otherwise one npz array per column
+    try:
+        import pyarrow  # noqa: F401
+        path = os.path.splitext(path)[0] + ".parquet"
+        results.to_parquet(path, index=False)
+    except ImportError:
+        path = os.path.splitext(path)[0] + ".npz"
+        np.savez_compressed(path, **{col: results[col].to_numpy() for col in results.columns})
+    return path
+
+def summarise(results: pd.DataFrame) -> pd.DataFrame:
+    grouped = results.groupby(['model', 'days_ahead'])
+    return pd.DataFrame({
+        'predictions': grouped.size(),
+        'mape': grouped['abs_error_pct'].mean(),
+        'median_ape': grouped['abs_error_pct'].median(),
+        'bias_pct': grouped['error_pct'].mean(),
+        'hit_rate': grouped['direction_correct'].mean(),
+        'latency_p50_ms': grouped['latency_ms'].quantile(0.5),
+        'latency_p95_ms': grouped['latency_ms'].quantile(0.95),
+    }).round(3)
+
+if __name__ == "__main__":
+    # e.g. python -m services.backtest_service AAPL MSFT NVDA --years 5 --step 5
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the prediction models")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--horizons", type=int, nargs="+", default=[1, 7, 30])
+    parser.add_argument("--models", nargs="+", default=list(MODELS))
+    parser.add_argument("--step", type=int, default=5, help="trading days between cutoffs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="backtest_results.parquet")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    panel = load_price_panel([s.upper() for s in args.symbols], args.years)
+    results = run_backtest(panel, args.horizons, args.models, args.step, workers=args.workers)
+    path = write_results(results, args.output)
+
+    print(summarise(results).to_string())
+    print(f"{len(results)} predictions written to {path} in {time.perf_counter() - began:.1f}s")
@@ -0,0 +1,130 @@
+import os
+import time
+import numpy as np
+from services.stock_service import cached_closes_many, period_start
+from services.prediction_service import recent_result
+from config.database import db_manager
+from utils.helpers import classify_volatility
+from utils.price_series import TRADING_DAYS_PER_YEAR
+
+# side-by-side comparison of up to COMPARE_MAX_SYMBOLS stocks.
+# closes for every symbol come from the price cache (one batched download for
+# whatever is missing), get aligned on the union of their dates into one
+# (dates x symbols) matrix, and everything after that is whole-matrix numpy:
+# no loop over symbols or pairs.
+# a signed-in user gets their own latest saved prediction for each symbol, like on
+# the watchlist; anyone else (or a symbol they never predicted) the shared recent one.
+
+COMPARE_MAX_SYMBOLS = int(os.getenv('COMPARE_MAX_SYMBOLS', '50'))
+
+def align_panel(windows: dict, symbols: list):
+    #(dates, matrix) with one column per symbol, NaN where a symbol has no bar that day
+    dates = np.unique(np.concatenate([windows[s][0] for s in symbols]))
+    panel = np.full((len(dates), len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        timestamps, closes = windows[symbol]
+        panel[np.searchsorted(dates, timestamps), column] = closes
+    return dates, panel
+
+def daily_returns(panel: np.ndarray) -> np.ndarray:
+    #returns between consecutive dates, NaN where either bar is missing
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return panel[1:] / panel[:-1] - 1
+
+def pairwise_correlation(returns: np.ndarray) -> np.ndarray:
+    #pearson correlation of every pair of columns over the days both have a return,
+    #done as a handful of matrix products instead of a loop over pairs
+    present = (~np.isnan(returns)).astype(float)
+    x = np.where(present > 0, returns, 0.0)
+
+    n = present.T @ present       # days both columns have
+    sum_x = x.T @ present          # sum of column i over those days
+    sum_y = sum_x.T                # sum of column j over those days
+    sum_xx = (x * x).T @ present
+    sum_yy = sum_xx.T
+    sum_xy = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * sum_xy - sum_x * sum_y
+        variance = (n * sum_xx - sum_x ** 2) * (n * sum_yy - sum_y ** 2)
+        correlation = covariance / np.sqrt(variance)
+    correlation[n < 3] = np.nan
+    np.fill_diagonal(correlation, 1.0)
+    return np.clip(correlation, -1.0, 1.0)
+
+def normalised_performance(filled: np.ndarray) -> np.ndarray:
+    #each (forward-filled) column rebased to 100 at its first bar
+    first_row = np.argmax(~np.isnan(filled), axis=0)
+    base = filled[first_row, np.arange(filled.shape[1])]
+    return filled / base * 100
+
+def forward_fill(panel: np.ndarray) -> np.ndarray:
+    rows = np.where(~np.isnan(panel), np.arange(len(panel))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return panel[rows, np.arange(panel.shape[1])]
+
+def nulls_for_nan(values: np.ndarray, decimals: int) -> list:
+    #nested lists with None where there's no value (NaN isn't valid JSON)
+    return np.where(np.isnan(values), None, np.round(values, decimals)).tolist()
+
+def compare_predictions(symbols: list, days_ahead: int, tier: str, user_firebase_uid: str = None) -> dict:
+    #symbol -> prediction, tagged with where it came from, None when there's none
+    saved = db_manager.get_latest_predictions(user_firebase_uid, symbols) if user_firebase_uid else {}
+    predictions = {}
+    for symbol in symbols:
+        if symbol in saved:
+            predictions[symbol] = {**saved[symbol], 'source': 'history'}
+            continue
+        cached = recent_result(symbol, days_ahead, tier)
+        if cached is not None:
+            age, result = cached
+            cached = {**result, 'source': 'recent', 'age_seconds': round(age, 1)}
+        predictions[symbol] = cached
+    return predictions
+
+def compare_stocks(symbols: list, period: str = "6mo", days_ahead: int = 1, tier: str = "standard",
+                   user_firebase_uid: str = None):
+    started = time.perf_counter()
+    start = period_start(period)
+    if start is None:
+        return {"error": f"Unsupported period: {period}"}
+
+    windows = cached_closes_many(symbols, start)
+    found = [s for s in symbols if s in windows and len(windows[s][0]) >= 2]
+    missing = [s for s in symbols if s not in found]
+    if not found:
+        return {"error": "Unable to fetch price data for any of the symbols"}
+
+    dates, panel = align_panel(windows, found)
+    returns = daily_returns(panel)
+    filled = forward_fill(panel)
+    performance = normalised_performance(filled)
+    volatility = np.nanstd(returns, axis=0) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    correlation = pairwise_correlation(returns)
+    last = filled[-1]
+
+    predictions = compare_predictions(found, days_ahead, tier, user_firebase_uid)
+    stocks = []
+    for column, symbol in enumerate(found):
+        stocks.append({
+            "symbol": symbol,
+            "current_price": round(float(last[column]), 4),
+            "return_percent": round(float(performance[-1, column]) - 100, 2),
+            "volatility": round(float(volatility[column]), 4),
+            "volatility_level": classify_volatility(volatility[column]),
+            "prediction": predictions[symbol]
+        })
+
+    return {
+        "symbols": found,
+        "missing": missing,
+        "period": period,
+        "stocks": stocks,
+        "performance": {
+            "dates": dates.astype('datetime64[s]').astype('datetime64[D]').astype(str).tolist(),
+            # one row per date, columns in `symbols` order, null where a symbol has no bar yet
+            "values": nulls_for_nan(performance, 2)
+        },
+        "correlation": nulls_for_nan(correlation, 3),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000)
+    }
@@ -0,0 +1,222 @@
+import os
+import re
+import math
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# incremental training for the long-term Random Forest.
+# per (symbol, days_ahead) we keep the feature matrix and the fitted forest on disk.
+# when new daily bars arrive only the newly matured samples get featurised and
+# appended, and a slice of the trees is regrown. full refits only happen on a
+# schedule or when the forest's error on the new samples drifts.
+#
+# only confirmed bars (everything but the last, possibly intraday, bar) go into
+# the training set, otherwise every request during market hours looks like a
+# revision of history.
+#
+# the file is shared by every process that trains (model pool workers, uvicorn
+# workers): an update holds an flock on SYMBOL_DAYS.lock from load to save, and
+# reloads first if someone else saved since this process last read it, so no
+# process refreshes a stale forest and writes it over a newer one.
+
+RF_INCREMENTAL = os.getenv('RF_INCREMENTAL', '0') == '1'
+MODEL_STORE_DIR = os.getenv('RF_MODEL_DIR', 'model_store')
+FULL_REFIT_DAYS = float(os.getenv('RF_FULL_REFIT_DAYS', '7'))
+REFRESH_FRACTION = float(os.getenv('RF_REFRESH_FRACTION', '0.1'))  # of the trees, per new sample
+DRIFT_RATIO = float(os.getenv('RF_DRIFT_RATIO', '2.0'))
+
+N_ESTIMATORS = 50
+TAIL_LENGTH = 5         # bars used to line a new series up with the stored one
+MAX_NEW_BARS = 20       # more than this and a full refit is cheaper anyway
+DRIFT_MIN_SAMPLES = 5
+DRIFT_WINDOW = 20       # recent out-of-sample errors the drift check averages
+HOLDOUT_FRACTION = 0.25 # newest windows held out at refit time to measure the baseline error
+
+def new_forest(random_state: int = 42):
+    #same hyperparameters as random_forest_prediction
+    return RandomForestRegressor(n_estimators=N_ESTIMATORS,
+                                 random_state=random_state,
+                                 max_depth=8,
+                                 min_samples_split=5,
+                                 min_samples_leaf=2)
+
+def holdout_mae(X: np.ndarray, y: np.ndarray) -> float:
+    #error on windows the forest hasn't seen, which is what the drift check measures later:
+    #fit on all but the newest HOLDOUT_FRACTION of the windows, score on those.
+    #(the error on the training rows is several times lower, drift would fire on noise)
+    holdout = max(1, int(len(X) * HOLDOUT_FRACTION))
+    probe = new_forest()
+    probe.fit(X[:-holdout], y[:-holdout])
+    return float(np.mean(np.abs(probe.predict(X[-holdout:]) - y[-holdout:])))
+
+class IncrementalForest:
+    def __init__(self, symbol: str, days_ahead: int, store_dir: str = MODEL_STORE_DIR):
+        safe_symbol = re.sub(r'[^A-Z0-9.^=-]', '_', symbol.upper())
+        self.path = os.path.join(store_dir, f"{safe_symbol}_{days_ahead}.joblib")
+        self.days_ahead = days_ahead
+        self.lock = threading.Lock()
+        self.state = None
+        self.loaded_key = None  # (inode, mtime) of the file self.state came from
+
+    @staticmethod
+    def _file_key(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @contextmanager
+    def _locked(self):
+        #this process's threads, then the other processes
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path[:-len('.joblib')] + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        #the stored forest, reread when another process saved a newer one
+        key = self._file_key(self.path)
+        if key is None:
+            self.state = self.loaded_key = None
+        elif key != self.loaded_key:
+            try:
+                self.state = joblib.load(self.path)
+                self.loaded_key = key
+            except Exception as e:
+                print(f"Could not load stored forest {self.path}: {e}")
+                self.state = self.loaded_key = None
+        return self.state
+
+    def _save(self):
+        #write then rename so another worker never reads half a file
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(self.state, tmp_path)
+        os.replace(tmp_path, self.path)
+        self.loaded_key = self._file_key(self.path)
+
+    def _new_bar_count(self, confirmed: np.ndarray):
+        #how many confirmed bars were added since the stored tail, None if it doesn't line up
+        tail = self.state['tail']
+        m = len(confirmed)
+        for k in range(0, MAX_NEW_BARS + 1):
+            end = m - k
+            if end < TAIL_LENGTH:
+                break
+            if np.allclose(confirmed[end - TAIL_LENGTH:end], tail, rtol=1e-6, atol=0):
+                return k
+        return None
+
+    def _full_refit(self, confirmed: np.ndarray, reason: str):
+        from services.prediction_service import build_rf_dataset
+
+        X, y, _ = build_rf_dataset(confirmed, self.days_ahead)
+        if len(X) < 20:
+            self.state = None
+            return None
+
+        model = new_forest()
+        model.fit(X, y)
+        now = time.time()
+        self.state = {
+            'model': model,
+            'X': X,
+            'y': y,
+            'max_samples': len(X),
+            'tail': confirmed[-TAIL_LENGTH:].copy(),
+            'baseline_mae': holdout_mae(X, y),
+            'recent_errors': [],
+            'fitted_at': now,
+            'refreshed_at': now,
+            'refreshes': 0,
+        }
+        print(f"RF full refit ({reason}) on {len(X)} samples: {self.path}")
+        self._save()
+        return self.state
+
+    def _refresh(self, X_new: np.ndarray, y_new: np.ndarray):
+        state = self.state
+        model = state['model']
+
+        # drift check on samples the forest has never seen
+        errors = np.abs(model.predict(X_new) - y_new)
+        state['recent_errors'] = (state['recent_errors'] + errors.tolist())[-self._drift_window():]
+
+        X = np.vstack([state['X'], X_new])[-state['max_samples']:]
+        y = np.concatenate([state['y'], y_new])[-state['max_samples']:]
+        state['X'], state['y'] = X, y
+
+        # regrow the oldest trees, how many depends on how much is new
+        n_replace = min(N_ESTIMATORS, max(1, math.ceil(len(X_new) * N_ESTIMATORS * REFRESH_FRACTION)))
+        model.estimators_ = model.estimators_[n_replace:]
+        state['refreshes'] += 1
+        model.set_params(warm_start=True, n_estimators=N_ESTIMATORS,
+                         random_state=42 + state['refreshes'])
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+
+        state['refreshed_at'] = time.time()
+        print(f"RF refreshed {n_replace}/{N_ESTIMATORS} trees with {len(X_new)} new samples")
+
+    def _drift_window(self) -> int:
+        # consecutive n-day targets overlap, 20 of them are only 20/n independent moves;
+        # keep enough that noise alone doesn't double the mean
+        return max(DRIFT_WINDOW, DRIFT_MIN_SAMPLES * self.days_ahead)
+
+    def _drifted(self) -> bool:
+        errors = self.state['recent_errors']
+        if len(errors) < max(DRIFT_MIN_SAMPLES, self._drift_window() // 2):
+            return False
+        return float(np.mean(errors)) > DRIFT_RATIO * max(self.state['baseline_mae'], 1e-9)
+
+    def update(self, prices):
+        #returns (model, X, y) ready for prediction, or None if there isn't enough data
+        from services.prediction_service import build_rf_dataset, RF_FEATURE_WINDOW
+
+        confirmed = np.asarray(prices, dtype=float)[:-1]
+        with self._locked():
+            if self._load() is None:
+                state = self._full_refit(confirmed, "no stored model")
+            elif time.time() - self.state['fitted_at'] > FULL_REFIT_DAYS * 86400:
+                state = self._full_refit(confirmed, "scheduled")
+            else:
+                new_bars = self._new_bar_count(confirmed)
+                if new_bars is None:
+                    state = self._full_refit(confirmed, "history revised")
+                elif new_bars == 0:
+                    state = self.state
+                else:
+                    # only the windows whose target landed in the new bars
+                    tail = confirmed[-(new_bars + self.days_ahead + RF_FEATURE_WINDOW):]
+                    X_new, y_new, _ = build_rf_dataset(tail, self.days_ahead)
+                    self.state['tail'] = confirmed[-TAIL_LENGTH:].copy()
+                    if len(X_new):
+                        self._refresh(X_new, y_new)
+                    if self._drifted():
+                        state = self._full_refit(confirmed, "drift")
+                    else:
+                        state = self.state
+                        self._save()
+
+            if state is None:
+                return None
+            return state['model'], state['X'], state['y']
+
+_forests = {}
+_forests_lock = threading.Lock()
+
+def get_incremental_forest(symbol: str, days_ahead: int) -> IncrementalForest:
+    key = (symbol.upper(), days_ahead)
+    with _forests_lock:
+        if key not in _forests:
+            _forests[key] = IncrementalForest(symbol, days_ahead)
+        return _forests[key]
@@ -0,0 +1,168 @@
+import io
+import os
+import time
+import threading
+import contextlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+# model fitting (ARIMA, Random Forest) runs in a pool of worker processes instead
+# of the request threads: a fit holds the GIL for seconds at a time, and in-process
+# a few long-horizon predictions were enough to stall / and /history. the workers
+# import statsmodels/sklearn and do one tiny fit each when they start, and they
+# are all started with the app, so the first real fit doesn't pay for the imports.
+#
+# at most MODEL_POOL_WORKERS fits run at once and MODEL_POOL_QUEUE more can wait;
+# past that a fit is refused straight away instead of queueing behind work that
+# would miss its deadline anyway. a fit that takes longer than its timeout is
+# given up on (the caller falls back) and cancelled if it hasn't started.
+# MODEL_POOL_WORKERS=0 runs fits in the calling thread like before.
+
+MODEL_POOL_WORKERS = int(os.getenv('MODEL_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+MODEL_POOL_QUEUE = int(os.getenv('MODEL_POOL_QUEUE', str(MODEL_POOL_WORKERS * 4)))
+MODEL_TASK_TIMEOUT = float(os.getenv('MODEL_TASK_TIMEOUT', '30'))  # seconds, upper bound per fit
+# spawn: workers start clean instead of forking a process full of threads
+MODEL_POOL_START_METHOD = os.getenv('MODEL_POOL_START_METHOD', 'spawn')
+
+class ModelPoolBusy(Exception):
+    #queue full, fit timed out or a worker died. the caller should use its fallback
+    pass
+
+def _warm_worker():
+    #runs once in every worker: the imports and a first fit of each model
+    import numpy as np
+    from services.prediction_service import simple_arima_prediction, random_forest_prediction
+
+    prices = 100 * np.cumprod(1 + np.random.default_rng(0).normal(0, 0.01, 120))
+    with contextlib.redirect_stdout(io.StringIO()):
+        simple_arima_prediction(prices, 1, prices[-1], max_time=1)
+        random_forest_prediction(prices, 10, prices[-1])
+
+def _timed_call(fn, args, kwargs):
+    #(when the worker picked it up, result), the gap since submit is queue wait
+    return time.time(), fn(*args, **kwargs)
+
+class ModelPool:
+    def __init__(self, workers: int = MODEL_POOL_WORKERS, queue_size: int = MODEL_POOL_QUEUE,
+                 timeout: float = MODEL_TASK_TIMEOUT):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max(1, self.capacity))
+        self.executor = None
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.queue_wait = 0.0  # seconds, moving average
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(MODEL_POOL_START_METHOD),
+                    initializer=_warm_worker
+                )
+            return self.executor
+
+    def start(self):
+        #start every worker now rather than on the first fits. blocks until they're up
+        if self.workers <= 0:
+            return
+        began = time.perf_counter()
+        executor = self._executor()
+        # none of them is idle yet, so each of these makes the executor start another process
+        pids = {future.result() for future in [executor.submit(os.getpid) for _ in range(self.workers)]}
+        print(f"Model pool: {self.workers} workers started in {time.perf_counter() - began:.1f}s "
+              f"({len(pids)} answered the warm-up)")
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _restart(self, broken):
+        #a worker died (OOM, segfault in a native lib): that executor is unusable, start a new one
+        with self.lock:
+            if self.executor is not broken:
+                return
+            self.executor = None
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("Model pool: a worker died, restarting the pool")
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        #fn(*args, **kwargs) in a worker. never raises, a refused fit is a future holding ModelPoolBusy
+        future = Future()
+        if self.workers <= 0:
+            try:
+                future.set_result((time.time(), fn(*args, **kwargs)))
+            except Exception as e:
+                future.set_exception(e)
+            future.submitted_at = time.time()
+            return future
+
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            future.set_exception(ModelPoolBusy(f"model queue full ({self.capacity} fits)"))
+            return future
+
+        try:
+            future = self._executor().submit(_timed_call, fn, args, kwargs)
+        except Exception as e:
+            self.slots.release()
+            future.set_exception(ModelPoolBusy(f"model pool unavailable: {e}"))
+            return future
+        future.submitted_at = time.time()
+        with self.lock:
+            self.in_flight += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self.slots.release()
+
+    def result(self, future: Future, timeout: float = None):
+        #the fit's result, ModelPoolBusy if it was refused, overran or lost its worker
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        executor = self.executor
+        try:
+            started_at, result = future.result(timeout=max(0.0, timeout))
+        except FutureTimeout:
+            self.timed_out += 1
+            future.cancel()  # frees the slot if it was still waiting for a worker
+            raise ModelPoolBusy(f"model fit not done after {timeout:.1f}s")
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise ModelPoolBusy("model worker died")
+
+        wait = max(0.0, started_at - future.submitted_at)
+        with self.lock:
+            self.queue_wait = 0.8 * self.queue_wait + 0.2 * wait
+        return result
+
+    def run(self, fn, *args, timeout: float = None, **kwargs):
+        return self.result(self.submit(fn, *args, **kwargs), timeout)
+
+    def status(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "capacity": self.capacity,
+            "queue_wait_ms": round(self.queue_wait * 1000),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts
+        }
+
+model_pool = ModelPool()
@@ -1,30 +1,57 @@
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
 from statsmodels.tsa.arima.model import ARIMA
 import warnings
 warnings.filterwarnings('ignore')
 from services.stock_service import fetch_historical_prices, stock_current_price
+from services.incremental_rf import RF_INCREMENTAL, get_incremental_forest, new_forest
+from services.model_pool import model_pool, ModelPoolBusy
 from utils.helpers import (get_trading_info, obtain_volatility, get_sentiment, 
                           stock_smart_constraint, chart_title, chart_timeframe,
                           determine_period, generate_pred_timeline)
+from utils.deadline import Deadline, DEFAULT_DEADLINE_MS
+from utils.price_series import as_price_series
 from models.response_models import Prediction
 from datetime import datetime
+import os
+import time
+import threading
+from collections import OrderedDict
 
 #ARIMA Model
 
-def simple_arima_prediction(prices: list, days_ahead: int, current_price: float):
+# ARIMA strats in order of likely sucess
+ARIMA_STRATEGIES = [
+    (1,1,1), # Most common, fastest method
+    (0,1,1), # Simple MA model
+    (1,1,0), # Simple AR model
+    (2,1,1), # More complex
+    (1,1,2), # More complex
+    (1,1,1), # Retry with better method
+    (0,1,1), # Retry with better method
+    (2,1,2), # Most complex, more time
+    ]
+
+# thorough tier searches a wider grid with a bigger time budget
+ARIMA_STRATEGIES_WIDE = ARIMA_STRATEGIES + [
+    (0,1,2),
+    (2,1,0),
+    (3,1,1),
+    (1,1,3),
+    (3,1,2),
+    (2,1,3),
+    ]
+
+def simple_arima_prediction(prices: list, days_ahead: int, current_price: float,
+                            strategies: list = None, max_time: float = 4.5):
     try:
         # Convert to returns (more stable than raw prices)
-        returns = []
-        for i in range(1, len(prices)):
-            daily_return = (prices[i] - prices[i-1]) / prices[i-1]
-            returns.append(daily_return)
+        returns = as_price_series(prices).returns()
         
         # Use last 30 days of returns
-        recent_returns = returns[-25:] if len(returns) > 25 else returns
+        recent_returns = returns[-25:]
         
         if len(recent_returns) < 10:
-            if len(recent_returns) >= 5:
+            if len(recent_returns) >= 5 and max_time > 0:
                 try:
                     model = ARIMA(recent_returns, order=(1,1,1))
                     fitted = model.fit()
@@ -51,7 +78,7 @@ def simple_arima_prediction(prices: list, days_ahead: int, current_price: float)
 
                 #fallback when impossible.
 
-            avg_return = np.mean(recent_returns) if recent_returns else 0
+            avg_return = np.mean(recent_returns) if len(recent_returns) else 0
             predicted_price = current_price * (1 + avg_return * days_ahead * 0.1)
             return {
                 'predicted_price': predicted_price,
@@ -60,27 +87,12 @@ def simple_arima_prediction(prices: list, days_ahead: int, current_price: float)
                 'model_params': 'fallback'
             }
         
-        # ARIMA strats in order of likely sucess
-        
-        arima_strategies = [
-            (1,1,1), # Most common, fastest method
-            (0,1,1), # Simple MA model
-            (1,1,0), # Simple AR model
-            (2,1,1), # More complex
-            (1,1,2), # More complex
-            (1,1,1), # Retry with better method
-            (0,1,1), # Retry with better method
-            (2,1,2), # Most complex, more time
-            ]   
-    
+        arima_strategies = strategies or ARIMA_STRATEGIES
+
         best_model = None
         best_aic = float('inf')
         best_params = None
         total_time = 0
-        max_time = 4.5
-        
-        #attempt to fix issue that arima takes LOADS of time
-        import time
         
         for params in arima_strategies:
             if total_time >= max_time:
@@ -107,7 +119,7 @@ def simple_arima_prediction(prices: list, days_ahead: int, current_price: float)
                     print(f"ARIMA{params} succeeded in {fit_time:.2f}s, AIC: {fitted.aic:.2f}")
                 
                 # decent model and are running out of time, stop
-                if best_aic < 0 and total_time > 3.0:
+                if best_aic < 0 and total_time > max_time * 2 / 3:
                     print(f"Good ARIMA model found, stopping early at {total_time:.1f}s")
                     break
                     
@@ -246,6 +258,7 @@ def simple_arima_prediction(prices: list, days_ahead: int, current_price: float)
 def fallback_prediction(prices: list, days_ahead: int, current_price: float):
     #if random forest fails. fall back to a simple trend extrapolation.
     try:
+        prices = as_price_series(prices).values
         if len(prices) > 10:
             #trend from recent prices
             recent_count = min(20, len(prices))  # Use last 20 days or all available
@@ -254,15 +267,15 @@ def fallback_prediction(prices: list, days_ahead: int, current_price: float):
             #linear trend
             if len(recent_prices) >= 3:
                 # Simple slope calculation
-                x_vals = list(range(len(recent_prices)))
+                x_vals = np.arange(len(recent_prices))
                 y_vals = recent_prices
                 
                 #trend (change per day)
                 n = len(recent_prices)
-                sum_x = sum(x_vals)
-                sum_y = sum(y_vals)
-                sum_xy = sum(x * y for x, y in zip(x_vals, y_vals))
-                sum_x2 = sum(x * x for x in x_vals)
+                sum_x = x_vals.sum()
+                sum_y = y_vals.sum()
+                sum_xy = np.dot(x_vals, y_vals)
+                sum_x2 = np.dot(x_vals, x_vals)
                 
                 # linear regression slope
                 if n * sum_x2 - sum_x * sum_x != 0:
@@ -340,18 +353,60 @@ def fallback_prediction(prices: list, days_ahead: int, current_price: float):
             'method': 'emergency_fallback',
             'error': str(e)
         }
-def random_forest_prediction(prices: list, days_ahead: int, current_price: float):
+
+RF_FEATURE_WINDOW = 20
+
+def rf_features(windows: np.ndarray, ref_prices: np.ndarray) -> np.ndarray:
+    #the 8 window features, one row per window (vectorised over all windows at once)
+    mean5 = windows[:, -5:].mean(axis=1)
+    mean10 = windows[:, -10:].mean(axis=1)
+    mean_all = windows.mean(axis=1)
+    last = windows[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.column_stack([
+            mean5 / ref_prices,
+            mean10 / ref_prices,
+            windows[:, -20:].mean(axis=1) / ref_prices,
+            (last - windows[:, -5]) / windows[:, -5],
+            (last - windows[:, -10]) / windows[:, -10],
+            np.where(mean10 > 0, windows[:, -10:].std(axis=1) / mean10, 0),
+            (last - windows[:, 0]) / windows[:, 0],
+            np.where(mean_all > 0, (windows.max(axis=1) - windows.min(axis=1)) / mean_all, 0),
+        ])
+
+def build_rf_dataset(prices, days_ahead: int, size: int = RF_FEATURE_WINDOW):
+    #training rows for every window that has a known future price.
+    #returns (X, y, rows) - rows[k] is the index of the "current" bar of sample k
+    prices = np.asarray(prices, dtype=float)
+    n_rows = len(prices) - days_ahead - size
+    if n_rows <= 0:
+        return np.empty((0, 8)), np.empty(0), np.empty(0, dtype=np.int64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(prices, size)[:n_rows]
+    rows = np.arange(size, size + n_rows)
+    current = prices[rows]
+    future = prices[rows + days_ahead]
+
+    X = rf_features(windows, current)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = (future - current) / current
+
+    # same filters as before: positive prices, finite features, no >100% moves
+    valid = ((windows > 0).all(axis=1) & (current > 0) & (future > 0) &
+             np.isfinite(X).all(axis=1) & np.isfinite(y) & (np.abs(y) <= 1.0))
+    return X[valid], y[valid], rows[valid]
+
+def random_forest_prediction(prices: list, days_ahead: int, current_price: float,
+                             dataset=None, symbol: str = None):
     try:
+        prices = as_price_series(prices)
         if len(prices) < 50:
             print(f"Not enough price data: {len(prices)} points, need at least 50")
             return fallback_prediction(prices, days_ahead, current_price)
         
-        daily_returns = []
-        for i in range(1, min(len(prices), 252)):  # Last year of data max
-            if prices[-i-1] > 0:  # Avoid division by zero
-                daily_return = (prices[-i] - prices[-i-1]) / prices[-i-1]
-                if abs(daily_return) < 0.5:  # Filter out extreme outliers (50%+ moves)
-                    daily_returns.append(daily_return)
+        daily_returns = prices.returns()[-(min(len(prices), 252) - 1):]  # Last year of data max
+        # Filter out extreme outliers (50%+ moves) and zero prices
+        daily_returns = daily_returns[np.isfinite(daily_returns) & (np.abs(daily_returns) < 0.5)]
         
         if len(daily_returns) < 20:
             print(f"Not enough valid daily returns: {len(daily_returns)}")
@@ -369,10 +424,7 @@ def random_forest_prediction(prices: list, days_ahead: int, current_price: float
         expected_volatility = annual_volatility * np.sqrt(time_factor)'''
         #pretty much the same method as under the predict function, just now moving it out.
         
-        X = []
-        y = []
-        
-        size = 20
+        size = RF_FEATURE_WINDOW
 
         min_data_needed = size + days_ahead + 10  # Extra buffer
 
@@ -380,109 +432,46 @@ def random_forest_prediction(prices: list, days_ahead: int, current_price: float
             print(f"Insufficient data for windowing: need {min_data_needed}, have {len(prices)}")
             return fallback_prediction(prices, days_ahead, current_price)
         
-        for i in range(size, len(prices) - days_ahead):
-            try:
-                window = prices[i-size:i]
-                current_window_price = prices[i]
-                future_price = prices[i + days_ahead]
-            
-                if (len(window) != size or 
-                    current_window_price <= 0 or 
-                    future_price <= 0 or
-                    any(p <= 0 for p in window)):
-                    continue
-                
-                # calculate features with error checking
-                try:
-                    features = [
-                        np.mean(window[-5:]) / current_window_price,
-                        np.mean(window[-10:]) / current_window_price,
-                        np.mean(window[-20:]) / current_window_price,
-                        (window[-1] - window[-5]) / window[-5] if len(window) >= 5 and window[-5] > 0 else 0,
-                        (window[-1] - window[-10]) / window[-10] if len(window) >= 10 and window[-10] > 0 else 0,
-                        np.std(window[-10:]) / np.mean(window[-10:]) if np.mean(window[-10:]) > 0 else 0,
-                        (window[-1] - window[0]) / window[0] if window[0] > 0 else 0,
-                        (np.max(window) - np.min(window)) / np.mean(window) if np.mean(window) > 0 else 0
-                    ]
-                    
-                    # validate features (no NaN, no infinity)
-                    if any(not np.isfinite(f) for f in features):
-                        continue
-                    
-                    # calculate target (relative change)
-                    relative_change = (future_price - current_window_price) / current_window_price
-                    
-                    # validate target
-                    if not np.isfinite(relative_change) or abs(relative_change) > 1.0: 
-                        continue
-                    
-                    X.append(features)
-                    y.append(relative_change)
-                    
-                except (ZeroDivisionError, ValueError, IndexError):
-                    continue
-            
-            except Exception as e:
-                print(f"Error processing window {i}: {e}")
-                continue
-        
-        # got enpugh training data?
-        if len(X) < 20:  #min20 samples
-            print(f"Not enough valid training samples: {len(X)}, need at least 20")
-            return fallback_prediction(prices, days_ahead, current_price)
-        
-        print(f"Training Random Forest with {len(X)} samples")
-        
-        # convert to numpy arrays with validation
-        try:
-            X = np.array(X)
-            y = np.array(y)
-            
-            # Check for empty arrays or wrong shapes
-            if X.shape[0] == 0 or y.shape[0] == 0:
-                print(f"Empty arrays after conversion: X shape {X.shape}, y shape {y.shape}")
+        if symbol and RF_INCREMENTAL:
+            # incremental mode: stored forest, only new samples get added
+            trained = get_incremental_forest(symbol, days_ahead).update(prices)
+            if trained is None:
+                print("Not enough valid training samples for incremental forest")
                 return fallback_prediction(prices, days_ahead, current_price)
+            model, X, y = trained
+        else:
+            # dataset can be handed in precomputed (e.g. by the backtester) so the
+            # windows are only built once per series
+            if dataset is None:
+                dataset = build_rf_dataset(prices, days_ahead, size)
+            X, y = dataset[0], dataset[1]
             
-            if X.shape[0] != y.shape[0]:
-                print(f"Mismatched array sizes: X {X.shape[0]}, y {y.shape[0]}")
+            # got enpugh training data?
+            if len(X) < 20:  #min20 samples
+                print(f"Not enough valid training samples: {len(X)}, need at least 20")
                 return fallback_prediction(prices, days_ahead, current_price)
-                
-        except Exception as e:
-            print(f"Error converting to numpy arrays: {e}")
-            return fallback_prediction(prices, days_ahead, current_price)
-        
-        
-        # training model
-        try:
-            model = RandomForestRegressor(n_estimators=50, 
-                                        random_state=42,
-                                        max_depth=8,
-                                        min_samples_split=5,
-                                        min_samples_leaf=2)
-            model.fit(X, y)
+            
+            print(f"Training Random Forest with {len(X)} samples")
+            
+            # training model
+            try:
+                model = new_forest()
+                model.fit(X, y)
 
-        except Exception as e:
-            print(f"Error training Random Forest: {e}")
-            return fallback_prediction(prices, days_ahead, current_price)
+            except Exception as e:
+                print(f"Error training Random Forest: {e}")
+                return fallback_prediction(prices, days_ahead, current_price)
 
         
         # prediction w validaion
         try:
             current_window = prices[-size:]
-            if len(current_window) != size or any(p <= 0 for p in current_window):
+            if len(current_window) != size or (current_window <= 0).any():
                 print("Invalid current window for prediction")
                 return fallback_prediction(prices, days_ahead, current_price)
         
-            current_features = [
-                np.mean(current_window[-5:]) / current_price,
-                np.mean(current_window[-10:]) / current_price,
-                np.mean(current_window[-20:]) / current_price,
-                (current_window[-1] - current_window[-5]) / current_window[-5] if len(current_window) >= 5 else 0,
-                (current_window[-1] - current_window[-10]) / current_window[-10] if len(current_window) >= 10 else 0,
-                np.std(current_window[-10:]) / np.mean(current_window[-10:]) if np.mean(current_window[-10:]) > 0 else 0,
-                (current_window[-1] - current_window[0]) / current_window[0],
-                (np.max(current_window) - np.min(current_window)) / np.mean(current_window) if np.mean(current_window) > 0 else 0
-            ]
+            current_features = rf_features(current_window[np.newaxis, :],
+                                           np.asarray([current_price], dtype=float))[0]
         
             if any(not np.isfinite(f) for f in current_features):
                 print("Invalid features for prediction")
@@ -529,10 +518,61 @@ def random_forest_prediction(prices: list, days_ahead: int, current_price: float
         print(f"Random Forest error: {e}")
         return fallback_prediction(prices, days_ahead, current_price)
     
-def get_model_info(days_ahead: int):
+# model tiers, trading accuracy for latency. latency targets are end to end for
+# /predict including the upstream price fetch.
+MODEL_TIERS = {
+    'fast': {
+        'latency_target_ms': 500,
+        'description': 'Closed-form trend extrapolation, no model fitting or news sentiment',
+    },
+    'standard': {
+        'latency_target_ms': 6000,
+        'description': 'ARIMA for 1-7 days, Random Forest beyond',
+    },
+    'thorough': {
+        'latency_target_ms': 15000,
+        'description': 'Wider ARIMA search ensembled with a Random Forest on a year of data',
+    },
+}
+DEFAULT_TIER = 'standard'
+
+def price_from_history(prices: list):
+    #stand-in for stock_current_price built from the bars we already have
+    if len(prices) < 2:
+        return None
+    current, previous = float(prices[-1]), float(prices[-2])
+    return {
+        "current_price": current,
+        "price_change": current - previous,
+        "price_change_percent": (current - previous) / previous * 100 if previous != 0 else 0
+    }
+
+def get_model_info(days_ahead: int, tier: str = DEFAULT_TIER):
    #courtesy of frontend
-    if days_ahead <= 7:
-        return {
+    if tier == 'fast':
+        info = {
+            'model_name': 'Quick Trend Estimate',
+            'model_code': 'TREND-F',
+            'algorithm': 'Linear Trend Extrapolation',
+            'description': 'Extends the recent price trend conservatively',
+            'timeframe': '1-90 days',
+            'approach': 'Least-squares slope over the last 20 trading days',
+            'best_for': 'Quick glances and widgets',
+            'confidence_range': '20-40%'
+        }
+    elif tier == 'thorough':
+        info = {
+            'model_name': 'Ensemble Pattern Analysis',
+            'model_code': 'ENS-T',
+            'algorithm': 'ARIMA + Random Forest Ensemble',
+            'description': 'Combines time series and machine learning forecasts',
+            'timeframe': '1-90 days',
+            'approach': 'Confidence-weighted blend of a wide ARIMA search and a Random Forest',
+            'best_for': 'Detailed analysis when waiting a little longer is fine',
+            'confidence_range': '55-80%'
+        }
+    elif days_ahead <= 7:
+        info = {
             'model_name': 'Short-term Pattern Analysis',
             'model_code': 'ARIMA-S',
             'algorithm': 'ARIMA Time Series Analysis',
@@ -543,7 +583,7 @@ def get_model_info(days_ahead: int):
             'confidence_range': '60-75%'
         }
     else:
-        return {
+        info = {
             'model_name': 'Long-term Pattern Recognition',
             'model_code': 'RF-L', 
             'algorithm': 'Random Forest Machine Learning',
@@ -553,47 +593,250 @@ def get_model_info(days_ahead: int):
             'best_for': 'Longer predictions using historical data patterns',
             'confidence_range': '55-70%'
         }
+    return {
+        **info,
+        'tier': tier,
+        'latency_target_ms': MODEL_TIERS[tier]['latency_target_ms']
+    }
+
+def pooled_result(future, prices: list, days_ahead: int, current_price: float, timeout: float = None):
+    #a model_pool fit's result, the trend fallback if the pool refused it or it ran over
+    try:
+        return model_pool.result(future, timeout)
+    except ModelPoolBusy as e:
+        print(f"Model pool: {e}, using fallback")
+        return fallback_prediction(prices, days_ahead, current_price)
+
+def pooled_model(fn, prices: list, days_ahead: int, current_price: float,
+                 timeout: float = None, **kwargs):
+    #fn (simple_arima_prediction / random_forest_prediction) on a worker process.
+    #only the closes are sent over, not the whole PriceSeries
+    future = model_pool.submit(fn, np.asarray(prices, dtype=float), days_ahead, current_price, **kwargs)
+    return pooled_result(future, prices, days_ahead, current_price, timeout)
+
+def ensemble_prediction(prices: list, days_ahead: int, current_price: float,
+                        symbol: str = None, time_budget: float = None):
+    #thorough tier: wide ARIMA search and the forest, blended by confidence
+    max_time = 10.0 if time_budget is None else min(10.0, time_budget / 2)  # leave room for the forest
+    # both fits go to the pool together, so they run side by side on two workers
+    closes = np.asarray(prices, dtype=float)
+    arima_future = model_pool.submit(simple_arima_prediction, closes, days_ahead, current_price,
+                                     strategies=ARIMA_STRATEGIES_WIDE, max_time=max_time)
+    rf_future = model_pool.submit(random_forest_prediction, closes, days_ahead, current_price, symbol=symbol)
+    started = time.monotonic()
+    components = [pooled_result(arima_future, prices, days_ahead, current_price, time_budget)]
+    if time_budget is not None:
+        time_budget = max(0.0, time_budget - (time.monotonic() - started))
+    rf_result = pooled_result(rf_future, prices, days_ahead, current_price, time_budget)
+    if rf_result['method'] == 'RandomForest':  # a fallback here would just add noise
+        components.append(rf_result)
+
+    weights = np.array([c['confidence'] for c in components], dtype=float)
+    predictions = np.array([c['predicted_price'] for c in components], dtype=float)
+    predicted_price = float(np.average(predictions, weights=weights))
+    confidence = float(np.average(weights, weights=weights))
+
+    # small bonus when the models agree on direction
+    directions = {p > current_price for p in predictions}
+    if len(components) > 1 and len(directions) == 1:
+        confidence += 5
+
+    return {
+        'predicted_price': predicted_price,
+        'confidence': int(min(80, confidence)),
+        'method': 'Ensemble_ARIMA_RF' if len(components) > 1 else 'Ensemble_ARIMA_only',
+        'model_params': {c['method']: c.get('model_params', 'N/A') for c in components}
+    }
+
+def run_tier_model(tier: str, prices: list, days_ahead: int, current_price: float,
+                   symbol: str = None, time_budget: float = None):
+    #time_budget (seconds) caps the ARIMA search so it stops itself before the deadline
+    if tier == 'fast':
+        return fallback_prediction(prices, days_ahead, current_price)
+    elif tier == 'thorough':
+        return ensemble_prediction(prices, days_ahead, current_price, symbol=symbol,
+                                   time_budget=time_budget)
+    elif days_ahead <= 7:
+        # SHORT-TERM: ARIMA
+        max_time = 4.5 if time_budget is None else min(4.5, time_budget)
+        return pooled_model(simple_arima_prediction, prices, days_ahead, current_price,
+                            timeout=time_budget, max_time=max_time)
+    else:
+        # LONG-TERM: Random Forest
+        return pooled_model(random_forest_prediction, prices, days_ahead, current_price,
+                            timeout=time_budget, symbol=symbol)
 
-def predict(stock: str = "AAPL", days_ahead: int = 1):
+def degraded_tier_model(tier: str, prices: list, days_ahead: int, current_price: float):
+    #what the model stage falls back to when it runs out of time
+    if tier == 'standard' and days_ahead <= 7:
+        # max_time=0 skips the ARIMA fits and goes straight to the statistical fallback
+        return simple_arima_prediction(prices, days_ahead, current_price, max_time=0)
+    return fallback_prediction(prices, days_ahead, current_price)
+
+# time kept back for building the response once the slow stages are done
+ASSEMBLY_RESERVE = 0.15
+
+# last finished prediction per (stock, days_ahead, tier). /predict/stream sends it
+# straight away as a first estimate while the models are still running.
+RECENT_RESULTS_SIZE = int(os.getenv('RECENT_RESULTS_SIZE', '2000'))
+RECENT_RESULTS_TTL = int(os.getenv('RECENT_RESULTS_TTL', '900'))  # seconds
+
+_recent_results = OrderedDict()
+_recent_results_lock = threading.Lock()
+
+def remember_result(stock: str, days_ahead: int, tier: str, prediction: dict, method: str):
+    with _recent_results_lock:
+        key = (stock, days_ahead, tier)
+        _recent_results[key] = (time.time(), {**prediction, 'method': method})
+        _recent_results.move_to_end(key)
+        while len(_recent_results) > RECENT_RESULTS_SIZE:
+            _recent_results.popitem(last=False)
+
+def recent_result(stock: str, days_ahead: int, tier: str):
+    #(age in seconds, prediction dict) or None when there's nothing fresh enough
+    with _recent_results_lock:
+        entry = _recent_results.get((stock.upper(), days_ahead, tier))
+    if entry is None:
+        return None
+    age = time.time() - entry[0]
+    if age > RECENT_RESULTS_TTL:
+        return None
+    return age, entry[1]
+
+def neutral_sentiment(reason: str):
+    return {"sentiment": "Neutral", "reason": reason}
+
+def estimate_event(stock: str, predicted_price: float, confidence: int, method: str,
+                   current_price: float, source: str, age_seconds: float = 0.0):
+    return {
+        "stock": stock,
+        "predicted_price": float(predicted_price),
+        "confidence": confidence,
+        "method_used": method,
+        "current_price": float(current_price),
+        "trend": "Uptrend" if predicted_price > current_price else "Downtrend",
+        "source": source,  # cache | fallback
+        "age_seconds": round(age_seconds, 1)
+    }
+
+def predict(stock: str = "AAPL", days_ahead: int = 1, tier: str = DEFAULT_TIER,
+            deadline_ms: int = None, compact: bool = False, shed: bool = False):
+    #compact=True returns historical_data/prediction_timeline as parallel arrays
+    #shed=True (server overloaded, see services/admission.py) skips the model for the trend fallback
+    result = None
+    for event, payload in predict_events(stock, days_ahead, tier, deadline_ms, compact, shed):
+        if event in ("prediction", "error"):
+            result = payload
+    return result
+
+def predict_events(stock: str = "AAPL", days_ahead: int = 1, tier: str = DEFAULT_TIER,
+                   deadline_ms: int = None, compact: bool = False, shed: bool = False):
+    #the prediction as it comes together, as (event, payload) pairs:
+    #  estimate   last cached result, or the trend fallback once the bars are in
+    #  model      the tier's model result
+    #  sentiment  news sentiment
+    #  prediction the full response, exactly what /predict returns
+    #or an error event. same work as a plain /predict, the client just hears about it earlier.
     try:
 
         stock = stock.upper() #so that even aapl becomes AAPL
         if days_ahead < 1 or days_ahead > 90:
-            return {"error": "Days ahead must be between 1 and 90"}
+            yield "error", {"error": "Days ahead must be between 1 and 90"}
+            return
+        if tier not in MODEL_TIERS:
+            yield "error", {"error": f"Tier must be one of: {', '.join(MODEL_TIERS)}"}
+            return
+        started = time.perf_counter()
+        if deadline_ms is None:
+            deadline_ms = max(DEFAULT_DEADLINE_MS, MODEL_TIERS[tier]['latency_target_ms'])
+        deadline = Deadline(deadline_ms)
 
         trading_info = get_trading_info(days_ahead)
 
         history_period = determine_period(days_ahead)
-        model_data, historical_data = fetch_historical_prices(stock,
-            period = history_period, days_ahead = days_ahead)
-        current_price_data = stock_current_price(stock)
+        if tier == 'thorough':
+            history_period = "1y"  # enough history for the forest at any horizon
+
+        # sentiment doesn't depend on the prices, so it runs alongside everything else
+        sentiment_future = None
+        if tier != 'fast':
+            sentiment_future = deadline.submit(get_sentiment, stock)
+
+        history_future = deadline.submit(fetch_historical_prices, stock, period = history_period,
+                                         days_ahead = days_ahead, timeout = deadline.remaining(),
+                                         compact = compact)
+        price_future = deadline.submit(stock_current_price, stock, timeout = deadline.remaining())
 
-        if model_data is None or current_price_data is None:
-            return {"error": "Invalid stock symbol or unable ot fetch data."}
+        cached = recent_result(stock, days_ahead, tier)
+        if cached is not None:
+            age, previous = cached
+            yield "estimate", estimate_event(stock, previous['predicted_price'], previous['confidence'],
+                                             previous['method'], previous['current_price'], "cache", age)
+
+        fetched = deadline.wait(history_future, "data_fetch", fallback=lambda: None,
+                                reserve=ASSEMBLY_RESERVE)
+        if fetched is None:
+            if deadline.degraded:
+                yield "error", {"error": "Timed out fetching price data", "degraded_stages": deadline.degraded}
+                return
+            yield "error", {"error": "Invalid stock symbol or unable ot fetch data."}
+            return
+
+        prices, historical_data = fetched
+
+        # if the quote is slow, the last close of the history is good enough
+        current_price_data = deadline.wait(price_future, "current_price",
+                                           fallback=lambda: price_from_history(prices),
+                                           reserve=ASSEMBLY_RESERVE)
+        if current_price_data is None:
+            yield "error", {"error": "Invalid stock symbol or unable ot fetch data."}
+            return
         
-        x, y = model_data
-        prices = y.ravel().tolist()
         current_price = current_price_data["current_price"]
 
         if len(prices) < 10: #min data
-            return {"error": "Insufficient historical data for prediction"}
-        
-        if days_ahead <= 7:
-            # SHORT-TERM: ARIMA
-            prediction_result = simple_arima_prediction(prices, days_ahead, current_price)
-            model_info = get_model_info(days_ahead)
+            yield "error", {"error": "Insufficient historical data for prediction"}
+            return
+
+        if cached is None:
+            # microseconds on bars we already have, gives the client something to show
+            quick = fallback_prediction(prices, days_ahead, current_price)
+            yield "estimate", estimate_event(stock, quick['predicted_price'], quick['confidence'],
+                                             quick['method'], current_price, "fallback")
+        
+        if shed:
+            prediction_result = fallback_prediction(prices, days_ahead, current_price)
         else:
-            # LONG-TERM: Random Forest
-            prediction_result =random_forest_prediction(prices, days_ahead, current_price)
-            model_info = get_model_info(days_ahead)
+            prediction_result = deadline.run(
+                "model", run_tier_model, tier, prices, days_ahead, current_price, symbol=stock,
+                time_budget=deadline.remaining(ASSEMBLY_RESERVE),
+                fallback=lambda: degraded_tier_model(tier, prices, days_ahead, current_price),
+                reserve=ASSEMBLY_RESERVE)
+        model_info = get_model_info(days_ahead, tier)
 
         predicted_price = prediction_result['predicted_price']
         confidence = prediction_result['confidence']    
 
-        sentiment_data = get_sentiment(stock)
+        yield "model", {
+            "stock": stock,
+            "predicted_price": float(predicted_price),
+            "confidence": confidence,
+            "method_used": prediction_result['method'],
+            "model_params": prediction_result.get('model_params', 'N/A'),
+            "current_price": current_price,
+            "trend": "Uptrend" if predicted_price > current_price else "Downtrend"
+        }
+
+        if sentiment_future is None:
+            # the news fetch alone would blow the fast tier's budget
+            sentiment_data = neutral_sentiment("Sentiment skipped for fast tier")
+        else:
+            sentiment_data = deadline.wait(sentiment_future, "sentiment",
+                                           fallback=lambda: neutral_sentiment("News analysis timed out"))
         sentiment = sentiment_data["sentiment"]
         sentiment_reason = sentiment_data.get("reason", "")
 
+        yield "sentiment", {"stock": stock, "sentiment": sentiment, "sentiment_reason": sentiment_reason}
 
         vol = obtain_volatility(prices)
         
@@ -615,7 +858,10 @@ def predict(stock: str = "AAPL", days_ahead: int = 1):
             current_price_data["current_price"], 
             float(predicted_price), 
             days_ahead,
-            vol
+            vol,
+            # same request, same prices -> same chart; new prices draw a new one
+            seed_key = (stock, days_ahead, tier, current_price_data["current_price"], float(predicted_price)),
+            compact = compact
         )
 
         api_response = {
@@ -631,13 +877,20 @@ def predict(stock: str = "AAPL", days_ahead: int = 1):
             "model_info": {
                 **model_info,
                 "method_used": prediction_result['method'],
-                "model_params": prediction_result.get('model_params', 'N/A')
-            }
+                "model_params": prediction_result.get('model_params', 'N/A'),
+                "load_shed": shed,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000)
+            },
+            "format": "compact" if compact else "full",
+            "deadline_ms": deadline.budget_ms,
+            "degraded_stages": deadline.degraded
         }
 
-        return api_response
+        if not shed:  # a shed answer shouldn't stand in for the tier's model later
+            remember_result(stock, days_ahead, tier, api_response["prediction"], prediction_result['method'])
+        yield "prediction", api_response
         
     except Exception as e:
         print(f"Prediction error: {e}")
-        return {"error": f"Prediction failed: {str(e)}"}
+        yield "error", {"error": f"Prediction failed: {str(e)}"}
 
@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+from collections import defaultdict
+from services.stock_service import stock_current_price
+
+# live quotes for open clients, fanned out from one poller per symbol.
+# however many clients watch AAPL there is one stock_current_price call per
+# interval for it. every client has a small bounded queue; a client that can't
+# keep up loses its oldest quotes (a newer one is on the way anyway) instead of
+# holding up the poller or growing memory. a poller stops when the last
+# subscriber of its symbol leaves.
+#
+# everything here runs on the event loop, only the quote fetch goes to a thread.
+
+QUOTE_POLL_SECONDS = float(os.getenv('QUOTE_POLL_SECONDS', '5'))
+QUOTE_QUEUE_SIZE = int(os.getenv('QUOTE_QUEUE_SIZE', '32'))
+QUOTE_MAX_SYMBOLS = int(os.getenv('QUOTE_MAX_SYMBOLS', '20'))  # per client
+QUOTE_HEARTBEAT_SECONDS = float(os.getenv('QUOTE_HEARTBEAT_SECONDS', '15'))
+
+class Subscriber:
+    __slots__ = ('queue', 'dropped')
+
+    def __init__(self, size: int = QUOTE_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def push(self, message: dict):
+        #never blocks: a full queue drops its oldest message
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+class QuoteHub:
+    def __init__(self, fetch=stock_current_price, interval: float = QUOTE_POLL_SECONDS):
+        self.fetch = fetch
+        self.interval = interval
+        self.subscribers = defaultdict(set)  # symbol -> subscribers
+        self.pollers = {}                    # symbol -> poller task
+        self.latest = {}                     # symbol -> last quote sent
+
+    def subscribe(self, symbols: list) -> Subscriber:
+        subscriber = Subscriber()
+        for symbol in symbols:
+            self.subscribers[symbol].add(subscriber)
+            if symbol not in self.pollers:
+                self.pollers[symbol] = asyncio.create_task(self._poll(symbol))
+            if symbol in self.latest:
+                subscriber.push(self.latest[symbol])  # don't make them wait a full interval
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber, symbols: list):
+        for symbol in symbols:
+            watchers = self.subscribers.get(symbol)
+            if watchers is None:
+                continue
+            watchers.discard(subscriber)
+            if not watchers:
+                del self.subscribers[symbol]
+                poller = self.pollers.pop(symbol, None)
+                if poller is not None:
+                    poller.cancel()
+                self.latest.pop(symbol, None)
+
+    def publish(self, symbol: str, message: dict):
+        self.latest[symbol] = message
+        for subscriber in self.subscribers.get(symbol, ()):
+            subscriber.push(message)
+
+    async def _poll(self, symbol: str):
+        while True:
+            try:
+                quote = await asyncio.to_thread(self.fetch, symbol, timeout=self.interval)
+            except Exception as e:
+                print(f"Quote poll failed for {symbol}: {e}")
+                quote = None
+
+            previous = self.latest.get(symbol)
+            # only changes go out, the heartbeat keeps quiet connections open
+            if quote is not None and (previous is None or previous["current_price"] != quote["current_price"]):
+                self.publish(symbol, {"symbol": symbol, **quote, "timestamp": time.time()})
+
+            await asyncio.sleep(self.interval)
+
+    def status(self) -> dict:
+        return {
+            "symbols": len(self.pollers),
+            "subscriptions": sum(len(watchers) for watchers in self.subscribers.values())
+        }
+
+def parse_symbols(symbols: str) -> list:
+    #"aapl, msft,AAPL" -> ["AAPL", "MSFT"], order kept
+    return list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+
+quote_hub = QuoteHub()
@@ -1,11 +1,21 @@
-import yfinance as yf
+import os
+import time
+import hashlib
+import threading
 import numpy as np
+import yfinance as yf
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from utils.helpers import chart_timeframe
+from utils.price_series import PriceSeries
+from utils.price_store import price_store, to_epoch_seconds
+from services.upstream import yahoo, yfinance_session, checked_download, download_failure
 
-def stock_current_price(symbol: str):
+def stock_current_price(symbol: str, timeout: float = 10):
     try:
         ticker = yf.Ticker(symbol)
-        data = ticker.history(period="2d")  #make sure got 2 days of data
+        data = yahoo.call(ticker.history, period="2d", timeout=timeout,  #make sure got 2 days of data
+                          budget=timeout)
         
         if data.empty:
             return None
@@ -28,61 +38,263 @@ def stock_current_price(symbol: str):
         
     except Exception as e:
         print(f"Error getting current price for {symbol}: {e}")
-        return None
+        # upstream down or throttled: the cached bars are better than nothing
+        cached = price_store.window(symbol, 2)
+        return price_change_from_closes(cached[1]) if cached else None
     
-def fetch_historical_prices(symbol: str, period: str, days_ahead: int):
+# local price cache in front of yf.download.
+# a symbol's ring in price_store is reused until it's PRICE_CACHE_TTL seconds old,
+# then topped up with a download starting at its last bar. one refresh per symbol
+# at a time, everyone else waits for it and reads the result. the store keeps
+# when each symbol was refreshed and how far back its bars go, so with a shared
+# store (PRICE_STORE_DIR) a fresh worker doesn't download anything again.
+
+PRICE_CACHE_TTL = int(os.getenv('PRICE_CACHE_TTL', '300'))
+
+# calendar days per yfinance period, rounded up
+PERIOD_DAYS = {"5d": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731}
+
+_refresh_locks = defaultdict(threading.Lock)
+
+def period_start(period: str, now: datetime = None):
+    #first calendar day a period covers, None for ones we don't cache (max, 5y, ...)
+    now = now or datetime.now()
+    if period == "ytd":
+        return datetime(now.year, 1, 1)
+    if period in PERIOD_DAYS:
+        return (now - timedelta(days=PERIOD_DAYS[period])).replace(hour=0, minute=0, second=0, microsecond=0)
+    return None
+
+def download_closes(symbol: str, timeout: float = 10, **kwargs):
+    #(timestamps, closes) from yf.download, None when there's nothing
+    data = yahoo.call(checked_download, symbol, progress=False, session=yfinance_session,
+                      validate=download_failure, timeout=timeout, budget=timeout, **kwargs)
+    if data.empty or "Close" not in data.columns:
+        return None
+    closes = data["Close"].squeeze().dropna()
+    if np.ndim(closes) == 0 or len(closes) == 0:
+        return None
+    return to_epoch_seconds(closes.index), closes.to_numpy(dtype=np.float32)
+
+def _fits_in_store(start: datetime) -> bool:
+    trading_days = (datetime.now() - start).days * 252 / 365
+    return trading_days < price_store.capacity * 0.95
+
+def try_download_closes(symbol: str, timeout: float = 10, **kwargs):
+    #download_closes that reports failures (incl. an open circuit) as None
+    try:
+        return download_closes(symbol, timeout, **kwargs)
+    except Exception as e:
+        print(f"Price download failed for {symbol}: {e}")
+        return None
+
+def cached_closes(symbol: str, start: datetime, end: datetime = None, timeout: float = 10):
+    #closes between start and end (inclusive dates) served from price_store, downloading only what's missing
+    symbol = symbol.upper()
+    start_ts = int(start.timestamp())
+    end_ts = int(end.timestamp()) + 86399 if end else None
+
+    if not _fits_in_store(start):
+        downloaded = download_closes(symbol, timeout, start=start.strftime("%Y-%m-%d"))
+        if downloaded is None:
+            return None
+        timestamps, closes = downloaded
+    else:
+        with _refresh_locks[symbol]:
+            ring = price_store.get(symbol)
+            covered = price_store.covered_from(symbol) <= start_ts
+            fresh = time.time() - price_store.refreshed_at(symbol) < PRICE_CACHE_TTL
+
+            if not covered:
+                downloaded = try_download_closes(symbol, timeout, start=start.strftime("%Y-%m-%d"))
+                if downloaded is not None:
+                    price_store.replace(symbol, *downloaded, covered_from=start_ts, refreshed_at=time.time())
+            elif not fresh:
+                # top up from the last bar we have (it gets re-fetched in case it moved)
+                last_day = datetime.fromtimestamp(ring.last_timestamp, timezone.utc).strftime("%Y-%m-%d")
+                downloaded = try_download_closes(symbol, timeout, start=last_day)
+                if downloaded is not None:
+                    price_store.ingest(symbol, *downloaded, refreshed_at=time.time())
+                else:
+                    print(f"Price refresh failed for {symbol}, serving cached bars")
+
+            window = price_store.window(symbol)
+            if window is None or len(window[0]) == 0:
+                return None
+            timestamps, closes = window
+
+    first = np.searchsorted(timestamps, start_ts)
+    last = np.searchsorted(timestamps, end_ts, side='right') if end_ts else len(timestamps)
+    return timestamps[first:last], closes[first:last]
+
+def download_quotes(symbols: list, timeout: float = 10) -> dict:
+    #one yf.download for a batch of symbols. tops up their cached bars and returns symbol -> quote
+    data = yahoo.call(checked_download, symbols, period="5d", progress=False, threads=True,
+                      session=yfinance_session, validate=download_failure, timeout=timeout,
+                      budget=timeout)
+
+    quotes = {}
+    now = time.time()
+    for symbol, (timestamps, values) in _frame_closes(data, symbols).items():
+        with _refresh_locks[symbol]:
+            # a new (or restarted) symbol only covers what we just downloaded, ingest tracks that
+            price_store.ingest(symbol, timestamps, values, refreshed_at=now)
+        quotes[symbol] = price_change_from_closes(values)
+    return quotes
+
+def _frame_closes(data, symbols: list) -> dict:
+    #symbol -> (timestamps, closes) from a multi-symbol yf.download frame
+    if data.empty or "Close" not in data.columns:
+        return {}
+    closes = data["Close"]
+    if np.ndim(closes) == 1:
+        closes = closes.to_frame(symbols[0])
+    columns = {}
+    for symbol in closes.columns:
+        series = closes[symbol].dropna()
+        if len(series):
+            columns[symbol] = (to_epoch_seconds(series.index), series.to_numpy(dtype=np.float64))
+    return columns
+
+def _batch_closes(symbols: list, start: datetime, timeout: float) -> dict:
+    #one yf.download from start for the batch, {} when it fails (the cached bars are served)
+    try:
+        data = yahoo.call(checked_download, symbols, start=start.strftime("%Y-%m-%d"), progress=False,
+                          threads=True, session=yfinance_session, validate=download_failure,
+                          timeout=timeout, budget=timeout)
+        return _frame_closes(data, symbols)
+    except Exception as e:
+        print(f"Batch price download failed for {len(symbols)} symbols: {e}")
+        return {}
+
+def cached_closes_many(symbols: list, start: datetime, timeout: float = 10) -> dict:
+    #cached_closes for a batch: one yf.download tops up the stale symbols, one fetches the missing ones.
+    #symbol -> (timestamps, closes) from start, symbols with no data are left out
+    symbols = [s.upper() for s in symbols]
+    start_ts = int(start.timestamp())
+
+    if not _fits_in_store(start):
+        data = yahoo.call(checked_download, symbols, start=start.strftime("%Y-%m-%d"), progress=False,
+                          threads=True, session=yfinance_session, validate=download_failure,
+                          timeout=timeout, budget=timeout)
+        return _frame_closes(data, symbols)
+
+    # like cached_closes: symbols that are only out of date are topped up from their last
+    # bar (one batch from the oldest of those), only a gap in coverage downloads the window
+    now = time.time()
+    outdated = [s for s in symbols
+                if price_store.covered_from(s) <= start_ts and now - price_store.refreshed_at(s) >= PRICE_CACHE_TTL]
+    if outdated:
+        last_day = min(price_store.get(s).last_timestamp for s in outdated)
+        downloaded = _batch_closes(outdated, datetime.fromtimestamp(last_day, timezone.utc), timeout)
+        for symbol, (timestamps, closes) in downloaded.items():
+            with _refresh_locks[symbol]:
+                price_store.ingest(symbol, timestamps, closes, refreshed_at=now)
+
+    # not covered, or a revised history made the top-up start the symbol over
+    gaps = [s for s in symbols if price_store.covered_from(s) > start_ts]
+    if gaps:
+        for symbol, (timestamps, closes) in _batch_closes(gaps, start, timeout).items():
+            with _refresh_locks[symbol]:
+                price_store.replace(symbol, timestamps, closes, covered_from=start_ts, refreshed_at=now)
+
+    windows = {}
+    for symbol in symbols:
+        window = price_store.window(symbol)
+        if window is None or len(window[0]) == 0:
+            continue
+        timestamps, closes = window
+        first = np.searchsorted(timestamps, start_ts)
+        windows[symbol] = (timestamps[first:], closes[first:])
+    return windows
+
+def history_rows(timestamps: np.ndarray, closes: np.ndarray) -> list:
+    #[{date, price}] for the chart
+    dates = timestamps.astype('datetime64[s]').astype('datetime64[D]').astype(str)
+    prices = np.round(closes.astype(np.float64), 4)  # float32 noise off the wire
+    return [{"date": date, "price": price} for date, price in zip(dates.tolist(), prices.tolist())]
+
+def history_columns(timestamps: np.ndarray, closes: np.ndarray) -> dict:
+    #compact format: parallel date/price arrays instead of one object per day
+    dates = timestamps.astype('datetime64[s]').astype('datetime64[D]').astype(str)
+    return {"dates": dates.tolist(), "prices": np.round(closes.astype(np.float64), 4)}
+
+def price_change_from_closes(closes) -> dict:
+    #same shape as stock_current_price, from the last two bars
+    if len(closes) == 0:
+        return None
+    current = float(closes[-1])
+    previous = float(closes[-2]) if len(closes) > 1 else current
+    change = current - previous
+    return {
+        "current_price": current,
+        "price_change": change,
+        "price_change_percent": (change / previous) * 100 if previous != 0 else 0
+    }
+
+def fetch_historical_prices(symbol: str, period: str, days_ahead: int, timeout: float = 10,
+                            compact: bool = False):
     #tackling both chart data and model data in this function
     try:
-        data = yf.download(symbol, period = period)
+        start = period_start(period)
+        if start is not None:
+            window = cached_closes(symbol, start, timeout=timeout)
+        else:
+            window = download_closes(symbol, timeout, period=period)
 
-        if data.empty or "Close" not in data.columns:
+        if window is None:
             return None
-    
-        prices_series = data["Close"].squeeze().dropna()
-        prices = prices_series.tolist()
+        timestamps, closes = window
 
-        if len(prices) < 2:
+        if len(closes) < 2:
             return None
-        #train model
-        x = np.array(range(len(prices))).reshape(-1, 1)
-        y = np.array(prices).reshape(-1, 1)
+
+        # the models get a view of the cached closes
+        prices = PriceSeries(closes, dates=timestamps)
 
         chart_no_days = chart_timeframe(days_ahead)
-        chart_data = data.tail(chart_no_days)
-
-        historical_data = []
-        for date in chart_data.index:
-            price_value = chart_data.loc[date, "Close"]
-            if hasattr(price_value, 'iloc'):
-                price = float(price_value.iloc[0])
-            else:
-                price = float(price_value)
-
-            historical_data.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "price": price
-            })
+        build_chart = history_columns if compact else history_rows
+        historical_data = build_chart(timestamps[-chart_no_days:], closes[-chart_no_days:])
             
-        return (x, y), historical_data
+        return prices, historical_data
     
     except Exception as e:
         print(f"Error fetching data for {symbol}: {e}")
         return None
 
-def get_historical_data(symbol: str, period: str = "1mo"):
+def get_historical_window(symbol: str, period: str = "1mo", start: str = None, end: str = None):
+    #bars for /historical: start/end (YYYY-MM-DD) win over period
     try:
-        _, historical_data = fetch_historical_prices(symbol, period)
-        current_price_data = stock_current_price(symbol)
-        
-        if historical_data is None:
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else period_start(period)
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else None
+    except ValueError:
+        return {"error": "start and end must be YYYY-MM-DD"}
+    if start_date is None:
+        return {"error": f"Unsupported period: {period}"}
+    if end_date is not None and end_date < start_date:
+        return {"error": "end must not be before start"}
+
+    try:
+        window = cached_closes(symbol, start_date, end_date)
+        if window is None or len(window[1]) == 0:
             return {"error": "Unable to fetch historical data"}
-            
-        return {
-            "symbol": symbol.upper(),
-            "historical_data": historical_data,
-            "current_price_data": current_price_data
-        }
-        
+        timestamps, closes = window
+        return {"symbol": symbol.upper(), "timestamps": timestamps, "closes": closes}
     except Exception as e:
         return {"error": f"Failed to fetch historical data: {str(e)}"}
-    
+
+def history_etag(symbol: str, timestamps: np.ndarray, closes: np.ndarray, format: str = "full",
+                 encoding: str = "identity") -> str:
+    #changes whenever the range, the last bar or its close, or the representation (format, encoding) changes
+    key = f"{symbol}|{timestamps[0]}|{timestamps[-1]}|{len(closes)}|{float(closes[-1]):.6f}|{format}|{encoding}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+def get_historical_data(symbol: str, period: str = "1mo", start: str = None, end: str = None):
+    window = get_historical_window(symbol, period, start, end)
+    if "error" in window:
+        return window
+    return {
+        "symbol": window["symbol"],
+        "historical_data": history_rows(window["timestamps"], window["closes"]),
+        "current_price_data": price_change_from_closes(window["closes"])
+    }
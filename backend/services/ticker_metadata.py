@@ -0,0 +1,171 @@
+import os
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yfinance as yf
+from services.upstream import yahoo, UpstreamUnavailable
+
+# name / sector / industry / exchange per ticker, kept in a local JSON file and
+# in memory. that data practically never changes, but yf.Ticker(s).info is one
+# of the slowest Yahoo calls, and explore used to make it for every trending
+# symbol on every request. now a known ticker costs a dict lookup:
+#   unknown   fetched once (.info), stored, file rewritten
+#   stale     (older than TICKER_METADATA_TTL_DAYS) returned as is, refreshed in
+#             the background
+# the store can be bulk-seeded from a CSV or JSON file, at startup with
+# TICKER_METADATA_SEED or once with
+#   python -m services.ticker_metadata --seed tickers.csv
+
+TICKER_METADATA_PATH = os.getenv('TICKER_METADATA_PATH', 'ticker_metadata.json')
+TICKER_METADATA_TTL_DAYS = float(os.getenv('TICKER_METADATA_TTL_DAYS', '30'))
+TICKER_METADATA_SEED = os.getenv('TICKER_METADATA_SEED', '')
+
+FIELDS = ('name', 'sector', 'industry', 'exchange')
+
+def from_info(info: dict) -> dict:
+    #the fields we keep out of a yfinance .info dict
+    return {
+        'name': info.get('shortName') or info.get('longName'),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'exchange': info.get('fullExchangeName') or info.get('exchange')
+    }
+
+def read_seed(path: str) -> dict:
+    #symbol -> fields, from a CSV with a symbol column (plus any of FIELDS) or
+    #JSON as {symbol: {...}} or [{"symbol": ...}, ...]
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        rows = [{'symbol': symbol, **fields} for symbol, fields in data.items()] if isinstance(data, dict) else data
+    return {
+        row['symbol'].strip().upper(): {field: (row.get(field) or None) for field in FIELDS}
+        for row in rows if row.get('symbol')
+    }
+
+class TickerMetadataStore:
+    def __init__(self, path: str = TICKER_METADATA_PATH, ttl_days: float = TICKER_METADATA_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.entries = {}  # symbol -> {name, sector, industry, exchange, refreshed_at}
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ticker-metadata')
+        self.fetches = 0
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Could not read ticker metadata {self.path}: {e}")
+            return {}
+
+    def load(self) -> int:
+        entries = self._read_file()
+        with self.lock:
+            self.entries.update(entries)
+            return len(self.entries)
+
+    def save(self):
+        #merge with what's on disk first (another worker may have added tickers), newest entry wins
+        on_disk = self._read_file()
+        with self.lock:
+            for symbol, entry in on_disk.items():
+                if entry.get('refreshed_at', 0) > self.entries.get(symbol, {}).get('refreshed_at', 0):
+                    self.entries[symbol] = entry
+            snapshot = dict(self.entries)
+        # write then rename so a reader never sees half a file
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def seed(self, path: str) -> int:
+        #bulk load a seed file; seeded entries count as fresh
+        seeded = read_seed(path)
+        now = time.time()
+        with self.lock:
+            for symbol, fields in seeded.items():
+                self.entries[symbol] = {**fields, 'refreshed_at': now}
+        self.save()
+        return len(seeded)
+
+    def _fetch(self, symbol: str):
+        #one .info call, None if yahoo has nothing for the symbol
+        self.fetches += 1
+        info = yahoo.call(lambda: yf.Ticker(symbol).info)
+        if not info:
+            return None
+        entry = {**from_info(info), 'refreshed_at': time.time()}
+        with self.lock:
+            self.entries[symbol] = entry
+        return entry
+
+    def _refresh(self, symbol: str):
+        try:
+            if self._fetch(symbol) is not None:
+                self.save()
+        except Exception as e:
+            print(f"Ticker metadata refresh failed for {symbol}: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(symbol)
+
+    def peek(self, symbol: str):
+        #what we have for the symbol, no upstream call. a stale entry gets a background refresh
+        symbol = symbol.upper()
+        with self.lock:
+            entry = self.entries.get(symbol)
+            stale = entry is not None and time.time() - entry.get('refreshed_at', 0) > self.ttl
+            if stale and symbol not in self.refreshing:
+                self.refreshing.add(symbol)
+                self.refresher.submit(self._refresh, symbol)
+        return entry
+
+    def get_many(self, symbols: list) -> dict:
+        #symbol -> entry. unknown symbols are fetched now (one save for all of them),
+        #symbols yahoo can't describe are left out
+        found = {}
+        fetched = False
+        for symbol in symbols:
+            entry = self.peek(symbol)
+            if entry is None:
+                try:
+                    entry = self._fetch(symbol.upper())
+                    fetched = True
+                except UpstreamUnavailable:
+                    raise
+                except Exception as e:
+                    print(f"Ticker metadata fetch failed for {symbol}: {e}")
+            if entry is not None:
+                found[symbol] = entry
+        if fetched:
+            self.save()
+        return found
+
+    def get(self, symbol: str):
+        return self.get_many([symbol]).get(symbol)
+
+    def status(self) -> dict:
+        return {"tickers": len(self.entries), "fetches": self.fetches, "refreshing": len(self.refreshing)}
+
+ticker_metadata = TickerMetadataStore()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the local ticker metadata store")
+    parser.add_argument("--seed", required=True, help="CSV (symbol,name,sector,industry,exchange) or JSON file")
+    parser.add_argument("--path", default=TICKER_METADATA_PATH)
+    args = parser.parse_args()
+    store = TickerMetadataStore(args.path)
+    store.load()
+    print(f"seeded {store.seed(args.seed)} tickers into {args.path} ({len(store.entries)} total)")
@@ -0,0 +1,303 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+import yfinance as yf
+
+# every call to Yahoo (yf.download, yf.Ticker(...).history/.info/.news and the
+# trending endpoint) goes through one scheduler:
+#   - token bucket, so bursts of requests don't turn into bursts upstream
+#   - bounded concurrency
+#   - retries with full-jitter backoff (honours Retry-After on 429s)
+#   - circuit breaker: after enough consecutive failures calls fail fast with
+#     UpstreamUnavailable and callers serve cached/fallback data instead, until a
+#     trial call gets through again.
+
+YAHOO_QUERY_BASE = os.getenv('YAHOO_QUERY_BASE', 'https://query1.finance.yahoo.com')
+# hosts yfinance talks to. with YAHOO_QUERY_BASE pointed anywhere else (the load
+# test stub in loadtest/) their requests are sent there as well, same path
+YAHOO_HOSTS = ('https://query1.finance.yahoo.com', 'https://query2.finance.yahoo.com',
+               'https://finance.yahoo.com', 'https://fc.yahoo.com', 'https://guce.yahoo.com',
+               'https://consent.yahoo.com')
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class UpstreamUnavailable(Exception):
+    pass
+
+class DownloadFailed(Exception):
+    #yf.download came back without raising, but upstream refused or failed
+    pass
+
+class RetryableStatus(Exception):
+    def __init__(self, response):
+        super().__init__(f"upstream returned {response.status_code}")
+        self.response = response
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate          # tokens per second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        #take a token, waiting up to timeout seconds for one
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True  # exactly one call gets to test the water
+                return True
+            return False
+
+    def cancel_trial(self):
+        #the trial call never reached upstream, let the next one try
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_flight:
+                    print(f"Upstream circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+class UpstreamScheduler:
+    def __init__(self, rate: float = 5.0, burst: int = 10, max_concurrency: int = 4,
+                 max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_wait: float = 10.0, session: requests.Session = None,
+                 benign_errors: tuple = ()):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.session = session or requests.Session()
+        # "that symbol doesn't exist" style errors: upstream is fine, so no retry
+        # and they don't count towards opening the circuit
+        self.benign_errors = benign_errors
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if isinstance(error, RetryableStatus):
+            retry_after = error.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+        return delay
+
+    def call(self, fn, *args, budget: float = None, validate=None, **kwargs):
+        #run fn under the limits. raises UpstreamUnavailable when the breaker is open
+        #or the time budget (seconds, waits and retries included) runs out,
+        #otherwise the last error once retries are used up.
+        #validate(result) raises for results that are really failures (see download_failure)
+        budget_end = time.monotonic() + (self.max_wait if budget is None else budget)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise UpstreamUnavailable("upstream circuit open")
+
+            remaining = budget_end - time.monotonic()
+            if remaining <= 0 or not self.bucket.acquire(remaining):
+                self.breaker.cancel_trial()
+                raise UpstreamUnavailable("upstream rate limit wait exceeded")
+            if not self.slots.acquire(timeout=max(0.0, budget_end - time.monotonic())):
+                self.breaker.cancel_trial()
+                raise UpstreamUnavailable("no upstream slot free")
+
+            try:
+                result = fn(*args, **kwargs)
+                if validate is not None:
+                    validate(result)
+            except self.benign_errors:
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.slots.release()
+
+            self.breaker.record_failure()
+            delay = self._backoff(attempt, error)
+            attempt += 1
+            if attempt > self.max_retries or time.monotonic() + delay >= budget_end:
+                raise error
+            print(f"Upstream call failed ({error}), retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def get(self, url: str, timeout: float = 10, **kwargs) -> requests.Response:
+        #HTTP GET on the shared session, 429/5xx count as failures and get retried
+        def send():
+            response = self.session.get(url, timeout=timeout, **kwargs)
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableStatus(response)
+            return response
+        return self.call(send, budget=timeout + self.max_wait)
+
+    def status(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "tokens": round(self.bucket.tokens, 2)
+        }
+
+def create_yahoo_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'application/json',
+        'Referer': 'https://finance.yahoo.com/'
+    })
+    return session
+
+class RedirectedSession(requests.Session):
+    #yahoo URLs are rewritten to `base`, path and query kept
+    def __init__(self, base: str):
+        super().__init__()
+        self.base = base.rstrip('/')
+
+    def request(self, method, url, *args, **kwargs):
+        for host in YAHOO_HOSTS:
+            if url.startswith(host):
+                url = self.base + (url[len(host):] or '/')
+                break
+        return super().request(method, url, *args, **kwargs)
+
+def create_yfinance_session():
+    #None (yfinance makes its own) unless YAHOO_QUERY_BASE points away from yahoo.
+    #yf.download installs a new session on every call unless it's handed one, so
+    #every download passes session=yfinance_session
+    if YAHOO_QUERY_BASE.rstrip('/') in YAHOO_HOSTS:
+        return None
+    from yfinance.data import YfData
+    session = RedirectedSession(YAHOO_QUERY_BASE)
+    YfData(session=session)  # what yf.Ticker uses
+    print(f"Yahoo requests go to {YAHOO_QUERY_BASE}")
+    return session
+
+class ThreadErrorLog(logging.Handler):
+    #ERROR records logged by the current thread between start() and stop()
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.local = threading.local()
+
+    def emit(self, record):
+        messages = getattr(self.local, 'messages', None)
+        if messages is not None:
+            messages.append(record.getMessage())
+
+    def start(self):
+        self.local.messages = []
+
+    def stop(self) -> list:
+        messages, self.local.messages = getattr(self.local, 'messages', None) or [], None
+        return messages
+
+# yf.download catches every per-symbol exception (429s included), logs it and
+# hands back an empty frame, so the scheduler would count a refused download
+# as a success. checked_download() keeps what it logged, download_failure() judges it
+_yfinance_errors = ThreadErrorLog()
+logging.getLogger('yfinance').addHandler(_yfinance_errors)
+
+RATE_LIMIT_MARKERS = ('YFRateLimitError', 'Rate limited', 'Too Many Requests')
+# a symbol yahoo has no prices for, upstream itself is fine
+MISSING_DATA_MARKERS = ('possibly delisted', 'No data found', 'YFPricesMissingError', 'YFTzMissingError',
+                        'YFInvalidPeriodError')
+
+def checked_download(*args, **kwargs):
+    #yf.download, with the errors it logged for this call in data.attrs['errors']
+    _yfinance_errors.start()
+    try:
+        data = yf.download(*args, **kwargs)
+    finally:
+        # every yfinance version logs the failures from the calling thread once its
+        # ticker threads are done. not yf.shared._ERRORS: older versions keep them there
+        # too, but for whichever download ran last in the process, not necessarily this one
+        errors = _yfinance_errors.stop()
+    data.attrs['errors'] = errors
+    return data
+
+def download_failure(data):
+    #validate= for checked_download(): rate limited (even partly), or nothing came back
+    #and not just because the symbols have no data
+    errors = data.attrs.get('errors', [])
+    throttled = [e for e in errors if any(marker in e for marker in RATE_LIMIT_MARKERS)]
+    if throttled:
+        raise DownloadFailed(throttled[0].strip())
+    # skip the "N Failed downloads:" headline, one line per error follows it
+    failed = [e for e in errors if not e.strip().endswith(':')
+              and not any(marker in e for marker in MISSING_DATA_MARKERS)]
+    if data.empty and failed:
+        raise DownloadFailed(failed[0].strip())
+
+def yfinance_benign_errors() -> tuple:
+    #missing-data exceptions, whichever of them this yfinance version has
+    try:
+        import yfinance.exceptions as yf_errors
+    except ImportError:
+        return ()
+    names = ('YFPricesMissingError', 'YFTzMissingError', 'YFTickerMissingError', 'YFInvalidPeriodError')
+    return tuple(getattr(yf_errors, name) for name in names if hasattr(yf_errors, name))
+
+yahoo = UpstreamScheduler(
+    rate=float(os.getenv('YAHOO_RATE_PER_SEC', '5')),
+    burst=int(os.getenv('YAHOO_BURST', '10')),
+    max_concurrency=int(os.getenv('YAHOO_MAX_CONCURRENCY', '4')),
+    max_retries=int(os.getenv('YAHOO_MAX_RETRIES', '2')),
+    failure_threshold=int(os.getenv('YAHOO_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.getenv('YAHOO_BREAKER_RESET_SECONDS', '30')),
+    session=create_yahoo_session(),
+    benign_errors=yfinance_benign_errors()
+)
+
+yfinance_session = create_yfinance_session()
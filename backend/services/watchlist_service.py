@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import threading
+from config.database import db_manager
+from services.stock_service import download_quotes
+from services.prediction_service import recent_result
+from services.alert_service import alert_engine
+
+# quotes for every watched symbol, shared by all users.
+# a background task downloads the union of everyone's watchlists every
+# WATCHLIST_REFRESH_SECONDS, in batches of WATCHLIST_BATCH_SIZE symbols per
+# yf.download, so a symbol on a thousand watchlists is still fetched once.
+# /watchlist just reads from here; only symbols nobody had watched before
+# (or quotes that went stale) are fetched on the request, again in one batch.
+# every batch of quotes is also fed to the alert engine, which only has rules in
+# the one process that owns alerts (sync_alerts).
+
+WATCHLIST_REFRESH_SECONDS = float(os.getenv('WATCHLIST_REFRESH_SECONDS', '60'))
+WATCHLIST_BATCH_SIZE = int(os.getenv('WATCHLIST_BATCH_SIZE', '100'))
+WATCHLIST_MAX_SYMBOLS = int(os.getenv('WATCHLIST_MAX_SYMBOLS', '50'))  # per user
+ALERT_OWNER_LOCK = 'predictify-alert-engine'
+
+class QuoteCache:
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.quotes = {}  # symbol -> (refreshed_at, quote)
+        self.lock = threading.Lock()
+
+    def refresh(self, symbols: list, timeout: float = 15) -> int:
+        #download quotes in batches, returns how many came back
+        refreshed = 0
+        for i in range(0, len(symbols), WATCHLIST_BATCH_SIZE):
+            batch = symbols[i:i + WATCHLIST_BATCH_SIZE]
+            try:
+                quotes = download_quotes(batch, timeout)
+            except Exception as e:
+                print(f"Watchlist refresh failed for {len(batch)} symbols: {e}")
+                continue
+            now = time.time()
+            with self.lock:
+                for symbol, quote in quotes.items():
+                    self.quotes[symbol] = (now, quote)
+            alert_engine.on_quotes(quotes)
+            refreshed += len(quotes)
+        return refreshed
+
+    def get_many(self, symbols: list) -> dict:
+        #symbol -> quote. missing or stale ones are fetched together before returning
+        now = time.time()
+        with self.lock:
+            stale = [s for s in symbols if now - self.quotes.get(s, (0, None))[0] > self.max_age]
+        if stale:
+            self.refresh(stale)
+        with self.lock:
+            # a failed refresh still leaves the older quote, better than nothing
+            return {s: self.quotes[s][1] for s in symbols if s in self.quotes}
+
+    def forget(self, keep: set):
+        #drop symbols nobody watches any more
+        with self.lock:
+            for symbol in [s for s in self.quotes if s not in keep]:
+                del self.quotes[symbol]
+
+watchlist_quotes = QuoteCache(max_age=WATCHLIST_REFRESH_SECONDS * 2)
+
+def sync_alerts(manager=db_manager, engine=alert_engine) -> bool:
+    #one process per deployment evaluates alerts, whoever holds ALERT_OWNER_LOCK, so each
+    #fires once and not once per worker. the owner reloads the active rules from the database,
+    #everyone else (and an owner that lost the lock or the database) keeps an empty engine
+    try:
+        owner = manager.hold_lock(ALERT_OWNER_LOCK)
+        rules = manager.get_active_alerts() if owner else []
+    except Exception as e:
+        print(f"Alert sync failed, not evaluating alerts until it works again: {e}")
+        owner, rules = False, []
+    if owner != engine.owner:
+        print("This process now evaluates alerts" if owner else "Another process evaluates alerts")
+    engine.owner = owner
+    added, removed = engine.sync(rules)
+    if added or removed:
+        print(f"Alert sync: {added} added, {removed} removed")
+    return owner
+
+def refresh_watched_symbols() -> int:
+    # symbols with active alerts ride along, this refresh is what feeds the alert engine
+    sync_alerts()
+    symbols = sorted(set(db_manager.get_watched_symbols()) | set(alert_engine.watched_symbols()))
+    watchlist_quotes.forget(set(symbols))
+    if not symbols:
+        return 0
+    started = time.perf_counter()
+    refreshed = watchlist_quotes.refresh(symbols)
+    print(f"Watchlist refresh: {refreshed}/{len(symbols)} symbols in {time.perf_counter() - started:.2f}s")
+    return refreshed
+
+async def run_watchlist_refresher(interval: float = WATCHLIST_REFRESH_SECONDS):
+    #started from the app lifespan, runs until cancelled
+    while True:
+        try:
+            await asyncio.to_thread(refresh_watched_symbols)
+        except Exception as e:
+            print(f"Watchlist refresher error: {e}")
+        await asyncio.sleep(interval)
+
+def watchlist_snapshot(user_firebase_uid: str, symbols: list, days_ahead: int, tier: str) -> list:
+    #one entry per symbol: current quote plus the newest prediction we already have
+    quotes = watchlist_quotes.get_many(symbols)
+    saved = None
+
+    entries = []
+    for symbol in symbols:
+        prediction = None
+        cached = recent_result(symbol, days_ahead, tier)
+        if cached is not None:
+            age, result = cached
+            prediction = {**result, 'source': 'recent', 'age_seconds': round(age, 1)}
+        else:
+            if saved is None:
+                saved = db_manager.get_latest_predictions(user_firebase_uid, symbols)
+            if symbol in saved:
+                prediction = {**saved[symbol], 'source': 'history'}
+
+        entries.append({
+            'symbol': symbol,
+            'quote': quotes.get(symbol),
+            'prediction': prediction
+        })
+    return entries
@@ -0,0 +1,45 @@
+import os
+import sys
+import socket
+import subprocess
+import time
+import pytest
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture
+def sqlite_backend(monkeypatch, tmp_path):
+    #for tests that import config.database, or main or a service that uses db_manager:
+    #it's built on import, and this makes it a throwaway sqlite file instead of wanting
+    #a DATABASE_URL. only the first import sees it, later ones get the module as it is
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'predictify.db'))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope="module")
+def stub_yahoo(request):
+    #loadtest/stub_yahoo.py on a free port, extra args from the module's STUB_ARGS
+    port = free_port()
+    args = getattr(request.module, 'STUB_ARGS', [])
+    process = subprocess.Popen([sys.executable, '-m', 'loadtest.stub_yahoo', '--port', str(port),
+                                '--latency-ms', '1', '--jitter-ms', '0', *args], cwd=BACKEND_DIR)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                requests.get(url + "/_stub/stats", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+        else:
+            pytest.fail("Yahoo stub didn't start")
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
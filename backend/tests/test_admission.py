@@ -0,0 +1,105 @@
+import gc
+import pytest
+from fastapi.testclient import TestClient
+import services.admission as admission_module
+from services.admission import AdmissionController, FULL, DEGRADED, REJECTED
+
+# AdmissionController against a stub model pool whose queue we set by hand
+
+class StubPool:
+    def __init__(self):
+        self.queued = 0
+        self.queue_wait_ms = 0.0
+
+    def status(self) -> dict:
+        return {"queued": self.queued, "queue_wait_ms": self.queue_wait_ms}
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(admission_module, 'ADMISSION_CONTROL', True)
+    monkeypatch.setattr(admission_module, 'ADMISSION_DEGRADE_IN_FLIGHT', 2)
+    monkeypatch.setattr(admission_module, 'ADMISSION_MAX_IN_FLIGHT', 4)
+    monkeypatch.setattr(admission_module, 'ADMISSION_DEGRADE_WAIT_MS', 1500)
+    monkeypatch.setattr(admission_module, 'ADMISSION_REJECT_WAIT_MS', 6000)
+    monkeypatch.setattr(admission_module, 'ADMISSION_RETRY_AFTER', 5)
+    return AdmissionController(StubPool())
+
+def test_in_flight_thresholds(controller):
+    tickets = [controller.admit('standard') for _ in range(2)]
+    assert [t.decision for t in tickets] == [FULL, FULL]
+    # two models running: the next one is degraded, the fast tier isn't but still counts
+    tickets.append(controller.admit('standard'))
+    tickets.append(controller.admit('fast'))
+    assert [t.decision for t in tickets[2:]] == [DEGRADED, FULL]
+    assert (controller.in_flight, controller.model_in_flight) == (4, 2)
+
+    refused = controller.admit('fast')
+    assert refused.rejected and refused.retry_after == 5
+    assert controller.in_flight == 4
+
+    tickets[0].release()
+    assert controller.admit('standard').decision == FULL
+    assert controller.status()['rejected'] == 1
+
+def test_queue_wait_thresholds(controller):
+    controller.pool.queue_wait_ms = 9200
+    # nothing waiting right now, an old wait doesn't count
+    assert controller.admit('standard').decision == FULL
+
+    controller.pool.queued = 3
+    controller.pool.queue_wait_ms = 2000
+    assert controller.admit('standard').decision == DEGRADED
+    assert controller.admit('fast').decision == FULL
+
+    controller.pool.queue_wait_ms = 9200
+    refused = controller.admit('standard')
+    assert refused.decision == REJECTED
+    assert refused.retry_after == 10  # the wait, rounded up, when it's longer than the default
+
+def test_release_is_idempotent(controller):
+    ticket = controller.admit('standard')
+    ticket.release()
+    ticket.release()
+    assert (controller.in_flight, controller.model_in_flight) == (0, 0)
+    controller.admit('fast').release()
+    controller.admit('fast').release()
+    assert controller.in_flight == 0
+
+def test_dropped_ticket_is_released(controller):
+    controller.admit('standard')  # nobody keeps it
+    gc.collect()
+    assert (controller.in_flight, controller.model_in_flight) == (0, 0)
+
+@pytest.fixture
+def main(monkeypatch, controller, sqlite_backend):
+    import main
+    monkeypatch.setattr(main, 'admission', controller)
+    return main
+
+def test_stream_error_releases_the_ticket(main, monkeypatch):
+    def events(*args, **kwargs):
+        yield 'estimate', {'predicted_price': 101.0}
+        raise RuntimeError('model worker died')
+    monkeypatch.setattr(main, 'predict_events', events)
+    response = TestClient(main.app, raise_server_exceptions=False).get('/predict/stream?stock=AAPL')
+    assert 'event: estimate' in response.text and 'event: prediction' not in response.text
+    assert main.admission.in_flight == 0
+
+def test_stream_never_started_releases_the_ticket(main):
+    # the client went away before starlette pulled the first event
+    response = main.predict_stream(stock='AAPL', days_ahead=1, tier='standard', deadline_ms=None,
+                                   format='full', user_firebase_uid=None, user_email=None,
+                                   header_deadline_ms=None)
+    assert main.admission.in_flight == 1
+    del response
+    gc.collect()
+    assert main.admission.in_flight == 0
+
+def test_rejected_predict_is_503_with_retry_after(main):
+    main.admission.pool.queued = 1
+    main.admission.pool.queue_wait_ms = 7500
+    response = TestClient(main.app).get('/predict?stock=AAPL')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '8'
+    assert response.json()['retry_after'] == 8
+    assert main.admission.in_flight == 0
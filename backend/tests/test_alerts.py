@@ -0,0 +1,94 @@
+import pytest
+from services.alert_service import AlertEngine, AlertNotifier, recently_fired
+from config.sqlite_database import SQLiteDatabaseManager
+
+# two managers and engines on one database file stand in for two workers
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'predictify.db')
+    SQLiteDatabaseManager(path).create_tables()
+    return path
+
+def drain(engine: AlertEngine) -> list:
+    batch = []
+    while not engine.fired.empty():
+        batch.append(engine.fired.get_nowait())
+    return batch
+
+def test_sync_adds_and_removes():
+    engine = AlertEngine()
+    engine.sync([(1, 'u1', 'AAPL', 'above', 200), (2, 'u1', 'AAPL', 'below', 150)])
+    assert set(engine.rules) == {1, 2}
+    assert engine.sync([(2, 'u1', 'AAPL', 'below', 150), (3, 'u2', 'MSFT', 'above', 500)]) == (1, 1)
+    assert set(engine.rules) == {2, 3}
+    assert engine.on_price('AAPL', 210) == 0  # 1 was deleted
+
+def test_sync_bulk_load_fires_satisfied_rules():
+    engine = AlertEngine()
+    existing = (9000, 'u2', 'AAPL', 'above', 5000)
+    engine.sync([existing])
+    engine.on_price('AAPL', 100)
+    rules = [(i, 'u1', 'AAPL', 'above', 101 + i) for i in range(2000)] + [(5000, 'u1', 'AAPL', 'above', 90)]
+    assert engine.sync(rules + [existing]) == (2001, 0)
+    assert [alert['alert_id'] for alert in drain(engine)] == [5000]
+    assert engine.on_price('AAPL', 105.5) == 5
+
+def test_fired_alert_not_reloaded_before_it_is_marked():
+    engine = AlertEngine()
+    rules = [(1, 'u1', 'AAPL', 'above', 200)]
+    engine.sync(rules)
+    engine.on_price('AAPL', 190)
+    assert engine.on_price('AAPL', 201) == 1
+    # the database still says active until the notifier gets to it
+    assert engine.sync(rules) == (0, 0)
+    engine.settled([1])
+    assert engine.sync([]) == (0, 0)
+
+def test_marking_twice_keeps_the_first_trigger(path):
+    db = SQLiteDatabaseManager(path)
+    alert_id = db.create_alert('u1', 'one@test.local', 'AAPL', 'above', 200)
+    assert db.mark_alerts_triggered([(alert_id, 201.0)]) == [alert_id]
+    assert db.mark_alerts_triggered([(alert_id, 205.0)]) == []
+    assert db.get_user_alerts('u1')[0]['triggered_price'] == 201.0
+
+def test_notifier_reports_only_what_it_marked(path):
+    db = SQLiteDatabaseManager(path)
+    first = db.create_alert('u1', 'one@test.local', 'AAPL', 'above', 200)
+    second = db.create_alert('u1', 'one@test.local', 'AAPL', 'above', 210)
+    db.mark_alerts_triggered([(first, 201.0)])  # another process got there first
+
+    engine = AlertEngine()
+    engine.sync([(first, 'u1', 'AAPL', 'above', 200), (second, 'u1', 'AAPL', 'above', 210)])
+    engine.on_price('AAPL', 190)
+    engine.on_price('AAPL', 215)
+    notified = AlertNotifier(engine, db.mark_alerts_triggered).notify(drain(engine))
+    assert [alert['alert_id'] for alert in notified] == [second]
+    assert not engine.firing
+
+    fired = recently_fired(db.get_user_alerts('u1'))
+    assert {alert['alert_id']: alert['price'] for alert in fired} == {first: 201.0, second: 215.0}
+
+def test_one_worker_evaluates_alerts(path, sqlite_backend):
+    from services.watchlist_service import sync_alerts
+    workers = [(SQLiteDatabaseManager(path), AlertEngine()) for _ in range(2)]
+    (owner_db, owner), (other_db, other) = workers
+    alert_id = other_db.create_alert('u1', 'one@test.local', 'AAPL', 'above', 200)
+
+    assert sync_alerts(owner_db, owner)
+    assert not sync_alerts(other_db, other)
+    assert set(owner.rules) == {alert_id} and not other.rules
+
+    # deleted through the other worker, gone from the owner after its next sync
+    other_db.delete_alert('u1', alert_id)
+    sync_alerts(owner_db, owner)
+    owner.on_price('AAPL', 190)
+    assert owner.on_price('AAPL', 250) == 0
+
+def test_owner_keeps_the_lock_until_it_goes(path):
+    first, second = SQLiteDatabaseManager(path), SQLiteDatabaseManager(path)
+    assert first.hold_lock('alerts')
+    assert first.hold_lock('alerts')
+    assert not second.hold_lock('alerts')
+    first.held_locks.pop('alerts').close()  # the process exits
+    assert second.hold_lock('alerts')
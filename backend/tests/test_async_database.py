@@ -0,0 +1,197 @@
+import os
+import time
+import asyncio
+from urllib.parse import urlsplit
+import pytest
+from fastapi.testclient import TestClient
+
+# AsyncDatabaseManager against a real postgres. TEST_DATABASE_URL is a server the
+# test may create databases on, e.g. postgresql://postgres@localhost:5432/postgres;
+# it makes a throwaway primary and "replica" there and drops them afterwards.
+# ssl off unless TEST_DATABASE_SSLMODE says otherwise. the alert and read-your-writes
+# tests use two sync managers on the primary as two workers.
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL not set", allow_module_level=True)
+
+import psycopg2
+
+PRIMARY, REPLICA = 'predictify_test_primary', 'predictify_test_replica'
+
+def database_url(name: str) -> str:
+    return urlsplit(TEST_DATABASE_URL)._replace(path='/' + name).geturl()
+
+def admin(*statements):
+    db_conn = psycopg2.connect(TEST_DATABASE_URL, sslmode=os.getenv('TEST_DATABASE_SSLMODE', 'disable'))
+    db_conn.autocommit = True
+    try:
+        cursor = db_conn.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        db_conn.close()
+
+@pytest.fixture(autouse=True)
+def database_modules(monkeypatch):
+    #config.database builds db_manager on import, on the test server if it's the first to import it
+    global config, main, DatabaseManager, AsyncDatabaseManager
+    monkeypatch.setenv('DATABASE_URL', TEST_DATABASE_URL)
+    import config.database
+    import config.async_database
+    import main
+    from config.database import DatabaseManager
+    from config.async_database import AsyncDatabaseManager
+
+@pytest.fixture
+def managers(monkeypatch):
+    #(sync, async) managers on a fresh primary with one replica; the replica has the tables but none of the rows
+    monkeypatch.setattr(config.database, 'DATABASE_SSLMODE', os.getenv('TEST_DATABASE_SSLMODE', 'disable'))
+    monkeypatch.setattr(config.async_database, 'DATABASE_SSLMODE', os.getenv('TEST_DATABASE_SSLMODE', 'disable'))
+    for name in (PRIMARY, REPLICA):
+        admin(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)", f"CREATE DATABASE {name}")
+    monkeypatch.setenv('DATABASE_URL', database_url(REPLICA))
+    DatabaseManager().create_tables()
+    monkeypatch.setenv('DATABASE_URL', database_url(PRIMARY))
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', database_url(REPLICA))
+    sync_manager = DatabaseManager()
+    sync_manager.create_tables()
+    try:
+        yield sync_manager, AsyncDatabaseManager(sync_manager)
+    finally:
+        for name in (PRIMARY, REPLICA):
+            admin(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+
+def save(sync_manager, uid: str, stock: str):
+    assert sync_manager.save_prediction(uid, {
+        'email': f"{uid}@test.local",
+        'days_ahead': 1,
+        'prediction': {'stock': stock, 'predicted_price': 101.0, 'current_price': 100.0,
+                       'price_change': 1.0, 'price_change_percent': 1.0, 'confidence': 80,
+                       'volatility': 'Low', 'trend': 'Up', 'sentiment': 'Neutral'}
+    })
+
+def kill_replica():
+    #drop its connections and refuse new ones
+    admin(f"ALTER DATABASE {REPLICA} ALLOW_CONNECTIONS false",
+          f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = '{REPLICA}'")
+
+def test_reads_go_to_the_replica(managers):
+    sync_manager, async_manager = managers
+    save(sync_manager, 'user-1', 'AAPL')
+
+    async def scenario():
+        try:
+            # the replica doesn't have the row, so an empty history means it was asked
+            assert await async_manager.get_user_predictions('user-1') == []
+            assert async_manager.replica_pools[0] is not None
+        finally:
+            await async_manager.close()
+    asyncio.run(scenario())
+
+def test_dead_replica_falls_back_to_primary(managers):
+    sync_manager, async_manager = managers
+    save(sync_manager, 'user-1', 'AAPL')
+
+    async def scenario():
+        try:
+            assert await async_manager.get_user_predictions('user-1') == []
+            kill_replica()
+
+            predictions = await async_manager.get_user_predictions('user-1')
+            assert [p['stock'] for p in predictions] == ['AAPL']
+            assert async_manager.replica_down_until[0] > time.monotonic()
+            assert async_manager.replica_pools[0] is None
+
+            # skipped while it's down, no new pool for it
+            assert await async_manager.get_email_for_username('nobody') is None
+            assert [p['stock'] for p in await async_manager.get_user_predictions('user-1')] == ['AAPL']
+            assert async_manager.replica_pools[0] is None
+        finally:
+            await async_manager.close()
+    asyncio.run(scenario())
+
+def test_replica_back_after_retry_window(managers, monkeypatch):
+    sync_manager, async_manager = managers
+    save(sync_manager, 'user-1', 'AAPL')
+    monkeypatch.setattr(config.async_database, 'REPLICA_RETRY_SECONDS', 0)
+
+    async def scenario():
+        try:
+            assert await async_manager.get_user_predictions('user-1') == []
+            kill_replica()
+            assert len(await async_manager.get_user_predictions('user-1')) == 1
+            admin(f"ALTER DATABASE {REPLICA} ALLOW_CONNECTIONS true")
+            # a fresh pool on the replica again
+            assert await async_manager.get_user_predictions('user-1') == []
+            assert async_manager.replica_pools[0] is not None
+        finally:
+            await async_manager.close()
+    asyncio.run(scenario())
+
+def test_alerts_fire_once_across_managers(managers):
+    # two workers' sync managers on one primary
+    sync_manager, _ = managers
+    other = DatabaseManager()
+    alert_id = sync_manager.create_alert('user-1', 'user-1@test.local', 'AAPL', 'above', 200)
+    assert sync_manager.mark_alerts_triggered([(alert_id, 201.0)]) == [alert_id]
+    assert other.mark_alerts_triggered([(alert_id, 205.0)]) == []
+    assert other.get_active_alerts() == []
+
+def test_advisory_lock_has_one_holder(managers):
+    sync_manager, _ = managers
+    other = DatabaseManager()
+    try:
+        assert sync_manager.hold_lock('alerts')
+        assert sync_manager.hold_lock('alerts')
+        assert not other.hold_lock('alerts')
+        # the holder's connection dies and the lock goes with it
+        admin(f"SELECT pg_terminate_backend({sync_manager.held_locks['alerts'].info.backend_pid})")
+        assert other.hold_lock('alerts')
+        assert not sync_manager.hold_lock('alerts')
+        assert 'alerts' not in sync_manager.held_locks
+    finally:
+        for manager in (sync_manager, other):
+            for db_conn in manager.held_locks.values():
+                db_conn.close()
+
+def test_write_marker_reaches_another_worker(managers, monkeypatch):
+    sync_manager, _ = managers
+    monkeypatch.setattr(config.database, 'READ_YOUR_WRITES_SECONDS', 30)
+    monkeypatch.setattr(main, 'READ_YOUR_WRITES_SECONDS', 30)
+    monkeypatch.setattr(main, 'db_manager', sync_manager)
+    client = TestClient(main.app)
+    headers = {'X-User-UID': 'user-1', 'X-User-Email': 'user-1@test.local'}
+    created = client.post('/alerts', json={'symbol': 'AAPL', 'direction': 'above', 'threshold': 200}, headers=headers)
+    assert float(created.headers['X-Wrote-At']) <= time.time()
+    assert client.cookies.get('wrote_at') == created.headers['X-Wrote-At']
+
+    # the next request goes to a worker that didn't see the write
+    monkeypatch.setattr(main, 'db_manager', DatabaseManager())
+    assert len(client.get('/alerts', headers=headers).json()['alerts']) == 1
+    assert TestClient(main.app).get('/alerts', headers=headers).json()['alerts'] == []  # no marker, replica
+    marked = {**headers, 'X-Wrote-At': created.headers['X-Wrote-At']}
+    assert len(TestClient(main.app).get('/alerts', headers=marked).json()['alerts']) == 1
+    # reads don't hand out a marker
+    assert 'X-Wrote-At' not in TestClient(main.app).get('/alerts', headers=marked).headers
+
+def test_write_marker_for_async_reads(managers, monkeypatch):
+    sync_manager, _ = managers
+    monkeypatch.setattr(config.database, 'READ_YOUR_WRITES_SECONDS', 30)
+    writes = {}
+    token = config.database.request_writes.set(writes)
+    try:
+        save(sync_manager, 'user-1', 'AAPL')
+    finally:
+        config.database.request_writes.reset(token)
+    other = AsyncDatabaseManager(DatabaseManager())
+
+    async def scenario(written_at):
+        config.database.request_writes.set({'client': config.database.client_write_time(written_at)})
+        try:
+            return [p['stock'] for p in await other.get_user_predictions('user-1')]
+        finally:
+            await other.close()
+    assert asyncio.run(scenario(f"{writes['wrote']:.3f}")) == ['AAPL']
+    assert asyncio.run(scenario(None)) == []
+    assert asyncio.run(scenario(str(time.time() + 3600))) == []  # from the future, ignored
@@ -0,0 +1,73 @@
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+
+import services.stock_service as stock_service
+from utils.price_store import PriceStore
+
+# /compare's batch price cache and prediction lookup, downloads stubbed out
+
+DAY = 86400
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+START_TS = int(START.timestamp())
+
+def bars(first_day: int, last_day: int):
+    timestamps = np.arange(START_TS + first_day * DAY, START_TS + (last_day + 1) * DAY, DAY, dtype=np.uint32)
+    return timestamps, 100 + np.arange(first_day, last_day + 1, dtype=np.float64)
+
+@pytest.fixture
+def downloads(monkeypatch):
+    #every batch download as (symbols, start day), answering with bars up to day 60
+    calls = []
+    def batch_closes(symbols, start, timeout):
+        first_day = (int(start.timestamp()) - START_TS) // DAY
+        calls.append((sorted(symbols), first_day))
+        return {symbol: bars(first_day, 60) for symbol in symbols}
+    monkeypatch.setattr(stock_service, 'price_store', PriceStore())
+    monkeypatch.setattr(stock_service, '_fits_in_store', lambda start: True)
+    monkeypatch.setattr(stock_service, '_batch_closes', batch_closes)
+    return calls
+
+def test_stale_symbols_are_topped_up(downloads):
+    store = stock_service.price_store
+    store.replace('AAPL', *bars(0, 50), covered_from=START_TS, refreshed_at=0)
+    store.replace('MSFT', *bars(0, 55), covered_from=START_TS, refreshed_at=0)
+    store.replace('NVDA', *bars(0, 60), covered_from=START_TS, refreshed_at=time.time())
+
+    windows = stock_service.cached_closes_many(['AAPL', 'MSFT', 'NVDA', 'AMD'], START)
+    # one top-up from the oldest last bar, the full window only for the symbol we didn't have
+    assert downloads == [(['AAPL', 'MSFT'], 50), (['AMD'], 0)]
+    assert all(len(windows[s][0]) == 61 for s in ('AAPL', 'MSFT', 'NVDA', 'AMD'))
+    assert store.covered_from('AAPL') == START_TS
+
+def test_revised_history_downloads_the_window(downloads):
+    store = stock_service.price_store
+    timestamps, closes = bars(0, 50)
+    store.replace('AAPL', timestamps, closes * 2, covered_from=START_TS, refreshed_at=0)  # before a split
+    store.replace('MSFT', *bars(0, 40), covered_from=START_TS, refreshed_at=0)
+
+    # MSFT's top-up overlaps AAPL's last ten days, which no longer match
+    windows = stock_service.cached_closes_many(['AAPL', 'MSFT'], START)
+    assert downloads == [(['AAPL', 'MSFT'], 40), (['AAPL'], 0)]
+    assert len(windows['AAPL'][0]) == 61 and windows['AAPL'][1][0] == 100
+
+def test_predictions_prefer_the_users_own(monkeypatch, sqlite_backend):
+    import services.compare_service as compare_service
+    saved = {'AAPL': {'predicted_price': 210.0}}
+    asked = []
+    def latest(uid, symbols):
+        asked.append(uid)
+        return saved
+    monkeypatch.setattr(compare_service.db_manager, 'get_latest_predictions', latest)
+    monkeypatch.setattr(compare_service, 'recent_result',
+                        lambda symbol, days_ahead, tier: (5.0, {'predicted_price': 1.0}) if symbol != 'AMD' else None)
+
+    predictions = compare_service.compare_predictions(['AAPL', 'MSFT', 'AMD'], 1, 'standard', 'user-1')
+    assert predictions['AAPL'] == {'predicted_price': 210.0, 'source': 'history'}
+    assert predictions['MSFT'] == {'predicted_price': 1.0, 'source': 'recent', 'age_seconds': 5.0}
+    assert predictions['AMD'] is None
+
+    anonymous = compare_service.compare_predictions(['AAPL'], 1, 'standard')
+    assert anonymous['AAPL']['source'] == 'recent'
+    assert asked == ['user-1']
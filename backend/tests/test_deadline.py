@@ -0,0 +1,41 @@
+import time
+import threading
+import utils.deadline
+from utils.deadline import Deadline, MIN_DEADLINE_MS, abandoned_stages
+
+def test_stage_in_time():
+    deadline = Deadline(1000)
+    assert deadline.run("stage", lambda x: x * 2, 21, fallback=lambda: None) == 42
+    assert deadline.degraded == []
+
+def test_budget_is_clamped():
+    assert Deadline(0).budget_ms == MIN_DEADLINE_MS
+
+def test_slow_stage_falls_back_and_is_abandoned():
+    release = threading.Event()
+    deadline = Deadline(MIN_DEADLINE_MS)
+    try:
+        assert deadline.run("slow", release.wait, fallback=lambda: "fallback") == "fallback"
+        assert deadline.degraded == ["slow"]
+        assert abandoned_stages() == 1
+    finally:
+        release.set()
+    time.sleep(0.05)
+    assert abandoned_stages() == 0
+
+def test_abandoned_stages_are_capped(monkeypatch):
+    monkeypatch.setattr(utils.deadline, 'MAX_ABANDONED_STAGES', 1)
+    release = threading.Event()
+    try:
+        Deadline(MIN_DEADLINE_MS).run("slow", release.wait, fallback=lambda: None)
+
+        # the next request's stages don't get a thread while that one holds it
+        deadline = Deadline(1000)
+        started = time.monotonic()
+        assert deadline.run("quick", lambda: "done", fallback=lambda: "fallback") == "fallback"
+        assert time.monotonic() - started < 0.05
+        assert deadline.degraded == ["quick"]
+    finally:
+        release.set()
+    time.sleep(0.05)
+    assert Deadline(1000).run("quick", lambda: "done", fallback=lambda: "fallback") == "done"
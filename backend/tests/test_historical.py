@@ -0,0 +1,58 @@
+import gzip
+import json
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from utils.serialization import encoded_response
+
+# /historical/{symbol} caching headers, with the price window stubbed out
+
+DAY = 86400
+
+@pytest.fixture
+def client(monkeypatch, sqlite_backend):
+    import main
+    timestamps = np.arange(1700000000, 1700000000 + 300 * DAY, DAY, dtype=np.uint32)
+    closes = np.linspace(100, 130, len(timestamps)).astype(np.float32)
+    monkeypatch.setattr(main, 'get_historical_window', lambda symbol, period, start, end: {
+        "symbol": symbol.upper(), "timestamps": timestamps, "closes": closes
+    })
+    return TestClient(main.app)
+
+def get(client, format: str, encoding: str, etag: str = None):
+    headers = {"Accept-Encoding": encoding}
+    if etag:
+        headers["If-None-Match"] = etag
+    return client.get(f"/historical/AAPL?period=1y&format={format}", headers=headers)
+
+def test_vary_on_every_format(client):
+    for format in ("full", "compact"):
+        assert get(client, format, "gzip").headers["Vary"] == "Accept-Encoding"
+
+def test_etag_per_format_and_encoding(client):
+    full = get(client, "full", "gzip")
+    compact_gzip = get(client, "compact", "gzip")
+    compact_plain = get(client, "compact", "identity")
+    assert compact_gzip.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in compact_plain.headers
+    etags = {full.headers["ETag"], compact_gzip.headers["ETag"], compact_plain.headers["ETag"]}
+    assert len(etags) == 3
+
+    # the full format isn't compressed here, the encoding doesn't matter for it
+    assert get(client, "full", "identity").headers["ETag"] == full.headers["ETag"]
+
+def test_not_modified_only_for_the_same_representation(client):
+    compact_gzip = get(client, "compact", "gzip")
+    assert get(client, "compact", "gzip", compact_gzip.headers["ETag"]).status_code == 304
+
+    # a client that can't take gzip must not be told its cached gzip body is current
+    plain = get(client, "compact", "identity", compact_gzip.headers["ETag"])
+    assert plain.status_code == 200
+    assert json.loads(plain.content)["symbol"] == "AAPL"
+
+def test_gzip_body_is_stable():
+    # same ETag, same bytes: no timestamp in the gzip header
+    payload = {"closes": list(range(1000))}
+    bodies = {encoded_response(payload, "gzip").body for _ in range(2)}
+    assert len(bodies) == 1
+    assert json.loads(gzip.decompress(bodies.pop())) == payload
@@ -0,0 +1,29 @@
+import time
+from utils.identity_cache import IdentityCache, MISSING
+
+# what another worker's IdentityCache sees after a username moves in this one
+
+def test_username_hits_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = IdentityCache(negative_ttl=30, positive_ttl=300)
+    cache.username_saved('alice', 'alice@test.local')
+    cache.user_ids.set('uid-1', 7)
+
+    now[0] += 299
+    assert cache.emails.get('alice') == 'alice@test.local'
+    assert cache.usernames_taken.get('alice') is True
+    now[0] += 2
+    assert cache.emails.get('alice') is MISSING
+    assert cache.usernames_taken.get('alice') is MISSING
+    # ids don't change, they stay
+    assert cache.user_ids.get('uid-1') == 7
+
+def test_misses_expire_sooner(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = IdentityCache(negative_ttl=30, positive_ttl=300)
+    cache.emails.set('bob', None)
+    assert cache.emails.get('bob') is None
+    now[0] += 31
+    assert cache.emails.get('bob') is MISSING
@@ -0,0 +1,79 @@
+import joblib
+import numpy as np
+from services.incremental_rf import IncrementalForest
+
+# two IncrementalForest objects on one store stand in for two worker processes:
+# each has its own in-memory state and its own lock file handle
+
+def random_walk(n: int = 140, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+def test_update_picks_up_another_workers_save(tmp_path):
+    prices = random_walk()
+    first = IncrementalForest('AAPL', 1, store_dir=str(tmp_path))
+    second = IncrementalForest('AAPL', 1, store_dir=str(tmp_path))
+
+    first.update(prices[:100])
+    second.update(prices[:100])
+    assert second.state['refreshes'] == 0
+
+    # the first worker sees two more days, one at a time
+    first.update(prices[:101])
+    first.update(prices[:102])
+    assert first.state['refreshes'] == 2
+
+    # the second one catches up from the file instead of refreshing its stale copy over it
+    model, X, y = second.update(prices[:102])
+    assert second.state['refreshes'] == 2
+    assert len(X) == len(first.state['X'])
+    stored = joblib.load(first.path)
+    assert stored['refreshes'] == 2
+    assert stored['refreshed_at'] == first.state['refreshed_at']
+
+def test_update_without_changes_keeps_loaded_state(tmp_path):
+    prices = random_walk()
+    forest = IncrementalForest('MSFT', 5, store_dir=str(tmp_path))
+    forest.update(prices[:100])
+    state = forest.state
+    forest.update(prices[:100])
+    assert forest.state is state  # file unchanged, not reread
+
+def test_removed_file_means_full_refit(tmp_path):
+    prices = random_walk()
+    forest = IncrementalForest('NVDA', 1, store_dir=str(tmp_path))
+    forest.update(prices[:100])
+    forest.update(prices[:101])
+    assert forest.state['refreshes'] == 1
+
+    (tmp_path / 'NVDA_1.joblib').unlink()
+    forest.update(prices[:102])
+    assert forest.state['refreshes'] == 0
+    assert (tmp_path / 'NVDA_1.joblib').exists()
+
+def feed(forest, prices, start: int):
+    #one new daily bar per update, like a day's worth of requests each
+    for n in range(start, len(prices) + 1):
+        forest.update(prices[:n])
+
+def test_stationary_series_keeps_refreshing(tmp_path):
+    # no change in the process, the new samples' error matches the held-out baseline
+    for days_ahead in (1, 5):
+        prices = random_walk(252 + 40, seed=days_ahead)
+        forest = IncrementalForest('AAPL', days_ahead, store_dir=str(tmp_path))
+        forest.update(prices[:252])
+        fitted_at = forest.state['fitted_at']
+        feed(forest, prices, 253)
+        assert forest.state['fitted_at'] == fitted_at
+        assert forest.state['refreshes'] == 40
+
+def test_volatility_jump_triggers_refit(tmp_path):
+    rng = np.random.default_rng(3)
+    returns = rng.normal(0, 0.01, 252 + 30)
+    returns[252:] *= 4
+    prices = 100 * np.exp(np.cumsum(returns))
+    forest = IncrementalForest('AAPL', 1, store_dir=str(tmp_path))
+    forest.update(prices[:252])
+    fitted_at = forest.state['fitted_at']
+    feed(forest, prices, 253)
+    assert forest.state['fitted_at'] > fitted_at
@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+import numpy as np
+from utils.shared_price_store import MappedPriceStore
+
+# two MappedPriceStore objects on one directory stand in for two worker processes:
+# each has its own mappings and its own lock file handles
+
+DAY = 86400
+START = 1700000000
+
+def bars(first_day: int, last_day: int, offset: float = 0.0):
+    days = np.arange(first_day, last_day + 1)
+    return (START + days * DAY).astype(np.uint32), (100 + days + offset).astype(np.float32)
+
+def test_other_worker_sees_new_bars(tmp_path):
+    first, second = MappedPriceStore(str(tmp_path)), MappedPriceStore(str(tmp_path))
+    first.ingest('AAPL', *bars(0, 9), refreshed_at=1.0)
+    timestamps, closes = second.window('AAPL')
+    assert len(timestamps) == 10 and closes[-1] == 109
+
+    first.ingest('aapl', *bars(9, 14), refreshed_at=2.0)
+    assert len(second.window('AAPL')[0]) == 15
+    assert second.refreshed_at('AAPL') == 2.0
+    # the view handed out before still reads the old version
+    assert len(timestamps) == 10 and closes[-1] == 109
+    assert second.symbols() == ['AAPL']
+
+def test_publish_renames_a_new_file(tmp_path):
+    first, second = MappedPriceStore(str(tmp_path)), MappedPriceStore(str(tmp_path))
+    first.ingest('AAPL', *bars(0, 9))
+    path = tmp_path / 'AAPL.bars'
+    inode = os.stat(path).st_ino
+    mapped = second.get('AAPL')
+    assert second.get('AAPL') is mapped  # unchanged file, same mapping
+
+    first.ingest('AAPL', *bars(10, 11))
+    assert os.stat(path).st_ino != inode
+    assert second.get('AAPL') is not mapped
+    assert sorted(os.listdir(tmp_path)) == ['AAPL.bars', 'AAPL.lock']  # no temp files left
+
+def test_covered_from_clipped_once_full(tmp_path):
+    store = MappedPriceStore(str(tmp_path), capacity=8)
+    timestamps, closes = bars(0, 4)
+    store.replace('AAPL', timestamps, closes, covered_from=START - 30 * DAY)
+    assert store.covered_from('AAPL') == START - 30 * DAY
+
+    store.ingest('AAPL', *bars(5, 11))
+    window = store.window('AAPL')[0]
+    assert len(window) == 8 and window[0] == START + 4 * DAY
+    assert store.covered_from('AAPL') == START + 4 * DAY
+    assert MappedPriceStore(str(tmp_path), capacity=8).covered_from('AAPL') == START + 4 * DAY
+
+def test_revised_history_restarts_the_symbol(tmp_path):
+    first, second = MappedPriceStore(str(tmp_path)), MappedPriceStore(str(tmp_path))
+    first.replace('AAPL', *bars(0, 20), covered_from=START, refreshed_at=5.0)
+    # a split: every close from day 10 on is different now
+    assert second.ingest('AAPL', *bars(10, 25, offset=-50), refreshed_at=6.0)
+    timestamps, closes = first.window('AAPL')
+    assert timestamps[0] == START + 10 * DAY and closes[0] == 60
+    assert first.covered_from('AAPL') == START + 10 * DAY
+    # overlapping unchanged bars are just appended
+    assert not second.ingest('AAPL', *bars(24, 26, offset=-50))
+    assert len(first.window('AAPL')[0]) == 17
+
+def test_header_keeps_coverage_and_refresh_time(tmp_path):
+    first = MappedPriceStore(str(tmp_path))
+    first.replace('MSFT', *bars(0, 4), covered_from=START - DAY, refreshed_at=1234.5)
+    first.ingest('MSFT', *bars(5, 6))  # no refreshed_at: keeps the stored one
+    second = MappedPriceStore(str(tmp_path))
+    assert second.covered_from('MSFT') == START - DAY
+    assert second.refreshed_at('MSFT') == 1234.5
+    assert second.covered_from('NVDA') == float('inf') and second.refreshed_at('NVDA') == 0.0
+
+def test_writers_in_two_processes_take_turns(tmp_path):
+    first, second = MappedPriceStore(str(tmp_path)), MappedPriceStore(str(tmp_path))
+    first.ingest('AAPL', *bars(0, 9))
+    done = threading.Event()
+
+    def other_write():
+        second.ingest('AAPL', *bars(10, 10))
+        done.set()
+
+    with first._writing('AAPL'):
+        writer = threading.Thread(target=other_write)
+        writer.start()
+        time.sleep(0.2)
+        # separate thread locks, only the flock keeps the second one out
+        assert not done.is_set()
+        first._publish('AAPL', first.get('AAPL'), START - DAY, 42.0)
+    writer.join(5)
+    # it read the file the first one published while it waited, and merged onto that
+    assert done.is_set() and len(first.window('AAPL')[0]) == 11
+    assert first.covered_from('AAPL') == START - DAY and first.refreshed_at('AAPL') == 42.0
@@ -0,0 +1,130 @@
+import os
+import sys
+import asyncio
+import subprocess
+import pytest
+from config.sqlite_database import SQLiteDatabaseManager
+
+# the DatabaseManager interface on STORAGE_BACKEND=sqlite, each test on its own file
+
+def prediction(stock: str, predicted: float = 101.0, current: float = 100.0, days_ahead: int = 1) -> dict:
+    #what /predict hands to save_prediction
+    return {
+        'email': 'user@test.local',
+        'days_ahead': days_ahead,
+        'prediction': {'stock': stock, 'predicted_price': predicted, 'current_price': current,
+                       'price_change': predicted - current,
+                       'price_change_percent': (predicted - current) / current * 100,
+                       'confidence': 80, 'volatility': 'Low', 'trend': 'Up', 'sentiment': 'Neutral'},
+        'model_info': {'method_used': 'Random Forest'},
+        'trading_info': {'target_date': '2026-01-05'}
+    }
+
+@pytest.fixture
+def db(tmp_path):
+    manager = SQLiteDatabaseManager(str(tmp_path / 'predictify.db'))
+    manager.create_tables()
+    return manager
+
+def test_imports_on_its_own():
+    # first thing imported in a fresh interpreter, no DATABASE_URL or STORAGE_BACKEND
+    env = {k: v for k, v in os.environ.items() if k not in ('DATABASE_URL', 'STORAGE_BACKEND')}
+    subprocess.run([sys.executable, '-c', 'import config.sqlite_database'], env=env, check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_storage_backend_selects_sqlite(monkeypatch, sqlite_backend):
+    import config.database
+    monkeypatch.setattr(config.database, 'STORAGE_BACKEND', 'sqlite')
+    assert isinstance(config.database.create_db_manager(), SQLiteDatabaseManager)
+
+def test_create_and_get_user(db):
+    assert db.get_user_id('uid-1') is None
+    user_id = db.createorget_user('uid-1', 'one@test.local', 'one')
+    assert db.createorget_user('uid-1', 'other@test.local') == user_id
+    assert db.get_user_id('uid-1') == user_id
+    assert db.check_username_exists('one')
+    assert not db.check_username_exists('two')
+    assert db.get_email_for_username('one') == 'one@test.local'
+    assert [user['firebase_uid'] for user in db.get_recent_users()] == ['uid-1']
+
+def test_user_lookups_survive_a_new_manager(db):
+    # nothing only in the identity cache
+    user_id = db.createorget_user('uid-1', 'one@test.local', 'one')
+    fresh = SQLiteDatabaseManager(db.path)
+    assert fresh.get_user_id('uid-1') == user_id
+    assert fresh.get_email_for_username('one') == 'one@test.local'
+
+def test_save_and_get_predictions(db):
+    assert db.get_user_predictions('uid-1') == []
+    assert db.save_prediction('uid-1', prediction('AAPL', 190.5, 187.25, days_ahead=5))
+    assert db.save_prediction('uid-1', prediction('MSFT'))
+    assert db.save_prediction('uid-2', prediction('NVDA'))
+
+    predictions = db.get_user_predictions('uid-1')
+    assert [p['stock'] for p in predictions] == ['MSFT', 'AAPL']
+    aapl = predictions[1]
+    assert aapl['predicted_price'] == 190.5
+    assert aapl['current_price'] == 187.25
+    assert aapl['days_ahead'] == 5
+    assert aapl['model_used'] == 'Random Forest'
+    assert aapl['target_date'] == '2026-01-05'
+    assert [p['stock'] for p in db.get_user_predictions('uid-1', limit=1)] == ['MSFT']
+
+    latest = db.get_latest_predictions('uid-1', ['AAPL', 'MSFT', 'TSLA'])
+    assert sorted(latest) == ['AAPL', 'MSFT']
+    assert latest['AAPL']['predicted_price'] == 190.5
+
+def test_history_through_the_async_layer(db, sqlite_backend):
+    # what the async endpoints use on sqlite
+    from config.async_database import ThreadedDatabaseManager
+    db.save_prediction('uid-1', prediction('AAPL'))
+    async_db = ThreadedDatabaseManager(db)
+    predictions = asyncio.run(async_db.get_user_predictions('uid-1'))
+    assert [p['stock'] for p in predictions] == ['AAPL']
+
+def test_username_change(db):
+    assert not db.save_username('uid-1', 'one')
+    db.createorget_user('uid-1', 'one@test.local', 'one')
+    db.createorget_user('uid-2', 'two@test.local', 'two')
+
+    assert db.save_username('uid-1', 'uno')
+    assert db.get_email_for_username('uno') == 'one@test.local'
+    assert db.get_email_for_username('one') is None
+    assert not db.check_username_exists('one')
+
+    with pytest.raises(db.IntegrityError):
+        db.save_username('uid-1', 'two')
+    assert db.get_email_for_username('uno') == 'one@test.local'
+
+def test_watchlist(db):
+    assert db.get_watchlist('uid-1') == []
+    assert db.add_watchlist_symbol('uid-1', 'one@test.local', 'AAPL')
+    assert not db.add_watchlist_symbol('uid-1', 'one@test.local', 'AAPL')
+    assert db.add_watchlist_symbol('uid-1', 'one@test.local', 'MSFT')
+    assert db.add_watchlist_symbol('uid-2', 'two@test.local', 'AAPL')
+
+    assert db.get_watchlist('uid-1') == ['AAPL', 'MSFT']
+    assert db.get_watched_symbols() == ['AAPL', 'MSFT']
+    assert db.remove_watchlist_symbol('uid-1', 'AAPL')
+    assert not db.remove_watchlist_symbol('uid-1', 'AAPL')
+    assert not db.remove_watchlist_symbol('uid-3', 'AAPL')
+    assert db.get_watchlist('uid-1') == ['MSFT']
+
+def test_alerts(db):
+    above = db.create_alert('uid-1', 'one@test.local', 'AAPL', 'above', 200.0)
+    below = db.create_alert('uid-1', 'one@test.local', 'AAPL', 'below', 150.0)
+    other = db.create_alert('uid-2', 'two@test.local', 'MSFT', 'above', 500.0)
+
+    assert sorted(alert[0] for alert in db.get_active_alerts()) == sorted([above, below, other])
+    db.mark_alerts_triggered([(above, 201.5)])
+    assert sorted(alert[0] for alert in db.get_active_alerts()) == sorted([below, other])
+
+    alerts = {alert['id']: alert for alert in db.get_user_alerts('uid-1')}
+    assert set(alerts) == {above, below}
+    assert not alerts[above]['active'] and alerts[above]['triggered_price'] == 201.5
+    assert alerts[above]['triggered_at'] is not None
+    assert alerts[below]['active'] and alerts[below]['triggered_price'] is None
+
+    assert not db.delete_alert('uid-2', above)  # not theirs
+    assert db.delete_alert('uid-1', above)
+    assert [alert['id'] for alert in db.get_user_alerts('uid-1')] == [below]
@@ -0,0 +1,85 @@
+import pytest
+import requests
+import pandas as pd
+from services.upstream import (UpstreamScheduler, UpstreamUnavailable, DownloadFailed, RedirectedSession,
+                               checked_download, download_failure)
+
+# every stub response is a 429
+STUB_ARGS = ['--throttle-rate', '1']
+
+def scheduler(**kwargs):
+    settings = dict(rate=1000, burst=1000, max_retries=1, base_delay=0.01, max_delay=0.05,
+                    failure_threshold=3, reset_timeout=60)
+    return UpstreamScheduler(**{**settings, **kwargs})
+
+def test_throttled_download_is_a_failure(stub_yahoo):
+    upstream = scheduler()
+    with pytest.raises(DownloadFailed):
+        upstream.call(checked_download, 'AAPL', period='5d', progress=False,
+                      session=RedirectedSession(stub_yahoo), validate=download_failure)
+    # first try + one retry, both counted
+    assert upstream.status()['consecutive_failures'] == 2
+
+def test_throttled_downloads_open_the_circuit(stub_yahoo):
+    upstream = scheduler()
+    session = RedirectedSession(stub_yahoo)
+    for _ in range(2):
+        with pytest.raises((DownloadFailed, UpstreamUnavailable)):
+            upstream.call(checked_download, ['AAPL', 'MSFT'], period='5d', progress=False,
+                          session=session, validate=download_failure)
+    assert upstream.status()['circuit'] == 'open'
+    with pytest.raises(UpstreamUnavailable):
+        upstream.call(checked_download, 'AAPL', period='5d', progress=False,
+                      session=session, validate=download_failure)
+
+def test_throttled_get_retries_then_fails(stub_yahoo):
+    upstream = scheduler(session=requests.Session())
+    with pytest.raises(Exception, match="429"):
+        upstream.get(f"{stub_yahoo}/v1/finance/trending/US", timeout=5)
+    assert upstream.status()['consecutive_failures'] == 2
+
+def frame(rows: int, errors: list):
+    data = pd.DataFrame({'Close': [100.0] * rows})
+    data.attrs['errors'] = errors
+    return data
+
+def test_download_failure_rules():
+    # unknown symbols: upstream is fine
+    download_failure(frame(0, ["\n1 Failed download:", "['ZZZZ']: possibly delisted; no price data found"]))
+    download_failure(frame(5, []))
+    with pytest.raises(DownloadFailed):
+        download_failure(frame(0, ["['AAPL']: ConnectionError('reset')"]))
+    # partly throttled still counts
+    with pytest.raises(DownloadFailed):
+        download_failure(frame(5, ["['MSFT']: YFRateLimitError('Too Many Requests. Rate limited.')"]))
+
+def test_checked_download_keeps_only_its_own_errors(monkeypatch):
+    import logging
+    import threading
+    import yfinance as yf
+    import yfinance.shared as yf_shared
+    logger = logging.getLogger('yfinance')
+    other_logged, ours_done = threading.Event(), threading.Event()
+
+    def other_download():
+        # another request's download is throttled while ours runs
+        logger.error("['MSFT']: YFRateLimitError('Too Many Requests. Rate limited.')")
+        other_logged.set()
+        ours_done.wait(5)
+
+    def download(symbols, **kwargs):
+        other_logged.wait(5)
+        logger.error("['ZZZZ']: possibly delisted; no price data found")
+        return pd.DataFrame()
+    monkeypatch.setattr(yf, 'download', download)
+    monkeypatch.setattr(yf_shared, '_ERRORS', {'MSFT': 'YFRateLimitError: Rate limited'}, raising=False)
+
+    thread = threading.Thread(target=other_download)
+    thread.start()
+    try:
+        data = checked_download(['ZZZZ'], period='5d')
+    finally:
+        ours_done.set()
+        thread.join()
+    assert data.attrs['errors'] == ["['ZZZZ']: possibly delisted; no price data found"]
+    download_failure(data)  # not a failure, the symbol just has no data
@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeout
+
+# per-request latency budget for /predict.
+# stages run on a shared thread pool and get waited on for whatever budget is
+# left. a stage that doesn't make it is abandoned and its fallback is used
+# instead, and the stage name is recorded so the response can say so.
+#
+# an abandoned stage can't be stopped, it keeps its pool thread until it
+# returns (the fetches get the remaining budget as their timeout, so usually
+# soon after). a stalled upstream could still fill the pool with them and leave
+# new requests queueing for threads, so while MAX_ABANDONED_STAGES of them are
+# running new stages aren't started at all and go straight to their fallback.
+
+DEFAULT_DEADLINE_MS = int(os.getenv('PREDICT_DEADLINE_MS', '8000'))
+MIN_DEADLINE_MS = 100
+MAX_DEADLINE_MS = 60000
+
+DEADLINE_POOL_SIZE = int(os.getenv('DEADLINE_POOL_SIZE', '32'))
+MAX_ABANDONED_STAGES = int(os.getenv('DEADLINE_MAX_ABANDONED', str(DEADLINE_POOL_SIZE // 2)))
+
+_stage_pool = ThreadPoolExecutor(max_workers=DEADLINE_POOL_SIZE, thread_name_prefix='predict-stage')
+
+_abandoned = set()  # futures of stages nobody waits for, still running
+_abandoned_lock = threading.Lock()
+
+def _forget(future):
+    with _abandoned_lock:
+        _abandoned.discard(future)
+
+def _abandon(future):
+    with _abandoned_lock:
+        _abandoned.add(future)
+    future.add_done_callback(_forget)
+
+def abandoned_stages() -> int:
+    return len(_abandoned)
+
+class Deadline:
+    def __init__(self, budget_ms: int = DEFAULT_DEADLINE_MS):
+        self.budget_ms = max(MIN_DEADLINE_MS, min(MAX_DEADLINE_MS, int(budget_ms)))
+        self.expires_at = time.monotonic() + self.budget_ms / 1000
+        self.degraded = []
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        #seconds left, keeping `reserve` seconds back for the stages after this one
+        return max(0.0, self.expires_at - time.monotonic() - reserve)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def submit(self, fn, *args, **kwargs):
+        if abandoned_stages() >= MAX_ABANDONED_STAGES:
+            # a cancelled future, wait() goes straight to the fallback
+            future = Future()
+            future.cancel()
+            return future
+        return _stage_pool.submit(fn, *args, **kwargs)
+
+    def wait(self, future, stage: str, fallback, reserve: float = 0.0):
+        #result of the stage if it lands in time, otherwise fallback()
+        try:
+            return future.result(timeout=self.remaining(reserve))
+        except CancelledError:
+            print(f"Deadline: {stage} skipped, {abandoned_stages()} abandoned stages still running")
+        except FutureTimeout:
+            if not future.cancel():  # only works if it never started
+                _abandon(future)
+            print(f"Deadline: {stage} cut short after {self.budget_ms}ms budget")
+        self.degraded.append(stage)
+        return fallback()
+
+    def run(self, stage: str, fn, *args, fallback, reserve: float = 0.0, **kwargs):
+        return self.wait(self.submit(fn, *args, **kwargs), stage, fallback, reserve)
@@ -1,11 +1,15 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import yfinance as yf
+from utils.price_series import as_price_series
+from services.upstream import yahoo
 #helpers
 
 analyzer = SentimentIntensityAnalyzer()
@@ -89,62 +93,100 @@ def chart_title(days_ahead: int):
     else:
         return "📊 Price History (1 Year)"
 
+TIMELINE_PATHS = 500
+TIMELINE_BANDS = (10, 90)  # percentiles for the lower/upper band
+
+VOL_FACTORS = {
+    "Low": 0.003,      # 1% daily variation
+    "Moderate": 0.006, # 2% daily variation  
+    "High": 0.012       # 4% daily variation
+}
+
+def trading_dates_after(start_date, trading_days_ahead: int):
+    #next n trading days after start_date, weekends/holidays dropped in one go
+    start = pd.Timestamp(start_date).normalize() + pd.Timedelta(days=1)
+    candidates = pd.bdate_range(start, periods=trading_days_ahead + len(US_MARKET_HOLIDAYS_2025))
+    candidates = candidates[~candidates.strftime("%Y-%m-%d").isin(US_MARKET_HOLIDAYS_2025)]
+    return candidates[:trading_days_ahead]
+
+def timeline_seed(*key_parts) -> int:
+    #stable seed from the request key (hash() is salted per process, so no)
+    digest = hashlib.sha256("|".join(str(part) for part in key_parts).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+@lru_cache(maxsize=256)
+def _simulate_timeline(current_price: float, predicted_price: float, trading_days_ahead: int,
+                       vol_factor: float, seed: int, n_paths: int):
+    #all paths in one draw: linear drift to the prediction plus a random walk of daily noise
+    rng = np.random.default_rng(seed)
+    days = np.arange(1, trading_days_ahead + 1)
+    base = current_price + (predicted_price - current_price) * days / trading_days_ahead
+
+    shocks = rng.normal(0, current_price * vol_factor, size=(n_paths, trading_days_ahead))
+    paths = base + np.cumsum(shocks, axis=1)
+    # non negativity or not too high constraints
+    np.clip(paths, current_price * 0.5, current_price * 2.0, out=paths)
+
+    lower, median, upper = np.percentile(paths, [TIMELINE_BANDS[0], 50, TIMELINE_BANDS[1]], axis=0)
+    return tuple(median.tolist()), tuple(lower.tolist()), tuple(upper.tolist())
+
 def generate_pred_timeline(current_price: float, predicted_price: float, 
-                           trading_days_ahead: int, volatility: str):
-    #get data points
-    timeline = []
+                           trading_days_ahead: int, volatility: str,
+                           seed_key: tuple = None, n_paths: int = TIMELINE_PATHS,
+                           compact: bool = False):
+    #median of a Monte Carlo simulation plus percentile bands, one point per trading day.
+    #seeded from seed_key (or the inputs) so the same request draws the same chart.
+    #compact=True gives parallel arrays (day 0 first) instead of one dict per day.
+    today = datetime.now()
+    today_str = today.strftime("%Y-%m-%d")
+
+    if compact:
+        columns = {"days": [0], "dates": [today_str], "prices": [current_price],
+                   "lower": [current_price], "upper": [current_price], "labels": ["Today"]}
+        if trading_days_ahead < 1:
+            return columns
 
-    timeline.append({
+    timeline = [{
         "day": 0,
         "price": current_price,
+        "lower": current_price,
+        "upper": current_price,
         "label": "Today",
-        "date": datetime.now().strftime("%Y-%m-%d"),
+        "date": today_str,
         "is_trading_day": True
-    })
-
-    price_change = predicted_price - current_price
-
-    vol_factor = {
-        "Low": 0.003,      # 1% daily variation
-        "Moderate": 0.006, # 2% daily variation  
-        "High": 0.012       # 4% daily variation
-    }.get(volatility, 0.006)
-
-    current_date = datetime.now()
-    trading_days_counted = 0
-    calendar_days_checked = 0
-
-    while trading_days_counted < trading_days_ahead and calendar_days_checked < trading_days_ahead * 3:
-        calendar_days_checked += 1
-        current_date += timedelta(days=1)
-        
-        if is_trading_day(current_date):
-            trading_days_counted += 1
-
-        # linear progress         
-        progress = trading_days_counted / trading_days_ahead
-        base_price = current_price + (price_change * progress)
-        
-         # market noise based on volatility
-        daily_variation = np.random.normal(0, current_price * vol_factor)
-        price_point = base_price + daily_variation
-        
-        # non negativity or not too high constraints
-        price_point = max(current_price * 0.5, base_price + daily_variation)
-        price_point = min(current_price * 2.0, price_point)  # capped at 2x current price
-
-
-        
-        if trading_days_counted % max(1, trading_days_ahead // 5) == 0 or trading_days_counted == trading_days_ahead:
-            label = f"+{trading_days_counted}d"
-        else:
-            label = ""
-        
+    }]
+    if trading_days_ahead < 1:
+        return timeline
+
+    vol_factor = VOL_FACTORS.get(volatility, 0.006)
+    if seed_key is None:
+        seed_key = (current_price, predicted_price, trading_days_ahead, volatility)
+    seed = timeline_seed(today_str, *seed_key)
+
+    median, lower, upper = _simulate_timeline(float(current_price), float(predicted_price),
+                                              trading_days_ahead, vol_factor, seed, n_paths)
+    dates = trading_dates_after(today, trading_days_ahead).strftime("%Y-%m-%d")
+    label_every = max(1, trading_days_ahead // 5)
+
+    if compact:
+        days = np.arange(1, trading_days_ahead + 1)
+        labeled = (days % label_every == 0) | (days == trading_days_ahead)
+        columns["days"] += days.tolist()
+        columns["dates"] += dates.tolist()
+        columns["prices"] += list(median)
+        columns["lower"] += list(lower)
+        columns["upper"] += list(upper)
+        columns["labels"] += [f"+{day}d" if keep else "" for day, keep in zip(days.tolist(), labeled)]
+        return columns
+
+    for day in range(1, trading_days_ahead + 1):
         timeline.append({
-            "day": trading_days_counted,
-            "price": float(price_point),
-            "label": label,
-            "date": current_date.strftime("%Y-%m-%d"),
+            "day": day,
+            "price": median[day - 1],
+            "lower": lower[day - 1],
+            "upper": upper[day - 1],
+            "label": f"+{day}d" if day % label_every == 0 or day == trading_days_ahead else "",
+            "date": dates[day - 1],
             "is_trading_day": True
         })
     
@@ -261,7 +303,7 @@ def get_sentiment(symbol: str):
         print(f"[DEBUG] Getting news sentiment for {symbol}")
         
         ticker = yf.Ticker(symbol)
-        news = ticker.news
+        news = yahoo.call(lambda: ticker.news)
         
         if not news or len(news) == 0:
             print(f"[DEBUG] No news found for {symbol}")
@@ -356,15 +398,11 @@ def obtain_volatility(prices):
     if len(prices) < 2:
         return "Unknown"
     
-    #daily returns
-    returns = []
-    for i in range (1, len(prices)):
-        daily_return = (prices[i] - prices[i - 1]) / prices[i - 1]
-        returns.append(daily_return)
-
-    #sd
-    vol = np.std(returns) * np.sqrt(252) #252 is avg no of trading days a yr
+    #sd of daily returns, 252 is avg no of trading days a yr
+    return classify_volatility(as_price_series(prices).annualised_volatility())
 
+def classify_volatility(vol: float):
+    #annualised volatility -> category shown in the app
     if vol > 0.3:
         return "High"
     elif vol > 0.15:
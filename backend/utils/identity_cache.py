@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# in-process cache for the identity lookups almost every request makes:
+#   firebase_uid -> users.id      (every authenticated call)
+#   username     -> email         (/resolve-login)
+#   username     -> exists?       (/check-username, /save-username)
+# a user's id never changes, so those hits never expire. usernames do change, and
+# DatabaseManager updates/invalidates the entries itself when it saves one, but only
+# in its own process: another worker would keep serving the old name's email and
+# "taken" forever, so username hits expire after IDENTITY_POSITIVE_TTL seconds.
+# misses are cached too but only for IDENTITY_NEGATIVE_TTL seconds, another
+# instance may create the user or take the username in the meantime.
+
+IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', '50000'))
+IDENTITY_NEGATIVE_TTL = float(os.getenv('IDENTITY_NEGATIVE_TTL', '30'))
+IDENTITY_POSITIVE_TTL = float(os.getenv('IDENTITY_POSITIVE_TTL', '300'))
+
+MISSING = object()  # "not cached", as opposed to a cached None (known miss)
+
+class LRUCache:
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE, negative_ttl: float = IDENTITY_NEGATIVE_TTL,
+                 positive_ttl: float = None):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.positive_ttl = positive_ttl  # None: hits are kept until evicted
+        self.entries = OrderedDict()  # key -> (value, expires_at or None)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        #cached value (None for a known miss) or MISSING
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                self.misses += 1
+                return MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        #None means "looked it up, doesn't exist" and is kept for negative_ttl only
+        if value is None:
+            expires_at = time.monotonic() + self.negative_ttl
+        else:
+            expires_at = time.monotonic() + self.positive_ttl if self.positive_ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+class IdentityCache:
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE, negative_ttl: float = IDENTITY_NEGATIVE_TTL,
+                 positive_ttl: float = IDENTITY_POSITIVE_TTL):
+        self.user_ids = LRUCache(maxsize, negative_ttl)                        # firebase_uid -> id
+        self.emails = LRUCache(maxsize, negative_ttl, positive_ttl)            # username -> email
+        self.usernames_taken = LRUCache(maxsize, negative_ttl, positive_ttl)   # username -> True
+
+    def username_saved(self, username: str, email: str, old_username: str = None):
+        self.usernames_taken.set(username, True)
+        self.emails.set(username, email)
+        if old_username and old_username != username:
+            # the old name is free again
+            self.usernames_taken.invalidate(old_username)
+            self.emails.invalidate(old_username)
+
+    def stats(self) -> dict:
+        return {
+            "user_ids": self.user_ids.stats(),
+            "emails": self.emails.stats(),
+            "usernames": self.usernames_taken.stats()
+        }
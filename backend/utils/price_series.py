@@ -0,0 +1,97 @@
+import numpy as np
+
+# one object per fetched price history, shared by the models and helpers.
+# holds the closes as a contiguous float array and works out returns, rolling
+# stats and volatility the first time something asks, then keeps them.
+
+TRADING_DAYS_PER_YEAR = 252
+
+class PriceSeries:
+    __slots__ = ('values', 'dates', '_cache')
+
+    def __init__(self, values, dates=None):
+        values = np.asarray(values)
+        if values.dtype.kind != 'f':
+            values = values.astype(np.float64)
+        self.values = np.ascontiguousarray(values.ravel())
+        self.dates = dates
+        self._cache = {}
+
+    @classmethod
+    def from_frame(cls, data, column: str = "Close"):
+        #from a yf.download frame (single or multi-level columns)
+        closes = data[column].squeeze().dropna()
+        if np.ndim(closes) == 0:  # one bar squeezes down to a scalar
+            return cls([float(closes)])
+        return cls(closes.to_numpy(dtype=np.float64), dates=closes.index)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, item):
+        return self.values[item]
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values if dtype is None else self.values.astype(dtype, copy=False)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def tolist(self) -> list:
+        return self.values.tolist()
+
+    @property
+    def last(self) -> float:
+        return float(self.values[-1])
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def returns(self) -> np.ndarray:
+        #simple daily returns, len(series) - 1 of them
+        def compute():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.diff(self.values) / self.values[:-1]
+        return self._cached('returns', compute)
+
+    def log_returns(self) -> np.ndarray:
+        def compute():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.diff(np.log(self.values))
+        return self._cached('log_returns', compute)
+
+    def rolling_mean(self, window: int) -> np.ndarray:
+        #mean of each full window, len(series) - window + 1 values
+        def compute():
+            if len(self.values) < window:
+                return np.empty(0)
+            sums = np.cumsum(np.concatenate(([0.0], self.values)))
+            return (sums[window:] - sums[:-window]) / window
+        return self._cached(('rolling_mean', window), compute)
+
+    def rolling_std(self, window: int) -> np.ndarray:
+        #population std of each full window, same ddof as np.std
+        def compute():
+            if len(self.values) < window:
+                return np.empty(0)
+            squares = np.cumsum(np.concatenate(([0.0], self.values ** 2)))
+            mean = self.rolling_mean(window)
+            variance = (squares[window:] - squares[:-window]) / window - mean ** 2
+            return np.sqrt(np.maximum(variance, 0))
+        return self._cached(('rolling_std', window), compute)
+
+    def annualised_volatility(self) -> float:
+        def compute():
+            returns = self.returns()
+            if len(returns) == 0:
+                return float('nan')
+            return float(np.std(returns) * np.sqrt(TRADING_DAYS_PER_YEAR))
+        return self._cached('annualised_volatility', compute)
+
+def as_price_series(prices) -> PriceSeries:
+    #lets the models keep taking plain lists/arrays as well
+    if isinstance(prices, PriceSeries):
+        return prices
+    return PriceSeries(prices)
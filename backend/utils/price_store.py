@@ -0,0 +1,197 @@
+import os
+import threading
+import numpy as np
+from utils.price_series import PriceSeries
+
+# in-memory price history, one fixed-capacity ring per symbol.
+# only what the models use is kept: bar timestamps (uint32 epoch seconds) and
+# closes (float32), no OHLCV frame, no index objects.
+#
+# every bar is written twice, at i and i + capacity, so the latest n bars are
+# always one contiguous slice and can be handed out as a zero-copy view. a view
+# of fewer than `capacity` bars is also never touched by the next append.
+
+PRICE_RING_CAPACITY = int(os.getenv('PRICE_RING_CAPACITY', '512'))  # ~2 years of daily bars
+
+def to_epoch_seconds(index) -> np.ndarray:
+    #DatetimeIndex (naive or tz-aware) -> uint32 epoch seconds
+    return np.asarray(index.values.astype('datetime64[s]').astype(np.int64), dtype=np.uint32)
+
+class PriceRing:
+    __slots__ = ('capacity', 'timestamps', 'closes', 'size', 'head')
+
+    def __init__(self, capacity: int = PRICE_RING_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity, dtype=np.uint32)
+        self.closes = np.zeros(2 * capacity, dtype=np.float32)
+        self.size = 0
+        self.head = 0  # next write position
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_timestamp(self) -> int:
+        if self.size == 0:
+            return 0
+        return int(self.timestamps[self.head - 1 + self.capacity])
+
+    def append(self, timestamp: int, close: float):
+        #O(1). a bar with the last timestamp replaces it (intraday updates), older bars are ignored
+        if self.size:
+            last = self.last_timestamp
+            if timestamp < last:
+                return
+            if timestamp == last:
+                position = (self.head - 1) % self.capacity
+                self.closes[position] = self.closes[position + self.capacity] = close
+                return
+
+        position = self.head
+        self.timestamps[position] = self.timestamps[position + self.capacity] = timestamp
+        self.closes[position] = self.closes[position + self.capacity] = close
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, timestamps: np.ndarray, closes: np.ndarray):
+        #bulk version of append for sorted bars, vectorised writes
+        if len(timestamps) == 0:
+            return
+        if self.size:
+            last = self.last_timestamp
+            if timestamps[0] <= last:
+                # overlapping download: refresh the shared last bar, keep only what's new
+                same = np.flatnonzero(timestamps == last)
+                if len(same):
+                    self.append(last, float(closes[same[-1]]))
+                newer = timestamps > last
+                timestamps, closes = timestamps[newer], closes[newer]
+                if len(timestamps) == 0:
+                    return
+
+        timestamps, closes = timestamps[-self.capacity:], closes[-self.capacity:]
+        positions = (self.head + np.arange(len(timestamps))) % self.capacity
+        for offset in (0, self.capacity):
+            self.timestamps[positions + offset] = timestamps
+            self.closes[positions + offset] = closes
+        self.head = int((self.head + len(timestamps)) % self.capacity)
+        self.size = min(self.size + len(timestamps), self.capacity)
+
+    def view(self, n: int = None):
+        #latest n bars (all if None) as zero-copy (timestamps, closes) views, oldest first
+        n = self.size if n is None else min(n, self.size)
+        end = self.head + self.capacity
+        return self.timestamps[end - n:end], self.closes[end - n:end]
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.closes.nbytes
+
+class PriceStore:
+    # besides the bars, per symbol: the earliest timestamp they're complete from
+    # (covered) and when they were last refreshed from upstream (refreshed)
+    def __init__(self, capacity: int = PRICE_RING_CAPACITY):
+        self.capacity = capacity
+        self.rings = {}
+        self.covered = {}
+        self.refreshed = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, symbol: str, timestamps: np.ndarray, closes: np.ndarray, refreshed_at: float = None) -> bool:
+        #append bars. True when the symbol started over (new, or history was revised)
+        symbol = symbol.upper()
+        timestamps = np.asarray(timestamps, dtype=np.uint32)
+        closes = np.asarray(closes, dtype=np.float32)
+        with self.lock:
+            ring = self.rings.get(symbol)
+            restarted = ring is None or self._revised(ring, timestamps, closes)
+            if restarted:
+                # adjusted closes shift after dividends/splits, start that symbol over
+                ring = self.rings[symbol] = PriceRing(self.capacity)
+                if len(timestamps):
+                    self.covered[symbol] = int(timestamps[0])
+            ring.extend(timestamps, closes)
+            if refreshed_at is not None:
+                self.refreshed[symbol] = refreshed_at
+        return restarted
+
+    def replace(self, symbol: str, timestamps: np.ndarray, closes: np.ndarray,
+                covered_from: int = None, refreshed_at: float = None):
+        #drop whatever we had for the symbol, e.g. after downloading a longer range
+        symbol = symbol.upper()
+        ring = PriceRing(self.capacity)
+        ring.extend(np.asarray(timestamps, dtype=np.uint32), np.asarray(closes, dtype=np.float32))
+        with self.lock:
+            self.rings[symbol] = ring
+            self.covered[symbol] = covered_from if covered_from is not None else int(timestamps[0])
+            if refreshed_at is not None:
+                self.refreshed[symbol] = refreshed_at
+
+    def covered_from(self, symbol: str) -> float:
+        #bars are complete from this timestamp on, inf when there are none
+        symbol = symbol.upper()
+        window = self.window(symbol, self.capacity)
+        if window is None or len(window[0]) == 0:
+            return float('inf')
+        covered = self.covered.get(symbol, float('inf'))
+        if len(window[0]) == self.capacity:
+            # full: older bars have been pushed out
+            covered = max(covered, int(window[0][0]))
+        return covered
+
+    def refreshed_at(self, symbol: str) -> float:
+        return self.refreshed.get(symbol.upper(), 0.0)
+
+    @staticmethod
+    def _revised(ring: PriceRing, timestamps: np.ndarray, closes: np.ndarray) -> bool:
+        #compare the oldest bar both copies have (the last bar is allowed to move intraday)
+        stored_ts, stored_closes = ring.view()
+        if len(timestamps) == 0 or len(stored_ts) < 2 or timestamps[0] >= stored_ts[-1]:
+            return False
+        position = np.searchsorted(stored_ts, timestamps[0])
+        if position >= len(stored_ts) - 1 or stored_ts[position] != timestamps[0]:
+            return False
+        return not np.isclose(stored_closes[position], closes[0], rtol=1e-4)
+
+    def ingest_frame(self, symbol: str, data, column: str = "Close"):
+        #straight from a yf.download frame
+        closes = data[column].squeeze().dropna()
+        if np.ndim(closes) == 0 or len(closes) == 0:
+            return
+        self.ingest(symbol, to_epoch_seconds(closes.index), closes.to_numpy(dtype=np.float32))
+
+    def get(self, symbol: str):
+        return self.rings.get(symbol.upper())
+
+    def window(self, symbol: str, n: int = None):
+        ring = self.get(symbol)
+        if ring is None:
+            return None
+        with self.lock:
+            return ring.view(n)
+
+    def series(self, symbol: str, n: int = None):
+        #PriceSeries over a view of the ring, no copy
+        window = self.window(symbol, n)
+        if window is None:
+            return None
+        timestamps, closes = window
+        return PriceSeries(closes, dates=timestamps)
+
+    def memory_bytes(self) -> int:
+        return sum(ring.nbytes for ring in self.rings.values())
+
+    def symbols(self) -> list:
+        return list(self.rings)
+
+# PRICE_STORE_DIR set: bars live in memory-mapped files there instead, shared by
+# every worker process on the box (utils/shared_price_store.py)
+PRICE_STORE_DIR = os.getenv('PRICE_STORE_DIR', '')
+
+def create_price_store():
+    if PRICE_STORE_DIR:
+        from utils.shared_price_store import MappedPriceStore
+        return MappedPriceStore(PRICE_STORE_DIR)
+    return PriceStore()
+
+price_store = create_price_store()
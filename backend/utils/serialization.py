@@ -0,0 +1,79 @@
+import os
+import gzip
+import json
+import numpy as np
+from fastapi import Response
+
+# fast JSON + compression for the bigger responses (/predict, /historical).
+# orjson when it's installed (it also takes numpy arrays as they are), stdlib json
+# otherwise. bodies over COMPRESS_MIN_BYTES get brotli or gzip if the client
+# accepts it.
+# sse_event frames the same JSON for the streaming endpoints.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_FORMATS = ('full', 'compact')
+
+def _default(value):
+    #what stdlib json can't do on its own
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+def sse_event(event: str, payload) -> bytes:
+    #one Server-Sent Events message
+    return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    encodings = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def negotiate_encoding(accept_encoding: str = None) -> str:
+    #'br', 'gzip' or 'identity': what encoded_response uses for a body big enough to compress
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+def encoded_response(payload, accept_encoding: str = None, status_code: int = 200,
+                     headers: dict = None) -> Response:
+    body = dumps(payload)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding == "br":
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif encoding == "gzip":
+            # no timestamp in the header, the same payload always gives the same bytes
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json",
+                    headers=headers)
@@ -0,0 +1,175 @@
+import os
+import re
+import mmap
+import fcntl
+import struct
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+from utils.price_store import PriceRing, PriceStore, PRICE_RING_CAPACITY
+
+# price_store shared by every worker process on the box (PRICE_STORE_DIR).
+# with the in-memory store each uvicorn worker downloaded and held its own copy
+# of every symbol, so memory grew with the worker count and a new worker started
+# cold. here a symbol is one small file:
+#   header   magic, capacity, size, covered_from, refreshed_at
+#   bars     uint32 timestamps[capacity], float32 closes[capacity], oldest first
+# every process maps the files read-only and hands out numpy views straight into
+# the mapping (page cache, one copy for all of them).
+#
+# writes: one writer per symbol at a time (flock on SYMBOL.lock), which merges its
+# bars with what's in the file, writes a complete new file next to it and renames
+# it over the old one. readers either see the old file or the new one, never a
+# half-written bar, and a view someone is still using keeps the old mapping alive.
+# a file is a few KB, so rewriting it costs about what appending in place would.
+
+MAGIC = b'PXS1'
+HEADER = struct.Struct('<4sIIxxxxqd')  # magic, capacity, size, covered_from, refreshed_at
+HEADER_SIZE = 32
+
+def _file_size(capacity: int) -> int:
+    return HEADER_SIZE + capacity * 8
+
+class MappedBars:
+    #one published version of a symbol's file. view() has the same shape as PriceRing.view
+    __slots__ = ('key', 'capacity', 'size', 'covered_from', 'refreshed_at', 'timestamps', 'closes', 'mapping')
+
+    def __init__(self, path: str, stat):
+        with open(path, 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity, self.size, self.covered_from, self.refreshed_at = HEADER.unpack_from(self.mapping)
+        if magic != MAGIC or len(self.mapping) != _file_size(self.capacity):
+            raise ValueError(f"{path} is not a price file")
+        self.key = (stat.st_ino, stat.st_mtime_ns)
+        self.timestamps = np.frombuffer(self.mapping, dtype=np.uint32, count=self.size, offset=HEADER_SIZE)
+        self.closes = np.frombuffer(self.mapping, dtype=np.float32, count=self.size,
+                                    offset=HEADER_SIZE + self.capacity * 4)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def last_timestamp(self) -> int:
+        return int(self.timestamps[-1]) if self.size else 0
+
+    def view(self, n: int = None):
+        n = self.size if n is None else min(n, self.size)
+        return self.timestamps[self.size - n:], self.closes[self.size - n:]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.mapping)
+
+class MappedPriceStore(PriceStore):
+    def __init__(self, directory: str, capacity: int = PRICE_RING_CAPACITY):
+        super().__init__(capacity)
+        self.directory = directory
+        self.mapped = {}  # symbol -> MappedBars, the latest version this process has seen
+        self.write_locks = defaultdict(threading.Lock)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Z0-9.^=-]', '_', symbol.upper()) + '.bars')
+
+    def get(self, symbol: str):
+        #the symbol's current bars, remapped when another process published a new version
+        symbol = symbol.upper()
+        path = self._path(symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.mapped.pop(symbol, None)
+            return None
+        bars = self.mapped.get(symbol)
+        if bars is not None and bars.key == (stat.st_ino, stat.st_mtime_ns):
+            return bars
+        try:
+            bars = MappedBars(path, stat)
+        except (OSError, ValueError) as e:
+            print(f"Could not map prices for {symbol}: {e}")
+            return None
+        # the old mapping isn't closed, views handed out earlier may still point into it;
+        # it goes away with the last of them
+        self.mapped[symbol] = bars
+        return bars
+
+    def window(self, symbol: str, n: int = None):
+        bars = self.get(symbol)
+        return None if bars is None else bars.view(n)
+
+    @contextmanager
+    def _writing(self, symbol: str):
+        #this process's threads, then the other processes
+        with self.write_locks[symbol]:
+            with open(self._path(symbol)[:-len('.bars')] + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, symbol: str, ring: PriceRing, covered_from: int, refreshed_at: float):
+        timestamps, closes = ring.view()
+        buffer = bytearray(_file_size(self.capacity))
+        HEADER.pack_into(buffer, 0, MAGIC, self.capacity, len(timestamps), int(covered_from), float(refreshed_at))
+        np.frombuffer(buffer, dtype=np.uint32, count=len(timestamps), offset=HEADER_SIZE)[:] = timestamps
+        np.frombuffer(buffer, dtype=np.float32, count=len(closes), offset=HEADER_SIZE + self.capacity * 4)[:] = closes
+
+        path = self._path(symbol)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+        os.replace(tmp_path, path)
+
+    def ingest(self, symbol: str, timestamps: np.ndarray, closes: np.ndarray, refreshed_at: float = None) -> bool:
+        symbol = symbol.upper()
+        timestamps = np.asarray(timestamps, dtype=np.uint32)
+        closes = np.asarray(closes, dtype=np.float32)
+        if len(timestamps) == 0:
+            return False
+        with self._writing(symbol):
+            current = self.get(symbol)
+            restarted = current is None or current.capacity != self.capacity or self._revised(current, timestamps, closes)
+            ring = PriceRing(self.capacity)
+            if restarted:
+                # adjusted closes shift after dividends/splits, start that symbol over
+                covered_from, previous_refresh = int(timestamps[0]), 0.0
+            else:
+                ring.extend(*current.view())
+                covered_from, previous_refresh = current.covered_from, current.refreshed_at
+            ring.extend(timestamps, closes)
+            self._publish(symbol, ring, covered_from, previous_refresh if refreshed_at is None else refreshed_at)
+        return restarted
+
+    def replace(self, symbol: str, timestamps: np.ndarray, closes: np.ndarray,
+                covered_from: int = None, refreshed_at: float = None):
+        symbol = symbol.upper()
+        ring = PriceRing(self.capacity)
+        ring.extend(np.asarray(timestamps, dtype=np.uint32), np.asarray(closes, dtype=np.float32))
+        if len(ring) == 0:
+            return
+        with self._writing(symbol):
+            if refreshed_at is None:
+                refreshed_at = self.refreshed_at(symbol)
+            self._publish(symbol, ring, covered_from if covered_from is not None else int(timestamps[0]), refreshed_at)
+
+    def covered_from(self, symbol: str) -> float:
+        bars = self.get(symbol)
+        if bars is None or len(bars) == 0:
+            return float('inf')
+        if len(bars) == bars.capacity:
+            # full: older bars have been pushed out
+            return max(bars.covered_from, int(bars.timestamps[0]))
+        return bars.covered_from
+
+    def refreshed_at(self, symbol: str) -> float:
+        bars = self.get(symbol)
+        return 0.0 if bars is None else bars.refreshed_at
+
+    def memory_bytes(self) -> int:
+        #mapped by this process; shared with every other one, not on top of theirs
+        return sum(bars.nbytes for bars in self.mapped.values())
+
+    def symbols(self) -> list:
+        return sorted(name[:-len('.bars')] for name in os.listdir(self.directory) if name.endswith('.bars'))